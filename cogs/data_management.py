@@ -16,6 +16,12 @@ except ImportError:
     logger.warning("PaginationView not found. Pagination features will be unavailable.")
     PaginationView = None
 
+try:
+    from screen.vocabulary_index import VocabularyIndex
+except ImportError:
+    logger.warning("VocabularyIndex not found. Screen processing will index names on every request.")
+    VocabularyIndex = None
+
 MAX_NAMES_TO_LIST = 15
 
 try:
@@ -44,6 +50,10 @@ class DataManagementCog(commands.Cog):
             logger.warning("Bot is missing 'known_names' attribute, initializing as empty list for DataManagementCog.")
             self.bot.known_names = [] # This should be loaded by main bot script ideally
 
+        # Bumped by names_changed() whenever cards or aliases change; get_vocabulary_index() rebuilds on a new version
+        self.names_version = 0
+        self._vocabulary_index = None
+
     # --- Helper to find IdCard for a Discord Member ---
     def _find_id_card_for_member(self, member: discord.Member) -> id_card.IdCard | None:
         """Finds the IdCard associated with a Discord member based on their cleaned display name."""
@@ -84,6 +94,23 @@ class DataManagementCog(commands.Cog):
                     if alias: names.add(alias)
         return list(names)
 
+    def names_changed(self):
+        """To call after any change to the cards or their aliases: the next get_vocabulary_index() is rebuilt."""
+        self.names_version += 1
+
+    def get_vocabulary_index(self):
+        """
+        The VocabularyIndex of all recognizable names and id_card.VOCABULARY for screen processing,
+        built once per names version. None if screen.vocabulary_index is not available.
+        """
+        if VocabularyIndex is None:
+            return None
+        index = self._vocabulary_index
+        if index is None or index.version != self.names_version:
+            index = self._vocabulary_index = VocabularyIndex(self.get_all_recognizable_names(), id_card.VOCABULARY, self.names_version)
+            logger.info(f"Built {index}.")
+        return index
+
     @commands.command(name='names', help="Liste les noms connus (et alias) et leur statut de paiement.")
     async def names_command(self, ctx: commands.Context):
         logger.info(f"'!names' command invoked by {ctx.author}")
@@ -241,6 +268,7 @@ class DataManagementCog(commands.Cog):
             self.bot.ids_data.append(id_card.IdCard(name)) # Creates card with empty aliases
         
         self.bot.ids_data.sort(key=lambda card: card.name.lower())
+        self.names_changed()
         # Sync self.bot.known_names with primary IdCard names
         self.bot.known_names = sorted([card.name for card in self.bot.ids_data])
 
@@ -310,6 +338,7 @@ class DataManagementCog(commands.Cog):
             new_ids_data.append(id_card.IdCard(name_to_add)) # New card, empty aliases
 
         self.bot.ids_data = sorted(new_ids_data, key=lambda card: card.name.lower())
+        self.names_changed()
         self.bot.known_names = sorted([card.name for card in self.bot.ids_data]) # Sync known_names
 
         save_errors = []
@@ -348,6 +377,7 @@ class DataManagementCog(commands.Cog):
             new_card = id_card.IdCard(name_cleaned) # Empty aliases
             self.bot.ids_data.append(new_card)
             self.bot.ids_data.sort(key=lambda card: card.name.lower())
+            self.names_changed()
             if name_cleaned not in self.bot.known_names: # Sync known_names
                 self.bot.known_names.append(name_cleaned)
                 self.bot.known_names.sort()
@@ -383,6 +413,7 @@ class DataManagementCog(commands.Cog):
             return
         try:
             self.bot.ids_data.remove(card_to_remove)
+            self.names_changed()
             if name_cleaned in self.bot.known_names: # Sync known_names
                  self.bot.known_names.remove(name_cleaned)
                  id_card.save_known_names(self.bot.known_names)
@@ -447,12 +478,13 @@ class DataManagementCog(commands.Cog):
         try:
             card.ingame_aliases.append(cleaned_alias)
             card.ingame_aliases.sort()
+            self.names_changed()
             id_card.save_card(self.bot.ids_data)
             logger.info(f"Alias '{cleaned_alias}' added to '{card.name}' ({member.display_name}).")
             await ctx.send(f"✅ Alias `{cleaned_alias}` ajouté à `{card.name}` (pour `{member.display_name}`).")
         except Exception as e:
             logger.exception(f"Failed to add alias '{cleaned_alias}' to '{card.name}'.")
-            if cleaned_alias in card.ingame_aliases: card.ingame_aliases.remove(cleaned_alias) # Attempt revert
+            if cleaned_alias in card.ingame_aliases: card.ingame_aliases.remove(cleaned_alias); self.names_changed() # Attempt revert
             await ctx.send(f"❌ Erreur ajout alias: ```{e}```")
 
     @alias_group.command(name='remove', help="Supprime un alias en jeu d'un utilisateur Discord.")
@@ -474,6 +506,7 @@ class DataManagementCog(commands.Cog):
             return
         try:
             card.ingame_aliases.remove(cleaned_alias)
+            self.names_changed()
             id_card.save_card(self.bot.ids_data)
             logger.info(f"Alias '{cleaned_alias}' removed from '{card.name}' ({member.display_name}).")
             await ctx.send(f"✅ Alias `{cleaned_alias}` supprimé de `{card.name}` (pour `{member.display_name}`).")
@@ -3,6 +3,11 @@ import discord
 from discord.ext import commands
 import logging
 import asyncio
+import io
+import json
+import time
+
+from utils.helpers import has_pay_role
 
 logger = logging.getLogger(__name__)
 
@@ -14,12 +19,24 @@ except ImportError as e:
     id_card = None
 
 try:
-    from screen.traitement import from_link_to_result
+    from screen.traitement import from_bytes_to_result, check_image_size, check_image_pixels
     from screen.EndScreen import EndScreen # Assuming EndScreen is your class
+    from screen.ocr_pool import OcrPool
+    from screen.stage_cache import StageCache
+    from screen.geometry_cache import GeometryCache
+    from screen.screen_gate import NotEndScreenError
+    from screen.vocabulary_index import VocabularyIndex
+    from screen.perf import perf
 except ImportError as e:
-     logger.critical(f"ScreenCog: CRITICAL - Failed to import screen processing modules (traitement or EndScreen): {e}. Screen command will fail.")
-     from_link_to_result = None
+     logger.critical(f"ScreenCog: CRITICAL - Failed to import screen processing modules (traitement, EndScreen, ocr_pool or stage_cache): {e}. Screen command will fail.")
+     from_bytes_to_result = None
      EndScreen = None
+     OcrPool = None
+     StageCache = None
+     GeometryCache = None
+     NotEndScreenError = None
+     VocabularyIndex = None
+     perf = None
 
 
 class ScreenCog(commands.Cog):
@@ -28,6 +45,12 @@ class ScreenCog(commands.Cog):
         self.bot = bot
         self.pending_results: dict[int, EndScreen] = {} # Make sure EndScreen is defined or imported
         self.user_locks: dict[int, asyncio.Lock] = {}
+        # Blocking OCR work runs here, never on the event loop
+        self.ocr_pool = OcrPool()
+        # Crop geometry + raw OCR lines of already seen images, keyed by content
+        self.stage_cache = StageCache()
+        # Last autocrop rectangle per (uploader, resolution), checked before the feature-matching search
+        self.geometry_cache = GeometryCache()
 
         # Ensure core data attributes used by confirm exist on the bot object
         # These should ideally be loaded in the main bot script before cogs.
@@ -38,38 +61,65 @@ class ScreenCog(commands.Cog):
             logger.error("ScreenCog: Bot is missing 'hashes' attribute. Confirm may misbehave or use empty list.")
             # self.bot.hashes = []
 
+    async def cog_unload(self):
+        self.ocr_pool.shutdown()
+
     async def get_user_lock(self, user_id: int) -> asyncio.Lock:
         if user_id not in self.user_locks:
             self.user_locks[user_id] = asyncio.Lock()
         return self.user_locks[user_id]
 
-    def _get_effective_known_names_for_screen_processing(self) -> list[str]:
+    def _get_vocabulary_index(self) -> VocabularyIndex:
         """
-        Gets all primary names and all aliases from DataManagementCog for screen processing.
-        Falls back to an empty list if DataManagementCog or its method is not available.
+        Gets the VocabularyIndex (all primary names and aliases, preprocessed vocabulary) from DataManagementCog,
+        which only rebuilds it when cards or aliases change.
+        Falls back to an index of self.bot.known_names (or no names) if DataManagementCog or its method is not available.
         """
         data_management_cog = self.bot.get_cog('DataManagementCog')
-        if data_management_cog and hasattr(data_management_cog, 'get_all_recognizable_names'):
-            names = data_management_cog.get_all_recognizable_names()
-            logger.debug(f"ScreenCog: Using {len(names)} recognizable names (primary + aliases) from DataManagementCog.")
-            return names
-        else:
-            logger.warning("ScreenCog: DataManagementCog or get_all_recognizable_names not found. Screen processing might be less effective. Falling back to empty list for known names.")
-            # Fallback to self.bot.known_names if it exists and DataManagementCog doesn't
-            # This provides a degraded mode if DataManagementCog isn't loaded but old known_names exist
-            if hasattr(self.bot, 'known_names'):
-                logger.warning("ScreenCog: Falling back to self.bot.known_names.")
-                return self.bot.known_names
-            return []
-
-    @commands.command(name='screen', aliases=['process'], help="Traite une image attachée. Utilise les alias. Ne sauvegarde pas avant '!confirm'.")
-    async def screen_command(self, ctx: commands.Context):
-        if from_link_to_result is None or EndScreen is None:
+        index = None
+        if data_management_cog and hasattr(data_management_cog, 'get_vocabulary_index'):
+            index = data_management_cog.get_vocabulary_index()
+        if index is not None:
+            logger.debug(f"ScreenCog: Using {index} from DataManagementCog.")
+            return index
+        logger.warning("ScreenCog: DataManagementCog or get_vocabulary_index not found. Screen processing might be less effective. Falling back to empty list for known names.")
+        # Fallback to self.bot.known_names if it exists and DataManagementCog doesn't
+        # This provides a degraded mode if DataManagementCog isn't loaded but old known_names exist
+        names = []
+        if hasattr(self.bot, 'known_names'):
+            logger.warning("ScreenCog: Falling back to self.bot.known_names.")
+            names = self.bot.known_names
+        return VocabularyIndex(names, id_card.VOCABULARY)
+
+    async def _process_attachment(self, attachment: discord.Attachment, names: VocabularyIndex, uploader_id: int, gate: bool = True) -> EndScreen:
+        """Reads the attachment without blocking the event loop, then runs the screen pipeline in the OCR pool."""
+        check_image_size(attachment.size) # Refuse oversized uploads before downloading them
+        if attachment.width and attachment.height: # Set by Discord for images; the header is checked again after download
+            check_image_pixels(attachment.width, attachment.height)
+        try:
+            with perf.timed("download"):
+                img_data = await attachment.read() # Goes through discord.py's shared HTTP session
+        except discord.HTTPException as e:
+            logger.error(f"Failed to download attachment {attachment.filename}: {e}")
+            raise ValueError(f"Échec du téléchargement de l'image: {e}") from e
+        return await self.ocr_pool.run(from_bytes_to_result, img_data, names, cache=self.stage_cache,
+                                       geometry_cache=self.geometry_cache, uploader_id=uploader_id, gate=gate, source=attachment.filename)
+
+    @commands.command(name='screen', aliases=['process'], help="Traite une image attachée. Utilise les alias. Ne sauvegarde pas avant '!confirm'. '!screen force' ignore le filtre d'images.")
+    async def screen_command(self, ctx: commands.Context, *, options: str = ""):
+        if from_bytes_to_result is None or EndScreen is None:
              await ctx.send(embed=discord.Embed(description="❌ Le module de traitement d'image n'est pas chargé.", color=discord.Color.red()))
              return
         
         logger.info(f"'!screen' command invoked by {ctx.author} in channel {ctx.channel.id}")
 
+        if self.ocr_pool.state == 'warming':
+            await ctx.send(embed=discord.Embed(description="⏳ Le moteur OCR est en train de démarrer, réessaie dans quelques instants.", color=discord.Color.light_grey()))
+            return
+        if self.ocr_pool.state == 'failed':
+            await ctx.send(embed=discord.Embed(description=f"❌ Le moteur OCR n'a pas pu démarrer: `{self.ocr_pool.warmup_error}`", color=discord.Color.red()))
+            return
+
         if not ctx.message.attachments:
             await ctx.send(embed=discord.Embed(description="❌ Pas d'image attachée.", color=discord.Color.orange()))
             return
@@ -81,7 +131,7 @@ class ScreenCog(commands.Cog):
                 return
 
             # --- Get effective known names (primary + aliases) ---
-            effective_names_for_ocr = self._get_effective_known_names_for_screen_processing()
+            effective_names_for_ocr = self._get_vocabulary_index()
             if not effective_names_for_ocr:
                 logger.info("ScreenCog: No recognizable names available for OCR processing. Results may be limited.")
             # ---
@@ -105,10 +155,32 @@ class ScreenCog(commands.Cog):
                         await ctx.send(embed=discord.Embed(description="❌ Aucun fichier image valide trouvé.", color=discord.Color.orange()))
                         return
 
-                    for i, attachment in enumerate(attachments_to_process):
-                        logger.info(f"Processing attachment {i+1}/{len(attachments_to_process)}: {attachment.filename}")
+                    pool_stats = self.ocr_pool.stats()
+                    if pool_stats["queued"] > 0 or pool_stats["busy"] >= pool_stats["workers"]:
+                        await ctx.send(embed=discord.Embed(description=f"⏳ {pool_stats['busy'] + pool_stats['queued']} image(s) déjà en cours de traitement, la tienne est en file d'attente.", color=discord.Color.light_grey()))
+
+                    # '!screen force' skips the end-screen filter (false positives)
+                    force = options.strip().lower() == 'force'
+
+                    # All attachments go to the pool at once; results come back in attachment order
+                    part_jobs = [self._process_attachment(attachment, effective_names_for_ocr, ctx.author.id, gate=not force) for attachment in attachments_to_process] # USE THE NEW LIST
+                    part_results = await asyncio.gather(*part_jobs, return_exceptions=True)
+
+                    for i, (attachment, screen_part_result) in enumerate(zip(attachments_to_process, part_results)):
+                        logger.info(f"Merging attachment {i+1}/{len(attachments_to_process)}: {attachment.filename}")
+                        if isinstance(screen_part_result, asyncio.CancelledError):
+                            raise screen_part_result
+                        if isinstance(screen_part_result, NotEndScreenError):
+                            error_count += 1
+                            logger.info(f"Attachment {attachment.filename} refused by the screen gate: {screen_part_result.result}")
+                            await ctx.send(embed=discord.Embed(description=f"🚫 `{attachment.filename}`: {screen_part_result} Image ignorée. (`{ctx.prefix}screen force` pour la traiter quand même)", color=discord.Color.orange()))
+                            continue
+                        if isinstance(screen_part_result, Exception):
+                            error_count += 1
+                            logger.error(f"Error processing attachment {attachment.filename}: {screen_part_result}", exc_info=screen_part_result)
+                            await ctx.send(embed=discord.Embed(title=f"❌ Erreur Traitement: {attachment.filename}", description=f"```{type(screen_part_result).__name__}: {screen_part_result}```", color=discord.Color.dark_red()))
+                            continue
                         try:
-                            screen_part_result = from_link_to_result(attachment.url, effective_names_for_ocr) # USE THE NEW LIST
                             processed_count += 1
                             if current_result is None:
                                 current_result = screen_part_result
@@ -119,11 +191,6 @@ class ScreenCog(commands.Cog):
                             logger.error(f"Error concatenating results from {attachment.filename}: {e}")
                             await ctx.send(embed=discord.Embed(title="⚠️ Erreur de Fusion", description=f"Impossible de fusionner `{attachment.filename}`: `{e}`.", color=discord.Color.orange()))
                             # Decide if to stop all processing or just skip this attachment
-                        except Exception as e:
-                            error_count += 1
-                            logger.exception(f"Error processing attachment {attachment.filename}: {e}")
-                            await ctx.send(embed=discord.Embed(title=f"❌ Erreur Traitement: {attachment.filename}", description=f"```{type(e).__name__}: {e}```", color=discord.Color.dark_red()))
-                            # Decide if to stop all processing
                     aggregated_screen_result = current_result
                 except Exception as e:
                     error_count +=1 # Should be caught by inner try-except, this is a fallback
@@ -142,7 +209,7 @@ class ScreenCog(commands.Cog):
                                            f"Confirmez avec `{ctx.prefix}confirm`.")
                 result_embed.color = discord.Color.blue()
                 self.pending_results[ctx.author.id] = aggregated_screen_result
-                logger.info(f"Stored pending result for user {ctx.author.id}. Hash: {aggregated_screen_result.hash()}")
+                logger.info(f"Stored pending result for user {ctx.author.id}. Hash: {aggregated_screen_result.hash()}, OCR tiers: {aggregated_screen_result.ocr_tiers}, OCR scales: {aggregated_screen_result.ocr_scales}")
                 await ctx.send(embed=result_embed)
             # ... (error/no data messages)
             elif error_count > 0:
@@ -168,8 +235,8 @@ class ScreenCog(commands.Cog):
 
             if modified:
                 # --- Get effective known names for re-evaluation ---
-                effective_names = self._get_effective_known_names_for_screen_processing()
-                screen_result.re_evaluate_wewon(effective_names) # Pass all recognizable names
+                effective_names = self._get_vocabulary_index()
+                screen_result.re_evaluate_wewon(effective_names.names_set) # Pass all recognizable names
                 # ---
                 self.pending_results[ctx.author.id] = screen_result # Update stored result
                 # ... (send embed, same logic)
@@ -274,8 +341,58 @@ class ScreenCog(commands.Cog):
                 if final_hash in self.bot.hashes: self.bot.hashes.remove(final_hash) # Revert hash
 
 
+    @commands.command(name='perf', help="Affiche les temps par étape du traitement des screens (Rôle requis). '!perf json' envoie les données brutes, '!perf reset' les remet à zéro.", hidden=True)
+    @has_pay_role()
+    async def perf_command(self, ctx: commands.Context, *, options: str = ""):
+        """Per-stage latency percentiles of the screen pipeline, plus OCR pool and cache counters."""
+        logger.info(f"'!perf {options}' command invoked by {ctx.author}")
+        option = options.strip().lower()
+        if option == 'reset':
+            perf.reset()
+            await ctx.send(embed=discord.Embed(description="✅ Statistiques de performance remises à zéro.", color=discord.Color.green()))
+            return
+
+        stages = perf.snapshot()
+        if option == 'json':
+            report = {
+                "generated_at": time.time(),
+                "since": perf.started_at,
+                "stages": stages,
+                "ocr_pool": self.ocr_pool.stats(),
+                "stage_cache": self.stage_cache.stats(),
+                "geometry_cache": self.geometry_cache.stats(),
+            }
+            payload = json.dumps(report, indent=2).encode('utf-8')
+            await ctx.send(file=discord.File(io.BytesIO(payload), filename="perf.json"))
+            return
+
+        if not stages:
+            await ctx.send(embed=discord.Embed(description="ℹ️ Aucune mesure pour l'instant. Lancez un `!screen` d'abord.", color=discord.Color.blue()))
+            return
+        lines = [f"{'étape':<16}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}"]
+        for stage, summary in stages.items():
+            if summary["window"]:
+                lines.append(f"{stage:<16}{summary['count']:>6}{summary['p50_ms']:>9.0f}{summary['p95_ms']:>9.0f}{summary['p99_ms']:>9.0f}")
+        pool_stats = self.ocr_pool.stats()
+        cache_stats = self.stage_cache.stats()
+        geometry_stats = self.geometry_cache.stats()
+        embed = discord.Embed(title="⏱️ Performances du traitement des screens",
+                              description="Durées en ms, sur les dernières mesures de chaque étape.\n```\n" + "\n".join(lines) + "\n```",
+                              color=discord.Color.blue())
+        embed.add_field(name="Pool OCR", value=f"{pool_stats['busy']}/{pool_stats['workers']} occupés, {pool_stats['queued']} en attente, état `{pool_stats['state']}`\nTiers: {pool_stats['tiers'] or '-'}\nTampons: {pool_stats['buffers']['bytes'] / 1024 / 1024:.0f} Mo, {pool_stats['buffers']['reused']} réutilisés / {pool_stats['buffers']['allocated']} alloués", inline=False)
+        gate_stats = pool_stats["gate"]
+        if gate_stats:
+            embed.add_field(name="Filtre d'images", value=f"{gate_stats.get('accepted', 0)} acceptées, {gate_stats.get('rejected', 0)} refusées "
+                            f"({gate_stats.get('rejected.no_window', 0)} sans fenêtre de combat, {gate_stats.get('rejected.aspect', 0)} format)", inline=False)
+        embed.add_field(name="Cache", value=f"{cache_stats['entries']} entrées, taux de succès {cache_stats['hit_rate']:.0%}", inline=False)
+        token_stats = pool_stats["tokens"]
+        embed.add_field(name="Cache de mots", value=f"{token_stats['entries']} entrées, taux de succès {token_stats['hit_rate']:.0%}", inline=False)
+        embed.add_field(name="Géométrie autocrop", value=f"{geometry_stats['entries']} entrées, taux de succès {geometry_stats['hit_rate']:.0%} ({geometry_stats['rejected']} rejetées)", inline=False)
+        await ctx.send(embed=embed)
+
+
 async def setup(bot: commands.Bot):
-    if id_card is not None and from_link_to_result is not None and EndScreen is not None:
+    if id_card is not None and from_bytes_to_result is not None and EndScreen is not None and OcrPool is not None and StageCache is not None and GeometryCache is not None and NotEndScreenError is not None and VocabularyIndex is not None and perf is not None:
         # Ensure required bot attributes are present before adding cog.
         # Ideally, main bot script loads data (ids_data, hashes) before loading cogs.
         if not hasattr(bot, 'ids_data'):
@@ -286,4 +403,4 @@ async def setup(bot: commands.Bot):
         await bot.add_cog(ScreenCog(bot))
         logger.info("ScreenCog loaded, will use aliases via DataManagementCog if available.")
     else:
-        logger.error("ScreenCog NOT loaded due to missing dependencies (id_card, screen.traitement, or screen.EndScreen).")
\ No newline at end of file
+        logger.error("ScreenCog NOT loaded due to missing dependencies (id_card, screen.traitement, screen.EndScreen, screen.ocr_pool or screen.perf).")
\ No newline at end of file
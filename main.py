@@ -1,6 +1,7 @@
 # bot.py
 import discord
 from discord.ext import commands
+import asyncio
 import os
 import logging
 from dotenv import load_dotenv
@@ -94,6 +95,12 @@ class Alibot(commands.Bot):
                 logger.exception(f'Failed to load extension {extension}.', exc_info=e) # Log full traceback
         logger.info("Attempted to load all cogs.")
 
+        # OCR models load in the background: the other cogs are usable right away,
+        # and !screen answers that the engine is warming up until it is ready.
+        screen_cog = self.get_cog('ScreenCog')
+        if screen_cog is not None:
+            self.ocr_warmup_task = asyncio.create_task(screen_cog.ocr_pool.warm_up())
+
     async def on_ready(self):
         logger.info(f'Logged in as {self.user.name} ({self.user.id})')
         logger.info(f'Discord.py version: {discord.__version__}')
@@ -7,15 +7,19 @@ import logging
 # Adjust import path if necessary
 # Assuming parsing_pipeline.py is in the same directory or its path is correctly set up
 try:
-    from .parsing_pipeline import stage0, stage1, stage2, stage3
+    from .parsing_pipeline import classify_tokens, split_tokens
+    from .token_table import TokenTable
+    from .vocabulary_index import VocabularyIndex
 except ImportError:
     # Fallback for direct execution or different project structure
     try:
-        from parsing_pipeline import stage0, stage1, stage2, stage3
+        from parsing_pipeline import classify_tokens, split_tokens
+        from token_table import TokenTable
+        from vocabulary_index import VocabularyIndex
         logger.warning("Using fallback import for parsing_pipeline. Ensure structure is correct.")
     except ImportError as e_fallback:
         logger.critical(f"CRITICAL: Failed to import parsing_pipeline: {e_fallback}. Parsing will fail.")
-        stage0, stage1, stage2, stage3 = None, None, None, None
+        classify_tokens, split_tokens, TokenTable, VocabularyIndex = None, None, None, None
 
 
 logger = logging.getLogger(__name__)
@@ -33,6 +37,10 @@ class EndScreen :
         self.wewon = None
         self.hash_code = None
         self.time = -1
+        self.ocr_tiers = [] # OCR profile each screenshot ended on (see screen.ocr_profiles)
+        self.ocr_scales = [] # Resize factor applied to each screenshot's window before OCR (see screen.text_scale)
+        self.divider_found = False # Parse quality signals, used to decide whether to re-OCR
+        self.known_names_found = 0
 
     def concat (self, other: 'EndScreen'):
         if (self.prism is not None and other.prism is not None and self.prism != other.prism) or \
@@ -52,6 +60,9 @@ class EndScreen :
 
         if self.perco is None: self.perco = other.perco
         elif other.perco is True: self.perco = True
+
+        self.ocr_tiers = self.ocr_tiers + other.ocr_tiers
+        self.ocr_scales = self.ocr_scales + other.ocr_scales
         
         # if other.time > self.time: self.time = other.time # If time parsing is added
         logger.info("Concatenated EndScreen results.")
@@ -246,17 +257,29 @@ class EndScreen :
         return self.hash_code
 
 
-    def parse (self, words, positions, raw_ocr_lines, known_names_with_aliases, vocabulary, std_factor=4):
+    def parse (self, words, positions, raw_ocr_lines, known_names_with_aliases, vocabulary, std_factor=4, index=None):
         """
         Parse the OCR words and positions to extract fight details.
         'known_names_with_aliases' is the comprehensive list of primary IdCard names and all their aliases.
+        With a VocabularyIndex (screen.vocabulary_index), its prepared names and vocabulary are used
+        instead of indexing the two lists for this call.
         """
-        if not all([stage0, stage1, stage2, stage3]):
+        if not all([classify_tokens, split_tokens, TokenTable, VocabularyIndex]):
             logger.error("Parsing pipeline stages not loaded. Cannot parse.")
             self.winners, self.losers, self.wewon = [], [], None
             return
+        if index is None:
+            index = VocabularyIndex(known_names_with_aliases, vocabulary)
+        self.parse_tokens(TokenTable.from_words(words, positions), raw_ocr_lines, index)
 
-        logger.info(f"Starting EndScreen parsing. Using {len(known_names_with_aliases)} known names (incl. aliases).")
+    def parse_tokens (self, table, raw_ocr_lines, index):
+        """
+        Parse the OCR words of a TokenTable (screen.token_table) to extract fight details,
+        matching them against the VocabularyIndex of all IdCard names, aliases and the vocabulary.
+        """
+        logger.info(f"Starting EndScreen parsing. Using {len(index)} known names (incl. aliases).")
+        self.divider_found = False
+        self.known_names_found = 0
 
         self.prism = False
         self.perco = False
@@ -273,35 +296,29 @@ class EndScreen :
             self.perco = True # Default to perco
             logger.info("Defaulting to Percepteur fight (no prism keyword found).")
 
-        if not words:
-            logger.warning("Parse called with empty words list.")
+        if not len(table):
+            logger.warning("Parse called with no words.")
             self.winners, self.losers, self.wewon = [], [], None
             self.hash_code = self.hash() # Generate hash even for empty result
             return
 
-        logger.debug("Running Stage 0: Preprocessing")
-        processed_words, processed_positions = stage0(words, positions)
-        if not processed_words:
-             logger.warning("No words remaining after Stage 0 preprocessing.")
+        logger.debug("Running Stages 0-2: Classify tokens (preprocess, word to known, classification)")
+        kept_words = classify_tokens(table, index, threshold=3)
+        if not kept_words:
+             logger.warning("No words remaining after preprocessing.")
              self.winners, self.losers, self.wewon = [], [], None
              self.hash_code = self.hash()
              return
 
-        logger.debug("Running Stage 1: Word to Known")
-        mapped_words, final_positions = stage1(processed_words, processed_positions, vocabulary, threshold=3)
-
-        logger.debug("Running Stage 2: Classification (Relaxed)")
-        # Pass known_names_with_aliases to stage2
-        word_dict = stage2(mapped_words, final_positions, known_names_with_aliases, vocabulary, std_factor=std_factor)
-
         logger.debug("Running Stage 3: Winner/Loser Extraction")
-        winners, losers = stage3(word_dict) # Ensure stage3 returns losers, not loosers
+        winners, losers, self.divider_found = split_tokens(table) # Distinct and sorted
 
         # Determine if 'we' (any of known_names_with_aliases) won or lost
-        known_names_set = set(known_names_with_aliases) # Use the comprehensive list
+        known_names_set = index.names_set # Use the comprehensive list
         winners_set = set(winners)
         losers_set = set(losers)
 
+        self.known_names_found = len((winners_set | losers_set) & known_names_set)
         we_are_winners = bool(winners_set & known_names_set)
         we_are_losers = bool(losers_set & known_names_set)
 
@@ -315,8 +332,8 @@ class EndScreen :
         else:
             self.wewon = None # Not involved or ambiguous
 
-        self.winners = sorted(list(winners_set))
-        self.losers = sorted(list(losers_set))
+        self.winners = winners
+        self.losers = losers
         self.hash_code = self.hash() # Generate stable hash based on final content
         logger.info(f"Parsing complete. Hash: {self.hash_code}, WeWon: {self.wewon}")
         logger.debug(f"Final parsed: Winners={self.winners}, Losers={self.losers}, Prism={self.prism}, Perco={self.perco}")
@@ -0,0 +1,218 @@
+# autocrop_batch.py
+# Batch autocrop of a directory of screenshots, spread over a process pool. Writes the crops
+# and a manifest (JSON or CSV, from its extension) with, per image: crop rectangle, autocrop
+# stage, match quality, timing. Re-running it skips images already in the manifest for the
+# same file (size, mtime), the same template and the same stages, so an interrupted run
+# resumes where it stopped and a template or --stages change re-crops everything.
+#
+#   python -m screen.autocrop_batch screenshots/ -o autocroped/ --workers 8
+#   python -m screen.autocrop_batch archive/ -o corpus/ -m corpus/manifest.csv --recursive
+import argparse
+import contextlib
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+try:
+    from .autocrop_sift import find_window_cascade, CASCADE_STAGES, CASCADE_ORDER
+    from .template_registry import template_registry
+except ImportError:
+    # Direct execution (python autocrop_sift.py / python autocrop_batch.py)
+    from autocrop_sift import find_window_cascade, CASCADE_STAGES, CASCADE_ORDER
+    from template_registry import template_registry
+
+# --- Parameters to Tune ---
+DEFAULT_TEMPLATE = 'template_sift_top.png'
+DEFAULT_OUTPUT_DIR = 'autocroped_sift_ratio'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
+MANIFEST_FLUSH_EVERY = 50 # Results between manifest rewrites (what a crash can lose)
+# --- End Parameters ---
+
+MANIFEST_FIELDS = ["file", "status", "x1", "y1", "x2", "y2", "stage", "inliers", "score", "elapsed_ms",
+                   "output", "size", "mtime_ns", "template_sha256", "stages", "error"]
+
+
+def list_images(input_dir: str, recursive: bool, exclude: set) -> list:
+    """Image paths under input_dir, relative to it, sorted."""
+    found = []
+    for root, dirs, files in os.walk(input_dir):
+        if not recursive:
+            dirs.clear()
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) not in exclude]
+        for name in files:
+            path = os.path.join(root, name)
+            if name.lower().endswith(IMAGE_EXTENSIONS) and os.path.abspath(path) not in exclude:
+                found.append(os.path.relpath(path, input_dir))
+    return sorted(found)
+
+
+def template_sha256(template_path: str) -> str:
+    with open(template_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_manifest(manifest_path: str) -> dict:
+    """{file: entry} from an existing JSON or CSV manifest, {} if there is none."""
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, newline='', encoding='utf-8') as f:
+            if manifest_path.lower().endswith('.csv'):
+                entries = list(csv.DictReader(f))
+                for entry in entries:
+                    for field in ("x1", "y1", "x2", "y2", "inliers", "size", "mtime_ns"):
+                        entry[field] = int(entry[field]) if entry.get(field) not in (None, "") else None
+                    for field in ("score", "elapsed_ms"):
+                        entry[field] = float(entry[field]) if entry.get(field) not in (None, "") else None
+            else:
+                entries = json.load(f)
+    except (OSError, ValueError, csv.Error) as e:
+        print(f"Warning: could not read manifest {manifest_path} ({e}). Starting from scratch.")
+        return {}
+    return {entry["file"]: entry for entry in entries}
+
+
+def save_manifest(manifest_path: str, entries: dict):
+    """Rewrites the manifest atomically, entries sorted by file."""
+    rows = [entries[name] for name in sorted(entries)]
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        if manifest_path.lower().endswith('.csv'):
+            writer = csv.DictWriter(f, fieldnames=MANIFEST_FIELDS)
+            writer.writeheader()
+            writer.writerows({field: row.get(field) for field in MANIFEST_FIELDS} for row in rows)
+        else:
+            json.dump(rows, f, indent=1)
+    os.replace(tmp_path, manifest_path)
+
+
+def is_done(entry, size: int, mtime_ns: int, sha256: str, stages: list) -> bool:
+    """True if entry is a finished result (cropped or not found, not an error) for this file, template and stages."""
+    return (entry is not None and entry.get("status") in ("cropped", "not_found") and entry.get("size") == size
+            and entry.get("mtime_ns") == mtime_ns and entry.get("template_sha256") == sha256
+            and entry.get("stages") == ','.join(stages))
+
+
+def output_name(name: str) -> str:
+    """Crop path for an input image: the source name with '.png' appended, so a.png and a.jpg do not collide."""
+    return name + '.png'
+
+
+def _init_worker():
+    cv2.setNumThreads(1) # One image per process: OpenCV's own threads would only oversubscribe the CPUs
+
+
+def crop_one(input_dir: str, name: str, output_dir: str, template_path: str, stages: list, verbose: bool) -> dict:
+    """Autocrops one image (in a pool worker). Returns its manifest entry."""
+    path = os.path.join(input_dir, name)
+    stat = os.stat(path)
+    entry = {"file": name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    start = time.perf_counter()
+    try:
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("could not decode image")
+        details = {}
+        log = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        with log:
+            window_rect, stage = find_window_cascade(img, template_path, stages, details)
+        entry["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        if window_rect is None:
+            entry["status"] = "not_found"
+            return entry
+        x1, y1, x2, y2 = (int(v) for v in window_rect)
+        output = output_name(name)
+        output_path = os.path.join(output_dir, output)
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        if not cv2.imwrite(output_path, img[y1:y2, x1:x2]):
+            raise OSError(f"could not write {output_path}")
+        entry.update(status="cropped", x1=x1, y1=y1, x2=x2, y2=y2, stage=stage, output=output,
+                     inliers=details.get("inliers"), score=details.get("score"))
+    except Exception as e:
+        entry.update(status="error", error=f"{type(e).__name__}: {e}", elapsed_ms=round((time.perf_counter() - start) * 1000, 1))
+    return entry
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Autocrop a directory of end-of-fight screenshots in parallel.")
+    parser.add_argument('input_dir', nargs='?', default='.', help="Directory of screenshots (default: current directory)")
+    parser.add_argument('-o', '--output-dir', default=DEFAULT_OUTPUT_DIR, help=f"Where the crops are written (default: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument('-m', '--manifest', help="Manifest path, .json or .csv (default: <output-dir>/manifest.json)")
+    parser.add_argument('-t', '--template', default=DEFAULT_TEMPLATE, help=f"Title bar template (default: {DEFAULT_TEMPLATE})")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help="Worker processes (default: CPU count)")
+    parser.add_argument('--stages', default=','.join(CASCADE_ORDER), help=f"Autocrop stages, in order, among {', '.join(CASCADE_STAGES)}")
+    parser.add_argument('-r', '--recursive', action='store_true', help="Include subdirectories")
+    parser.add_argument('--force', action='store_true', help="Re-crop images already in the manifest")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Print each stage's matching log")
+    args = parser.parse_args(argv)
+    args.stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+    unknown = [s for s in args.stages if s not in CASCADE_STAGES]
+    if unknown or not args.stages:
+        parser.error(f"unknown stages {unknown}; choose among {', '.join(CASCADE_STAGES)}")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    args.manifest = args.manifest or os.path.join(args.output_dir, 'manifest.json')
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if not os.path.exists(args.template):
+        print(f"ERROR: Template file '{args.template}' not found.")
+        return 1
+    # Computes (or loads) the template's features once, before the workers read the .npz cache
+    if template_registry.get(args.template) is None:
+        print(f"ERROR: Could not load template features from '{args.template}'.")
+        return 1
+    sha256 = template_sha256(args.template)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    exclude = {os.path.abspath(args.template), os.path.abspath(args.output_dir)}
+    names = list_images(args.input_dir, args.recursive, exclude)
+    entries = load_manifest(args.manifest)
+    todo = []
+    for name in names:
+        stat = os.stat(os.path.join(args.input_dir, name))
+        if args.force or not is_done(entries.get(name), stat.st_size, stat.st_mtime_ns, sha256, args.stages):
+            todo.append(name)
+    print(f"Found {len(names)} images in '{args.input_dir}': {len(names) - len(todo)} already done, {len(todo)} to crop "
+          f"with {args.workers} workers (stages: {', '.join(args.stages)}).")
+
+    counts = {"cropped": 0, "not_found": 0, "error": 0}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as executor:
+        futures = [executor.submit(crop_one, args.input_dir, name, args.output_dir, args.template, args.stages, args.verbose)
+                   for name in todo]
+        try:
+            for done, future in enumerate(as_completed(futures), start=1):
+                entry = future.result()
+                entry["template_sha256"] = sha256
+                entry["stages"] = ','.join(args.stages)
+                entries[entry["file"]] = entry
+                counts[entry["status"]] += 1
+                detail = f"{entry.get('stage')} {entry['elapsed_ms']:.0f} ms" if entry["status"] == "cropped" else entry.get("error", "")
+                print(f"[{done}/{len(todo)}] {entry['file']}: {entry['status']} {detail}".rstrip())
+                if done % MANIFEST_FLUSH_EVERY == 0:
+                    save_manifest(args.manifest, entries)
+        finally:
+            for future in futures:
+                future.cancel()
+            save_manifest(args.manifest, entries)
+
+    elapsed = time.perf_counter() - start
+    print(f"\n--- Processing complete in {elapsed:.1f}s ---")
+    print(f"Successfully cropped: {counts['cropped']}")
+    print(f"Window not found:     {counts['not_found']}")
+    print(f"Errors:               {counts['error']}")
+    print(f"Manifest: {args.manifest}")
+    return 0 if counts["error"] == 0 else 2
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
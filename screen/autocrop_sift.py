@@ -1,7 +1,16 @@
 import cv2
 import numpy as np
 import os
-import matplotlib.pyplot as plt
+
+try:
+    from .template_registry import template_registry
+    from .buffer_pool import get_buffer_pool
+    from .matchers import MATCHER_STRATEGIES, MATCHER_MODELS, STRATEGY_ORDER, SceneFeatures
+except ImportError:
+    # Direct execution (python autocrop_sift.py)
+    from template_registry import template_registry
+    from buffer_pool import get_buffer_pool
+    from matchers import MATCHER_STRATEGIES, MATCHER_MODELS, STRATEGY_ORDER, SceneFeatures
 
 DEBUG = False # Keep True for tuning
 
@@ -9,39 +18,262 @@ DEBUG = False # Keep True for tuning
 MIN_MATCH_COUNT = 10      # Minimum number of good SIFT matches required
 LOWE_RATIO = 0.75         # Ratio threshold for Lowe's ratio test (0.7-0.8 typical)
 TARGET_ASPECT_RATIO = 1.5 # The known Width/Height ratio of the full window
+try:
+    # Keypoints are detected on a copy of the scene whose long side is at most this (0 = full resolution)
+    DETECTION_MAX_SIDE = max(0, int(os.getenv('AUTOCROP_MAX_SIDE', '1280')))
+except ValueError:
+    print("Error: AUTOCROP_MAX_SIDE in .env file is not a valid integer. Using 1280.")
+    DETECTION_MAX_SIDE = 1280
+REFINE_MARGIN = 0.1 # Full-resolution refinement window around the coarse match, as a fraction of its width
+VERIFY_NCC_THRESHOLD = 0.8 # Minimum template correlation for a predicted window location to be accepted
+VERIFY_MARGIN = 4 # Pixels of slack around the predicted template location
+# Autocrop cascade, cheapest first (see find_window_cascade)
+DEFAULT_CASCADE = "pyramid,features,heuristic"
+PYRAMID_MAX_SIDE = 320          # Coarse template search on a copy of the scene at most this long
+PYRAMID_MIN_WIDTH = 0.2         # Narrowest window searched, as a fraction of the screenshot width
+PYRAMID_STEPS = 10              # Template widths tried at the coarse level (geometric steps up to the full width)
+PYRAMID_REFINE_PASSES = 3       # Narrower width searches around the best coarse match
+PYRAMID_REFINE_STEPS = 5        # Template widths tried per refinement pass
+PYRAMID_REFINE_MAX_WIDTH = 400  # Refinement runs on a copy where the template is at most this wide
+PYRAMID_MIN_TEMPLATE_HEIGHT = 8 # Smaller scaled templates are not tried
+PYRAMID_COARSE_SCORE = 0.5      # Minimum coarse correlation to bother refining
+PYRAMID_ACCEPT_SCORE = 0.85     # Minimum refined correlation (the template's large flat bands correlate ~0.8 with other window edges)
+HEURISTIC_CANNY_LOW = 50
+HEURISTIC_CANNY_HIGH = 150
+HEURISTIC_ASPECT_TOLERANCE = 0.1 # Relative deviation from TARGET_ASPECT_RATIO
+HEURISTIC_MIN_AREA = 0.1         # Share of the screenshot the rectangle must cover...
+HEURISTIC_MAX_AREA = 0.95        # ...but not all of it (that would not crop anything)
 # --- End Parameters ---
 
-def autocrop_sift_ratio(img, template_path):
+CASCADE_STAGES = ("pyramid", "features", "heuristic")
+
+def _load_cascade():
+    names = [n.strip() for n in os.getenv('AUTOCROP_CASCADE', DEFAULT_CASCADE).split(',') if n.strip()]
+    unknown = [n for n in names if n not in CASCADE_STAGES]
+    if unknown or not names:
+        print(f"Error: AUTOCROP_CASCADE in .env file has unknown stages {unknown}. Using '{DEFAULT_CASCADE}'.")
+        names = DEFAULT_CASCADE.split(',')
+    return names
+
+# Autocrop stages tried in order until one finds the window
+CASCADE_ORDER = _load_cascade()
+
+def _bounded_copy(img_gray, max_side, buffer_name):
+    """
+    img_gray downscaled (INTER_AREA) so its long side is at most max_side, into the worker's
+    buffer_name buffer (see buffer_pool).
+
+    Returns:
+        tuple: (image, scale), scale being copy size / original size (1.0 and img_gray itself if not downscaled).
     """
-    Finds a template using SIFT features, calculates the full window size
+    long_side = max(img_gray.shape[:2])
+    if max_side <= 0 or long_side <= max_side:
+        return img_gray, 1.0
+    scale = max_side / long_side
+    scene_h, scene_w = img_gray.shape[:2]
+    size = (max(1, int(round(scene_w * scale))), max(1, int(round(scene_h * scale))))
+    small = cv2.resize(img_gray, size, dst=get_buffer_pool().get(buffer_name, (size[1], size[0])), interpolation=cv2.INTER_AREA)
+    return small, scale
+
+def _detection_scene(img_scene_gray):
+    """
+    The grayscale scene downscaled so its long side is at most DETECTION_MAX_SIDE.
+
+    Returns:
+        tuple: (scene, scale), scale being scene size / original size (1.0 if not downscaled).
+    """
+    return _bounded_copy(img_scene_gray, DETECTION_MAX_SIDE, 'detection_gray')
+
+def _window_rect(template_x, template_y, template_w, scene_w, scene_h):
+    """
+    The full window rectangle from the template's detected box: same left/top and width as the
+    template (the template is the top of the window, full width), height from TARGET_ASPECT_RATIO.
+
+    Returns:
+        tuple: (x1, y1, x2, y2) clipped to the scene, or None if the dimensions are invalid.
+    """
+    # Calculate FULL window dimensions based on DETECTED template width and aspect ratio
+    if template_w <= 5: # Check for a reasonably positive width
+        print(f"Error: Detected template width ({template_w}) is too small.")
+        return None
+    if TARGET_ASPECT_RATIO <= 0:
+         print(f"Error: Invalid TARGET_ASPECT_RATIO ({TARGET_ASPECT_RATIO}).")
+         return None
+
+    # This is the core logic based on your constraints
+    full_window_width = template_w # Assumption: Template width = Full window width
+    full_window_height = int(round(full_window_width / TARGET_ASPECT_RATIO))
+
+    if full_window_height <= 0:
+        print(f"Error: Calculated full window height ({full_window_height}) is invalid.")
+        return None
+
+    print(f"Calculated full window size: W={full_window_width}, H={full_window_height} (Ratio: {TARGET_ASPECT_RATIO})")
+
+    # Define final crop coordinates (assuming template is at the top)
+    crop_x = template_x
+    crop_y = template_y
+    crop_w = full_window_width
+    crop_h = full_window_height
+
+    # Boundary checks for the FULL CROP against the scene dimensions
+    final_x1 = max(0, crop_x)
+    final_y1 = max(0, crop_y)
+    # Calculate bottom-right based on top-left and calculated dimensions
+    final_x2 = final_x1 + crop_w
+    final_y2 = final_y1 + crop_h
+    # Clip bottom-right to scene boundaries
+    final_x2 = min(scene_w, final_x2)
+    final_y2 = min(scene_h, final_y2)
+    # Recalculate final width/height after clipping
+    final_w = final_x2 - final_x1
+    final_h = final_y2 - final_y1
+
+    print(f"Final crop region (clipped): x={final_x1}, y={final_y1}, w={final_w}, h={final_h}")
+
+    # The rectangle to cut from the original COLOR image
+    if final_w > 0 and final_h > 0: # Ensure valid dimensions before cropping
+        return (final_x1, final_y1, final_x2, final_y2)
+    print("Warning: Final calculated crop dimensions are invalid (w<=0 or h<=0) after clipping.")
+    return None
+
+def _find_homography(kp_template, kp_scene, good_matches, img, template_features, strategy):
+    """
+    Homography template -> scene from the good matches, with RANSAC. Strategies whose model
+    is 'similarity' (see matchers.MATCHER_MODELS) fit scale + translation only.
+
+    Returns:
+        tuple: (M, matchesMask), or None if there are fewer than MIN_MATCH_COUNT good matches or RANSAC inliers.
+    """
+    if len(good_matches) < MIN_MATCH_COUNT:
+        print(f"[{strategy}] Not enough good matches found - {len(good_matches)}/{MIN_MATCH_COUNT}")
+        if DEBUG and len(good_matches) > 0: # Show poor matches if debug is on
+             import matplotlib.pyplot as plt # Debug only, too slow to import at startup
+             template = template_features.load_image()
+             # Only draw the good matches, even if below threshold
+             img_matches_debug = cv2.drawMatches(template, kp_template, img, kp_scene, good_matches, None, flags=cv2.DrawMatchesFlags_NOT_DRAW_SINGLE_POINTS)
+             plt.figure(figsize=(12, 6))
+             plt.imshow(cv2.cvtColor(img_matches_debug, cv2.COLOR_BGR2RGB))
+             plt.title(f'{strategy} matches ({len(good_matches)} good) - Below Threshold ({MIN_MATCH_COUNT})')
+             plt.show()
+        return None
+
+    src_pts = np.float32([ kp_template[m.queryIdx].pt for m in good_matches ]).reshape(-1,1,2)
+    dst_pts = np.float32([ kp_scene[m.trainIdx].pt for m in good_matches ]).reshape(-1,1,2)
+
+    # RANSAC helps filter out outlier matches when calculating the transformation
+    if MATCHER_MODELS.get(strategy) == "similarity":
+        A, mask = cv2.estimateAffinePartial2D(src_pts, dst_pts, method=cv2.RANSAC, ransacReprojThreshold=3.0)
+        M = np.vstack([A, [0, 0, 1]]) if A is not None else None
+    else:
+        M, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0) # 5.0 is RANSAC reprojection threshold
+
+    if M is None:
+        print(f"[{strategy}] Error: Could not compute Homography matrix (matches might be collinear or insufficient).")
+        return None
+
+    matchesMask = mask.ravel().tolist()
+    print(f"[{strategy}] {sum(matchesMask)} matches were considered inliers by RANSAC.")
+
+    # Check if enough inliers support the model
+    if sum(matchesMask) < MIN_MATCH_COUNT:
+         print(f"[{strategy}] Error: Not enough inlier matches ({sum(matchesMask)}) after RANSAC to trust homography.")
+         # Draw matches to see why so many were rejected
+         if DEBUG:
+             import matplotlib.pyplot as plt
+             template = template_features.load_image()
+             img_matches_debug = cv2.drawMatches(template, kp_template, img, kp_scene, good_matches, None, matchColor=(255,0,0), singlePointColor=None, matchesMask=matchesMask, flags=cv2.DrawMatchesFlags_NOT_DRAW_SINGLE_POINTS)
+             plt.figure(figsize=(12, 6))
+             plt.imshow(cv2.cvtColor(img_matches_debug, cv2.COLOR_BGR2RGB))
+             plt.title(f'{strategy} matches ({len(good_matches)} good, {sum(matchesMask)} inliers) - RANSAC Failed Threshold')
+             plt.show()
+         return None
+    return M, matchesMask
+
+def _match_template(template_features, scene_gray, strategies):
+    """
+    Tries the matcher strategies in order on scene_gray.
+
+    Returns:
+        tuple: (M, matchesMask, strategy) with M mapping template to scene_gray coordinates, or None.
+    """
+    scene = SceneFeatures(scene_gray) # Scene keypoints are computed once per detector
+    for strategy in strategies:
+        try:
+            kp_template, kp_scene, good_matches = MATCHER_STRATEGIES[strategy](template_features, scene, LOWE_RATIO)
+        except cv2.error as e:
+            print(f"[{strategy}] OpenCV error during feature detection/matching: {e}")
+            continue
+        print(f"[{strategy}] Found {len(good_matches)} good matches after ratio test ({len(kp_template)} template / {len(kp_scene)} scene keypoints).")
+        homography = _find_homography(kp_template, kp_scene, good_matches, scene_gray, template_features, strategy)
+        if homography is not None:
+            return homography[0], homography[1], strategy
+    return None
+
+def _refine_match(template_features, img_scene_gray, M, strategies):
+    """
+    Re-matches the template at full resolution, in a window around where the coarse homography M
+    (template -> full-resolution scene) puts it. The window is about the template's size, so this
+    costs the same whatever the screenshot resolution.
+
+    Returns:
+        tuple: (M, matchesMask, strategy) in full-resolution coordinates, or None.
+    """
+    h, w = template_features.shape
+    corners = cv2.perspectiveTransform(np.float32([ [0,0],[0,h-1],[w-1,h-1],[w-1,0] ]).reshape(-1,1,2), M)
+    x, y, box_w, box_h = cv2.boundingRect(np.int32(corners))
+    margin = int(REFINE_MARGIN * box_w)
+    scene_h, scene_w = img_scene_gray.shape[:2]
+    x1, y1 = max(0, x - margin), max(0, y - margin)
+    x2, y2 = min(scene_w, x + box_w + margin), min(scene_h, y + box_h + margin)
+    if x2 - x1 <= 10 or y2 - y1 <= 10:
+        return None
+    refined = _match_template(template_features, img_scene_gray[y1:y2, x1:x2], strategies)
+    if refined is None:
+        return None
+    M_roi, matchesMask, strategy = refined
+    return np.array([[1, 0, x1], [0, 1, y1], [0, 0, 1]], dtype=np.float64) @ M_roi, matchesMask, strategy
+
+def find_window_match(img, template_path, strategies=None, img_scene_gray=None, details=None):
+    """
+    Finds a template using feature matching, calculates the full window size
     based on the template's detected width and a target aspect ratio,
-    then crops the full window. Assumes template is at the top of the full window
+    and returns the full window rectangle. Assumes template is at the top of the full window
     and has the same width.
+    The matcher strategies (see matchers.py) are tried in order until one passes the
+    MIN_MATCH_COUNT and RANSAC-inlier checks.
+    Keypoints and homography are first computed on a copy of the scene downscaled to
+    DETECTION_MAX_SIDE, then refined at full resolution in a window around that match, so
+    the cost depends on the window's size rather than the screenshot's. If nothing is found
+    on the downscaled copy, the full-resolution scene is searched.
 
     Args:
         img (np.ndarray): The input image (screenshot).
         template_path (str): Path to the template image (must have same width as full window,
                              and be from the top section).
+        strategies (list): Strategy names to try, in order. Defaults to matchers.STRATEGY_ORDER.
+        img_scene_gray (np.ndarray): img already converted to grayscale, if the caller has it.
+        details (dict): If given, receives the match's RANSAC 'inliers' count.
 
     Returns:
-        np.ndarray: The cropped image, or None if no good match found or calculation fails.
+        tuple: (window_rect, strategy). window_rect is (x1, y1, x2, y2) of the window in img,
+               clipped to the image, or None if no good match found or calculation fails.
+               strategy is the name of the matcher that found it, or None.
     """
     if img is None:
         print("Error: Input image is None.")
-        return None
-    if not os.path.exists(template_path):
-        print(f"Error: Template image not found at {template_path}")
-        return None
+        return None, None
 
-    # Load images in grayscale
-    img_scene_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    template = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
+    # Template keypoints/descriptors are computed once and cached (see template_registry)
+    template_features = template_registry.get(template_path)
+    if template_features is None:
+        print(f"Error: Could not load template features from {template_path}")
+        return None, None
 
-    if template is None:
-        print(f"Error: Could not load template image from {template_path}")
-        return None
+    if img_scene_gray is None:
+        img_scene_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=get_buffer_pool().get('scene_gray', img.shape[:2]))
 
-    template_h, template_w = template.shape[:2]
+    template_h, template_w = template_features.shape
     scene_h, scene_w = img_scene_gray.shape[:2]
 
     # Basic check if template is larger than scene
@@ -49,159 +281,274 @@ def autocrop_sift_ratio(img, template_path):
         print("Warning: Template dimensions exceed scene dimensions.")
         # Consider returning None or trying to resize
 
-    try:
-        # 1. Initialize SIFT Detector
-        sift = cv2.SIFT_create()
-
-        # 2. Find Keypoints and Descriptors
-        kp_template, des_template = sift.detectAndCompute(template, None)
-        kp_scene, des_scene = sift.detectAndCompute(img_scene_gray, None)
+    # 0. Bounded-size detection level, so the cost does not grow with the screenshot resolution
+    img_detection_gray, detection_scale = _detection_scene(img_scene_gray)
+    if detection_scale < 1.0:
+        print(f"Detecting keypoints on a {img_detection_gray.shape[1]}x{img_detection_gray.shape[0]} copy (scale {detection_scale:.3f}).")
+
+    # 1-5. Match template and scene features, then estimate the homography, cheapest strategy first
+    strategies = strategies or STRATEGY_ORDER
+    match = _match_template(template_features, img_detection_gray, strategies)
+    if match is not None and detection_scale < 1.0:
+        # Template -> detection level, then detection level -> full-resolution scene
+        M, matchesMask, strategy = match
+        M = np.diag([1.0 / detection_scale, 1.0 / detection_scale, 1.0]) @ M
+        match = _refine_match(template_features, img_scene_gray, M, strategies)
+        if match is None:
+            print("Full-resolution refinement failed. Using the downscaled match.")
+            match = (M, matchesMask, strategy)
+    elif match is None and detection_scale < 1.0:
+        print("Template not found on the downscaled copy (window too small?). Retrying at full resolution.")
+        match = _match_template(template_features, img_scene_gray, strategies)
+    if match is None:
+        print("No matcher strategy found the template.")
+        return None, None
+    M, matchesMask, strategy = match
+    if details is not None:
+        details["inliers"] = int(sum(matchesMask))
+
+    # 6. Get corners of the TEMPLATE in the scene using the homography
+    h, w = template_features.shape # Original template dimensions
+    pts_template_corners = np.float32([ [0,0],[0,h-1],[w-1,h-1],[w-1,0] ]).reshape(-1,1,2)
+    dst_scene_corners = cv2.perspectiveTransform(pts_template_corners, M)
+
+    # 7. Calculate the bounding box of the DETECTED TEMPLATE in the scene
+    # This gives us the location and dimensions *as seen in the image*
+    template_x, template_y, template_w_detected, template_h_detected = cv2.boundingRect(np.int32(dst_scene_corners))
+    print(f"Detected template bounding box: x={template_x}, y={template_y}, w={template_w_detected}, h={template_h_detected}")
+
+    # 8-11. FULL window from the template's box and the aspect ratio, clipped to the scene
+    window_rect = _window_rect(template_x, template_y, template_w_detected, scene_w, scene_h)
+
+    if DEBUG and window_rect is not None:
+        import matplotlib.pyplot as plt
+        img_debug = img.copy()
+        # Draw polygon around the detected TEMPLATE location
+        cv2.polylines(img_debug, [np.int32(dst_scene_corners)], True, (0, 255, 0), 2, cv2.LINE_AA) # Green for template detection outline
+        # Draw rectangle for the calculated FULL CROP region
+        cv2.rectangle(img_debug, window_rect[:2], window_rect[2:], (0, 0, 255), 3) # Red for final crop area
+
+        plt.figure(figsize=(10,8))
+        plt.imshow(cv2.cvtColor(img_debug, cv2.COLOR_BGR2RGB))
+        plt.title(f'Green=Detected Template, Red=Calculated Full Crop ({sum(matchesMask)} inliers, {strategy})')
+        plt.show()
+
+    return window_rect, (strategy if window_rect is not None else None)
+
+def _best_scaled_match(scene_gray, template, widths):
+    """
+    Best TM_CCOEFF_NORMED match of template resized to each width in widths.
 
-        if des_template is None or des_scene is None or len(kp_template) == 0 or len(kp_scene) == 0:
-            print("Error: Could not compute SIFT descriptors or no keypoints found.")
-            return None
-        print(f"Found {len(kp_template)} SIFT keypoints in template, {len(kp_scene)} in scene.")
+    Returns:
+        tuple: (score, (x, y), width), or None if no width fits in the scene.
+    """
+    template_h, template_w = template.shape[:2]
+    scene_h, scene_w = scene_gray.shape[:2]
+    best = None
+    for width in widths:
+        width = int(round(width))
+        height = int(round(template_h * width / template_w))
+        if height < PYRAMID_MIN_TEMPLATE_HEIGHT or width > scene_w or height > scene_h:
+            continue
+        interpolation = cv2.INTER_AREA if width < template_w else cv2.INTER_LINEAR
+        scaled_template = cv2.resize(template, (width, height), interpolation=interpolation)
+        _, score, _, location = cv2.minMaxLoc(cv2.matchTemplate(scene_gray, scaled_template, cv2.TM_CCOEFF_NORMED))
+        if best is None or score > best[0]:
+            best = (score, location, width)
+    return best
+
+def find_template_box_pyramid(img_scene_gray, template_path):
+    """
+    Finds the template by multi-scale normalized cross-correlation. The template is rigid (the
+    same title bar at another size), so only its scale is searched: PYRAMID_STEPS candidate
+    widths on a copy of the scene at most PYRAMID_MAX_SIDE long, then PYRAMID_REFINE_PASSES
+    narrower ranges around the best one, on a window around its location scaled so the
+    template is at most PYRAMID_REFINE_MAX_WIDTH wide.
 
-        # 3. Match Descriptors using BFMatcher (or FLANN)
-        # Using Brute-Force Matcher
-        bf = cv2.BFMatcher()
-        matches = bf.knnMatch(des_template, des_scene, k=2) # k=2 for ratio test
+    Returns:
+        tuple: (template_x, template_y, template_w, score) in img_scene_gray, or None if the
+               best refined score is below PYRAMID_ACCEPT_SCORE.
+    """
+    template_features = template_registry.get(template_path)
+    template = template_features.load_image() if template_features is not None else None
+    if template is None:
+        print(f"Error: Could not load template image {template_path}")
+        return None
+    template_h, template_w = template.shape[:2]
+    scene_h, scene_w = img_scene_gray.shape[:2]
 
-    except cv2.error as e:
-        print(f"OpenCV error during SIFT detection/matching: {e}")
-        print("Ensure 'opencv-contrib-python' is installed.")
+    # 1. Coarse level: window widths from PYRAMID_MIN_WIDTH of the screenshot to all of it
+    coarse_gray, coarse_scale = _bounded_copy(img_scene_gray, PYRAMID_MAX_SIDE, 'pyramid_gray')
+    coarse = _best_scaled_match(coarse_gray, template, coarse_gray.shape[1] * np.geomspace(PYRAMID_MIN_WIDTH, 1.0, PYRAMID_STEPS))
+    if coarse is None or coarse[0] < PYRAMID_COARSE_SCORE:
+        print(f"[pyramid] No coarse match (best score {coarse[0] if coarse else float('nan'):.2f}).")
         return None
+    score, (x, y), width = coarse
+    x, y, width = x / coarse_scale, y / coarse_scale, width / coarse_scale
+
+    # 2. Narrower width ranges around the best match, each pass one step of the previous one wide
+    span = (1.0 / PYRAMID_MIN_WIDTH) ** (1.0 / max(1, PYRAMID_STEPS - 1))
+    refine_scale = min(1.0, PYRAMID_REFINE_MAX_WIDTH / width)
+    for _ in range(PYRAMID_REFINE_PASSES):
+        margin = 2.0 / coarse_scale + (span - 1.0) * width
+        x1, y1 = max(0, int(x - margin)), max(0, int(y - margin))
+        x2 = min(scene_w, int(np.ceil(x + width * span + margin)))
+        y2 = min(scene_h, int(np.ceil(y + template_h * width * span / template_w + margin)))
+        roi = img_scene_gray[y1:y2, x1:x2]
+        if refine_scale < 1.0:
+            size = (max(1, int(round(roi.shape[1] * refine_scale))), max(1, int(round(roi.shape[0] * refine_scale))))
+            roi = cv2.resize(roi, size, dst=get_buffer_pool().get('pyramid_roi', (size[1], size[0])), interpolation=cv2.INTER_AREA)
+        widths = refine_scale * width * np.geomspace(1.0 / span, span, PYRAMID_REFINE_STEPS)
+        refined = _best_scaled_match(roi, template, widths)
+        if refined is None:
+            break
+        score, (roi_x, roi_y), roi_w = refined
+        x, y, width = x1 + roi_x / refine_scale, y1 + roi_y / refine_scale, roi_w / refine_scale
+        span = span ** (2.0 / max(1, PYRAMID_REFINE_STEPS - 1))
+    if score < PYRAMID_ACCEPT_SCORE:
+        print(f"[pyramid] Best match score {score:.2f} is below {PYRAMID_ACCEPT_SCORE}.")
+        return None
+    template_x, template_y, template_w = int(round(x)), int(round(y)), int(round(width))
+    print(f"[pyramid] Template found at x={template_x}, y={template_y}, w={template_w} (score {score:.2f}).")
+    return template_x, template_y, template_w, score
 
-    # 4. Filter Matches using Lowe's Ratio Test
-    good_matches = []
-    # Check if matches list is valid and contains pairs
-    if matches and len(matches[0]) == 2:
-        for m, n in matches:
-            # Check if distances are valid before comparison
-            if n.distance > 1e-6: # Avoid division by zero or near-zero
-                 if m.distance < LOWE_RATIO * n.distance:
-                    good_matches.append(m)
-            # Handle cases where n.distance is very small (potential perfect match?)
-            # You might decide to keep 'm' if n.distance is effectively zero.
-            # elif m.distance < 1e-6: # If m is also ~zero, it's a good match
-            #    good_matches.append(m)
+def find_window_rect_heuristic(img_scene_gray):
+    """
+    Last-resort crop without the template: the largest high-contrast rectangle whose aspect
+    ratio is within HEURISTIC_ASPECT_TOLERANCE of TARGET_ASPECT_RATIO, found on the edges of a
+    copy at most PYRAMID_MAX_SIDE long.
 
-    else:
-        print("Warning: knnMatch did not return pairs as expected.")
-        # Handle cases where matching might have failed or returned single matches
+    Returns:
+        tuple: (x1, y1, x2, y2) in img_scene_gray, or None if no rectangle covers between
+               HEURISTIC_MIN_AREA and HEURISTIC_MAX_AREA of the screenshot.
+    """
+    small, scale = _bounded_copy(img_scene_gray, PYRAMID_MAX_SIDE, 'pyramid_gray')
+    small_h, small_w = small.shape[:2]
+    edges = cv2.Canny(small, HEURISTIC_CANNY_LOW, HEURISTIC_CANNY_HIGH)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    best = None
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        area = w * h
+        if h <= 0 or abs(w / h - TARGET_ASPECT_RATIO) > HEURISTIC_ASPECT_TOLERANCE * TARGET_ASPECT_RATIO:
+            continue
+        if not HEURISTIC_MIN_AREA * small_w * small_h <= area <= HEURISTIC_MAX_AREA * small_w * small_h:
+            continue
+        if best is None or area > best[2] * best[3]:
+            best = (x, y, w, h)
+    if best is None:
+        print("[heuristic] No high-contrast rectangle with the window's aspect ratio.")
+        return None
+    x, y, w, h = best
+    scene_h, scene_w = img_scene_gray.shape[:2]
+    window_rect = (max(0, int(round(x / scale))), max(0, int(round(y / scale))),
+                   min(scene_w, int(round((x + w) / scale))), min(scene_h, int(round((y + h) / scale))))
+    print(f"[heuristic] Using rectangle {window_rect} ({w}x{h} on the {small_w}x{small_h} copy).")
+    return window_rect
 
-    print(f"Found {len(good_matches)} good matches after ratio test.")
+def find_window_cascade(img, template_path, stages=None, details=None):
+    """
+    Runs the autocrop stages in order and stops at the first that finds the window:
+      pyramid   - multi-scale template correlation (find_template_box_pyramid), cheap and exact
+                  for the usual unscaled, unrotated window
+      features  - ORB / SIFT feature matching (find_window_match), for what correlation misses
+      heuristic - largest high-contrast rectangle with the window's aspect ratio
+                  (find_window_rect_heuristic), so the uncropped screenshot is rarely OCRed
 
-    # 5. Estimate Homography (if enough good matches)
-    if len(good_matches) >= MIN_MATCH_COUNT:
-        src_pts = np.float32([ kp_template[m.queryIdx].pt for m in good_matches ]).reshape(-1,1,2)
-        dst_pts = np.float32([ kp_scene[m.trainIdx].pt for m in good_matches ]).reshape(-1,1,2)
+    Returns:
+        tuple: (window_rect, stage). stage is 'pyramid', the name of the matcher strategy that
+               found the window, or 'heuristic'; (None, None) if every stage failed.
+        details (dict, if given) receives the pyramid 'score' or the feature match's 'inliers'.
+    """
+    if img is None:
+        print("Error: Input image is None.")
+        return None, None
+    img_scene_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=get_buffer_pool().get('scene_gray', img.shape[:2]))
+    scene_h, scene_w = img_scene_gray.shape[:2]
+    for stage in stages or CASCADE_ORDER:
+        if stage == "pyramid":
+            box = find_template_box_pyramid(img_scene_gray, template_path)
+            if box is not None:
+                window_rect = _window_rect(box[0], box[1], box[2], scene_w, scene_h)
+                if window_rect is not None:
+                    if details is not None:
+                        details["score"] = round(float(box[3]), 3)
+                    return window_rect, "pyramid"
+        elif stage == "features":
+            window_rect, strategy = find_window_match(img, template_path, img_scene_gray=img_scene_gray, details=details)
+            if window_rect is not None:
+                return window_rect, strategy
+        elif stage == "heuristic":
+            window_rect = find_window_rect_heuristic(img_scene_gray)
+            if window_rect is not None:
+                return window_rect, "heuristic"
+    return None, None
+
+def find_window_rect_sift(img, template_path):
+    """
+    (x1, y1, x2, y2) of the full window found by find_window_match, or None.
+    """
+    return find_window_match(img, template_path)[0]
 
-        # RANSAC helps filter out outlier matches when calculating the transformation
-        M, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0) # 5.0 is RANSAC reprojection threshold
+def verify_window_rect(img, window_rect, template_path):
+    """
+    Cheap check that the window is where window_rect says: normalized cross-correlation of the
+    template, scaled to the rectangle's width, at the top of the rectangle (within VERIFY_MARGIN px).
 
-        if M is None:
-            print("Error: Could not compute Homography matrix (matches might be collinear or insufficient).")
-            # Debug drawing can help diagnose why homography failed
-            # ...
-            return None
-
-        matchesMask = mask.ravel().tolist()
-        print(f"{sum(matchesMask)} matches were considered inliers by RANSAC.")
-
-        # Check if enough inliers support the model
-        if sum(matchesMask) < MIN_MATCH_COUNT:
-             print(f"Error: Not enough inlier matches ({sum(matchesMask)}) after RANSAC to trust homography.")
-             # Draw matches to see why so many were rejected
-             if DEBUG:
-                 img_matches_debug = cv2.drawMatches(template, kp_template, img, kp_scene, good_matches, None, matchColor=(255,0,0), singlePointColor=None, matchesMask=matchesMask, flags=cv2.DrawMatchesFlags_NOT_DRAW_SINGLE_POINTS)
-                 plt.figure(figsize=(12, 6))
-                 plt.imshow(cv2.cvtColor(img_matches_debug, cv2.COLOR_BGR2RGB))
-                 plt.title(f'SIFT Matches ({len(good_matches)} good, {sum(matchesMask)} inliers) - RANSAC Failed Threshold')
-                 plt.show()
-             return None
-
-
-        # 6. Get corners of the TEMPLATE in the scene using the homography
-        h, w = template.shape # Original template dimensions
-        pts_template_corners = np.float32([ [0,0],[0,h-1],[w-1,h-1],[w-1,0] ]).reshape(-1,1,2)
-        dst_scene_corners = cv2.perspectiveTransform(pts_template_corners, M)
-
-        # 7. Calculate the bounding box of the DETECTED TEMPLATE in the scene
-        # This gives us the location and dimensions *as seen in the image*
-        template_x, template_y, template_w_detected, template_h_detected = cv2.boundingRect(np.int32(dst_scene_corners))
-        print(f"Detected template bounding box: x={template_x}, y={template_y}, w={template_w_detected}, h={template_h_detected}")
-
-        # 8. Calculate FULL window dimensions based on DETECTED template width and aspect ratio
-        if template_w_detected <= 5: # Check for a reasonably positive width
-            print(f"Error: Detected template width ({template_w_detected}) is too small.")
-            return None
-        if TARGET_ASPECT_RATIO <= 0:
-             print(f"Error: Invalid TARGET_ASPECT_RATIO ({TARGET_ASPECT_RATIO}).")
-             return None
-
-        # This is the core logic based on your constraints
-        full_window_width = template_w_detected # Assumption: Template width = Full window width
-        full_window_height = int(round(full_window_width / TARGET_ASPECT_RATIO))
-
-        if full_window_height <= 0:
-            print(f"Error: Calculated full window height ({full_window_height}) is invalid.")
-            return None
-
-        print(f"Calculated full window size: W={full_window_width}, H={full_window_height} (Ratio: {TARGET_ASPECT_RATIO})")
-
-        # 9. Define final crop coordinates (assuming template is at the top)
-        crop_x = template_x
-        crop_y = template_y
-        crop_w = full_window_width
-        crop_h = full_window_height
-
-        # 10. Boundary checks for the FULL CROP against the scene dimensions
-        final_x1 = max(0, crop_x)
-        final_y1 = max(0, crop_y)
-        # Calculate bottom-right based on top-left and calculated dimensions
-        final_x2 = final_x1 + crop_w
-        final_y2 = final_y1 + crop_h
-        # Clip bottom-right to scene boundaries
-        final_x2 = min(scene_w, final_x2)
-        final_y2 = min(scene_h, final_y2)
-        # Recalculate final width/height after clipping
-        final_w = final_x2 - final_x1
-        final_h = final_y2 - final_y1
-
-        print(f"Final crop region (clipped): x={final_x1}, y={final_y1}, w={final_w}, h={final_h}")
-
-        # 11. Crop the original COLOR image
-        if final_w > 0 and final_h > 0: # Ensure valid dimensions before cropping
-            cropped_img = img[final_y1:final_y2, final_x1:final_x2]
-        else:
-            print("Warning: Final calculated crop dimensions are invalid (w<=0 or h<=0) after clipping.")
-            cropped_img = None
-
-        if DEBUG:
-            img_debug = img.copy()
-            # Draw polygon around the detected TEMPLATE location
-            cv2.polylines(img_debug, [np.int32(dst_scene_corners)], True, (0, 255, 0), 2, cv2.LINE_AA) # Green for template detection outline
-            # Draw rectangle for the calculated FULL CROP region
-            cv2.rectangle(img_debug, (final_x1, final_y1), (final_x2, final_y2), (0, 0, 255), 3) # Red for final crop area
-
-            plt.figure(figsize=(10,8))
-            plt.imshow(cv2.cvtColor(img_debug, cv2.COLOR_BGR2RGB))
-            plt.title(f'Green=Detected Template, Red=Calculated Full Crop ({sum(matchesMask)} inliers)')
-            plt.show()
-
-        return cropped_img
+    Returns:
+        float: the best correlation score (-1 to 1), or -1.0 if it cannot be computed.
+    """
+    template_features = template_registry.get(template_path)
+    if template_features is None or img is None:
+        return -1.0
+    template = template_features.load_image()
+    if template is None:
+        return -1.0
+    x1, y1, x2, y2 = window_rect
+    template_h, template_w = template_features.shape
+    predicted_w = x2 - x1
+    predicted_h = int(round(template_h * predicted_w / template_w))
+    if predicted_w < 10 or predicted_h < 2:
+        return -1.0
+
+    scene_h, scene_w = img.shape[:2]
+    roi = img[max(0, y1 - VERIFY_MARGIN):min(scene_h, y1 + predicted_h + VERIFY_MARGIN),
+              max(0, x1 - VERIFY_MARGIN):min(scene_w, x1 + predicted_w + VERIFY_MARGIN)]
+    if roi.shape[0] < predicted_h or roi.shape[1] < predicted_w:
+        return -1.0
+    roi_gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY, dst=get_buffer_pool().get('verify_gray', roi.shape[:2])) if roi.ndim == 3 else roi
+    interpolation = cv2.INTER_AREA if predicted_w < template_w else cv2.INTER_LINEAR
+    scaled_template = cv2.resize(template, (predicted_w, predicted_h), interpolation=interpolation)
+    return float(cv2.matchTemplate(roi_gray, scaled_template, cv2.TM_CCOEFF_NORMED).max())
 
-    else:
-        print(f"Not enough good matches found - {len(good_matches)}/{MIN_MATCH_COUNT}")
-        if DEBUG and len(good_matches) > 0: # Show poor matches if debug is on
-             # Only draw the good matches, even if below threshold
-             img_matches_debug = cv2.drawMatches(template, kp_template, img, kp_scene, good_matches, None, flags=cv2.DrawMatchesFlags_NOT_DRAW_SINGLE_POINTS)
-             plt.figure(figsize=(12, 6))
-             plt.imshow(cv2.cvtColor(img_matches_debug, cv2.COLOR_BGR2RGB))
-             plt.title(f'SIFT Matches ({len(good_matches)} good) - Below Threshold ({MIN_MATCH_COUNT})')
-             plt.show()
+def autocrop_sift_ratio(img, template_path):
+    """
+    Crops the full window found by find_window_rect_sift.
+
+    Returns:
+        np.ndarray: The cropped image (a view into img), or None if no good match found or calculation fails.
+    """
+    window_rect = find_window_rect_sift(img, template_path)
+    if window_rect is None:
         return None
+    x1, y1, x2, y2 = window_rect
+    return img[y1:y2, x1:x2]
+
+def find_window_rect (img) :
+    """(x1, y1, x2, y2) of the end-of-fight window in img, or None."""
+    template_image_path = 'template_sift_top.png'
+    return find_window_cascade(img, template_image_path)[0]
+
+def find_window (img) :
+    """((x1, y1, x2, y2) or None, name of the autocrop stage / matcher strategy that found it or None)."""
+    template_image_path = 'template_sift_top.png'
+    return find_window_cascade(img, template_image_path)
+
+def verify_window (img, window_rect) :
+    """True if the end-of-fight window's title bar is where window_rect predicts."""
+    template_image_path = 'template_sift_top.png'
+    return verify_window_rect(img, window_rect, template_image_path) >= VERIFY_NCC_THRESHOLD
 
 def autocrop (img) : 
     template_image_path = 'template_sift_top.png' 
@@ -209,61 +556,6 @@ def autocrop (img) :
 
 
 if __name__ == '__main__':
-
-    imgs_dir = '.'
-    output_dir = 'autocroped_sift_ratio'
-    template_image_path = 'template_sift_top.png'
-
-    # --- Set Target Aspect Ratio ---
-    try:
-        # Optionally load from a config file or args later
-        target_ratio = TARGET_ASPECT_RATIO
-        if target_ratio <= 0: raise ValueError("Aspect ratio must be positive")
-        print(f"Using Target Aspect Ratio (W/H): {target_ratio}")
-    except Exception as e:
-        print(f"Error setting target aspect ratio: {e}")
-        exit()
-
-
-    if not os.path.exists(template_image_path):
-        print(f"\nERROR: Template file '{template_image_path}' not found.")
-        print("Please create this template image meeting the width and top-section criteria.")
-        exit()
-
-    imgs = os.listdir(imgs_dir)
-    # Filter for common image types, excluding the template itself
-    imgs = [f for f in imgs if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')) and f != os.path.basename(template_image_path)]
-    print(f"\nFound {len(imgs)} images in '{imgs_dir}' to process.")
-
-    os.makedirs(output_dir, exist_ok=True)
-
-    processed_count = 0
-    failed_count = 0
-    for img_name in imgs:
-        img_path = os.path.join(imgs_dir, img_name)
-        print(f"\nProcessing: {img_name}")
-        img = cv2.imread(img_path)
-
-        if img is None:
-            print(f"  Warning: Could not read image {img_name}. Skipping.")
-            failed_count += 1
-            continue
-
-        autocroped = autocrop_sift_ratio(img, template_image_path)
-
-        if autocroped is not None and autocroped.size > 0:
-            output_path = os.path.join(output_dir, img_name)
-            try:
-                cv2.imwrite(output_path, autocroped)
-                print(f"  Success: Saved cropped image to {output_path}")
-                processed_count += 1
-            except Exception as e:
-                print(f"  Error: Failed to save {output_path}: {e}")
-                failed_count += 1
-        else:
-            print(f"  Failed: Could not robustly find/crop window in {img_name}")
-            failed_count += 1
-
-    print(f"\n--- Processing complete ---")
-    print(f"Successfully cropped: {processed_count}")
-    print(f"Failed/Skipped:      {failed_count}")
\ No newline at end of file
+    # Batch autocrop of a directory (see autocrop_batch.py for the options)
+    from autocrop_batch import main
+    raise SystemExit(main())
@@ -0,0 +1,60 @@
+# bktree.py
+# Burkhard-Keller tree: nearest string within a distance threshold without computing the
+# distance to every entry. Each node's children are keyed by their distance to the node;
+# the triangle inequality then limits a search of radius r around a word at distance d from
+# a node to the children keyed d - r .. d + r.
+#
+# Entries keep their insertion rank, and ties on distance go to the lowest rank: built from
+# the same sequence, the tree answers exactly like a linear scan keeping the first best entry.
+
+
+class BKTree:
+    """BK-tree of strings under a metric distance_func (e.g. Levenshtein). Not thread-safe while adding."""
+    def __init__(self, distance_func, words=()):
+        self.distance_func = distance_func
+        self._root = None # (word, rank, {distance: child node})
+        self._size = 0
+        for word in words:
+            self.add(word)
+
+    def __len__(self):
+        return self._size
+
+    def add(self, word: str) -> bool:
+        """Adds word with the next rank. Returns False (keeping the first rank) if it is already in the tree."""
+        if self._root is None:
+            self._root = (word, self._size, {})
+            self._size += 1
+            return True
+        node = self._root
+        while True:
+            d = self.distance_func(word, node[0])
+            if d == 0:
+                return False
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = (word, self._size, {})
+                self._size += 1
+                return True
+            node = child
+
+    def closest(self, word: str, max_distance):
+        """
+        The entry closest to word within max_distance (lowest rank among equals) and its distance,
+        or (None, float('inf')) if there is none.
+        """
+        if self._root is None:
+            return None, float('inf')
+        best_word, best_rank, best_distance = None, -1, float('inf')
+        stack = [self._root]
+        while stack:
+            node_word, node_rank, children = stack.pop()
+            d = self.distance_func(word, node_word)
+            if d <= max_distance and (d < best_distance or (d == best_distance and node_rank < best_rank)):
+                best_word, best_rank, best_distance = node_word, node_rank, d
+            # Entries tying with the best one can still win on rank, so the radius includes them
+            radius = min(max_distance, best_distance)
+            for edge, child in children.items():
+                if d - radius <= edge <= d + radius:
+                    stack.append(child)
+        return best_word, best_distance
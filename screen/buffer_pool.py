@@ -0,0 +1,88 @@
+# buffer_pool.py
+# Reusable preprocessing buffers, one pool per worker thread. The screen pipeline writes its
+# intermediate images (grayscale scene, detection copy, OCR resize, RGB conversion) into named
+# buffers through OpenCV's dst= outputs instead of allocating new arrays for every screenshot,
+# so a long-running worker's memory stays flat. A buffer only grows: a smaller image is a view
+# on the start of the existing one.
+#
+# A buffer is only valid until the same name is requested again on the same thread: callers
+# must not keep pooled arrays beyond the job that asked for them.
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- Parameters to Tune ---
+try:
+    BUFFER_POOL_MAX_BYTES = int(float(os.getenv('BUFFER_POOL_MAX_MB', '128')) * 1024 * 1024) # Per worker thread; beyond it, arrays are not pooled
+except ValueError:
+    logger.error("BUFFER_POOL_MAX_MB in .env file is not a valid number. Using 128 MB.")
+    BUFFER_POOL_MAX_BYTES = 128 * 1024 * 1024
+BUFFER_GROWTH = 1.25 # Headroom when a buffer grows, so slightly larger images do not reallocate it again
+# --- End Parameters ---
+
+_thread_local = threading.local()
+_pools_lock = threading.Lock()
+_pools: list = [] # Every thread's pool, for stats
+
+
+class BufferPool:
+    """Named, growable uint8 backing stores handed out as arrays of the requested shape (not thread-safe)."""
+    def __init__(self, max_bytes: int = BUFFER_POOL_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._buffers: dict[str, np.ndarray] = {}
+        self.reused = 0
+        self.allocated = 0
+        self.unpooled = 0 # Requests over max_bytes, served with a fresh array
+
+    @property
+    def nbytes(self) -> int:
+        return sum(buffer.nbytes for buffer in list(self._buffers.values()))
+
+    def get(self, name: str, shape, dtype=np.uint8) -> np.ndarray:
+        """A C-contiguous array of shape/dtype backed by the named buffer. Its content is undefined."""
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape)) * dtype.itemsize
+        buffer = self._buffers.get(name)
+        if buffer is not None and buffer.nbytes >= size:
+            self.reused += 1
+        else:
+            current = buffer.nbytes if buffer is not None else 0
+            capacity = int(size * BUFFER_GROWTH)
+            if self.nbytes - current + capacity > self.max_bytes:
+                capacity = size
+            if self.nbytes - current + capacity > self.max_bytes:
+                self.unpooled += 1
+                return np.empty(shape, dtype=dtype)
+            self._buffers.pop(name, None) # Release the old buffer before allocating the larger one
+            buffer = self._buffers[name] = np.empty(capacity, dtype=np.uint8)
+            self.allocated += 1
+        return buffer[:size].view(dtype).reshape(shape)
+
+    def stats(self) -> dict:
+        return {"buffers": len(self._buffers), "bytes": self.nbytes, "reused": self.reused,
+                "allocated": self.allocated, "unpooled": self.unpooled}
+
+
+def get_buffer_pool() -> BufferPool:
+    """The calling thread's BufferPool (created on first use; OcrPool workers each get their own)."""
+    pool = getattr(_thread_local, 'pool', None)
+    if pool is None:
+        pool = _thread_local.pool = BufferPool()
+        with _pools_lock:
+            _pools.append(pool)
+    return pool
+
+
+def buffer_stats() -> dict:
+    """Totals over every thread's pool."""
+    with _pools_lock:
+        pools = list(_pools)
+    totals = {"pools": len(pools), "buffers": 0, "bytes": 0, "reused": 0, "allocated": 0, "unpooled": 0}
+    for pool in pools:
+        for key, value in pool.stats().items():
+            totals[key] += value
+    return totals
@@ -0,0 +1,76 @@
+# geometry_cache.py
+# Last successful autocrop rectangle per (uploader id, screenshot width, screenshot height).
+# A member usually screenshots at the same resolution with the game window in the same place,
+# so the previous rectangle is tried first; the caller confirms it with a cheap check (template
+# correlation at the predicted location) before skipping the feature-matching search.
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# --- Parameters to Tune ---
+try:
+    GEOMETRY_CACHE_SIZE = max(0, int(os.getenv('GEOMETRY_CACHE_SIZE', '256'))) # Entries kept (least recently used evicted)
+except ValueError:
+    logger.error("GEOMETRY_CACHE_SIZE in .env file is not a valid integer. Using 256.")
+    GEOMETRY_CACHE_SIZE = 256
+# --- End Parameters ---
+
+
+class GeometryCache:
+    """Thread-safe in-memory LRU of (uploader_id, width, height) -> crop rectangle (x1, y1, x2, y2)."""
+    def __init__(self, max_entries: int = GEOMETRY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, tuple] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0 # Entries found but failing verification
+        self.evictions = 0
+
+    def get_verified(self, key: tuple, verify):
+        """
+        The cached rectangle for key if verify(rect) is true, else None.
+        An entry failing verification is dropped (the window moved, or it is another kind of screenshot).
+        """
+        with self._lock:
+            crop_rect = self._entries.get(key)
+            if crop_rect is None:
+                self.misses += 1
+                return None
+        if verify(crop_rect): # Outside the lock: verification reads the image
+            with self._lock:
+                self.hits += 1
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+            return crop_rect
+        with self._lock:
+            self.rejected += 1
+            if self._entries.get(key) == crop_rect:
+                del self._entries[key]
+        return None
+
+    def put(self, key: tuple, crop_rect):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = tuple(int(v) for v in crop_rect)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.rejected
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "rejected": self.rejected,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
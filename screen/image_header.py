@@ -0,0 +1,58 @@
+# image_header.py
+# Image dimensions read from the PNG / JPEG header, without decoding (or allocating) the pixels.
+import logging
+import struct
+
+logger = logging.getLogger(__name__)
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# Start-of-frame markers carry the dimensions. C4 (DHT), C8 (JPG) and CC (DAC) share the range but are not frames.
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _png_size(data: bytes):
+    # Signature, then the IHDR chunk: length (4), type (4), width (4), height (4)
+    if len(data) < 24 or data[12:16] != b'IHDR':
+        return None
+    width, height = struct.unpack('>II', data[16:24])
+    return width, height
+
+
+def _jpeg_size(data: bytes):
+    i = 2 # After SOI
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF: # Fill byte
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7: # Markers without a length
+            i += 2
+            continue
+        segment_length = struct.unpack('>H', data[i + 2:i + 4])[0]
+        if marker in JPEG_SOF_MARKERS:
+            if i + 9 > len(data):
+                return None
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            return width, height
+        if marker == 0xDA: # Start of scan before any frame header
+            return None
+        i += 2 + segment_length
+    return None
+
+
+def read_image_size(data: bytes):
+    """
+    (format, width, height) from the PNG or JPEG header, or None for other formats / truncated headers.
+    """
+    try:
+        if data.startswith(PNG_SIGNATURE):
+            size = _png_size(data)
+            return ('png', *size) if size else None
+        if data.startswith(b'\xFF\xD8'):
+            size = _jpeg_size(data)
+            return ('jpeg', *size) if size else None
+    except struct.error as e:
+        logger.warning(f"Malformed image header: {e}")
+    return None
@@ -0,0 +1,150 @@
+# layout.py
+# Where the useful text lives in the (autocropped) end-of-fight window, in coordinates
+# normalized to the window size. Once autocrop has found the window, only these regions go
+# through OCR (detection and recognition) instead of the whole window: the layout narrows the
+# detection area, it does not skip detection. The one region is the names column (player
+# names, the "Gagnants" / "Perdants" dividers and the prism/perco entry); the title bar and
+# the XP, kamas and loot columns are never read. Rows are not at fixed positions (the
+# divider moves with the number of winners), so every region is detected. The region extents
+# are checked against what they read (see layout_check); if the check fails, the caller
+# falls back to full detection.
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- Parameters to Tune ---
+LAYOUT_PROFILE = os.getenv('OCR_LAYOUT_PROFILE', 'endscreen') # 'endscreen' (regions, with fallback) or 'full'
+ASPECT_RATIO_TOLERANCE = 0.15 # Allowed deviation from autocrop's TARGET_ASPECT_RATIO before the layout is distrusted
+DIVIDER_KEYWORDS = ("gagnant", "perdant") # At least one must be read for the region OCR to be trusted
+EDGE_MARGIN = 0.01 # A line ending this close (fraction of the window width) to a region's inner edge may be cut
+# --- End Parameters ---
+
+
+class Region:
+    """A rectangle in normalized window coordinates, run through text detection + recognition."""
+    def __init__(self, name: str, x0: float, y0: float, x1: float, y1: float):
+        self.name = name
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+
+    def to_pixels(self, width: int, height: int):
+        return (int(self.x0 * width), int(self.y0 * height), int(np.ceil(self.x1 * width)), int(np.ceil(self.y1 * height)))
+
+    def __repr__(self):
+        return f"<Region {self.name} ({self.x0}, {self.y0})-({self.x1}, {self.y1})>"
+
+
+LAYOUT_PROFILES = {
+    "endscreen": [
+        Region("names", 0.00, 0.07, 0.45, 1.00), # Names column, dividers included; row count varies
+    ],
+    "full": None,
+}
+
+
+def get_layout(profile: str = LAYOUT_PROFILE):
+    """Regions for the profile, or None for full-window detection."""
+    if profile not in LAYOUT_PROFILES:
+        logger.warning(f"Unknown OCR layout profile '{profile}'. Using full detection.")
+        return None
+    return LAYOUT_PROFILES[profile]
+
+
+def layout_applies(window_shape, crop_rect, target_aspect_ratio: float) -> bool:
+    """The region layout only makes sense on a window that autocrop actually found, with the expected shape."""
+    if crop_rect is None:
+        return False
+    h, w = window_shape[:2]
+    if h <= 0 or w <= 0:
+        return False
+    return abs((w / h) - target_aspect_ratio) <= ASPECT_RATIO_TOLERANCE * target_aspect_ratio
+
+
+def lines_look_valid(ocr_lines) -> bool:
+    """Region OCR is trusted only if it read one of the winners/losers dividers."""
+    for _, text, _ in ocr_lines:
+        lowered = text.lower()
+        if any(keyword in lowered for keyword in DIVIDER_KEYWORDS):
+            return True
+    return False
+
+
+def lines_inside_regions(ocr_lines, regions, width: int) -> bool:
+    """False if a line runs into the right edge of a region that stops inside the window: the column was cut too narrow."""
+    margin = EDGE_MARGIN * width
+    for region in regions:
+        if region.x1 >= 1.0:
+            continue
+        edge = region.x1 * width
+        for box, _, _ in ocr_lines:
+            xs = [p[0] for p in box]
+            if min(xs) < edge and max(xs) >= edge - margin:
+                return False
+    return True
+
+
+def _divider_y(ocr_lines, keyword: str):
+    for box, text, _ in ocr_lines:
+        if keyword in text.lower():
+            return float(np.mean([p[1] for p in box]))
+    return None
+
+
+def rows_look_complete(ocr_lines) -> bool:
+    """
+    The names column has one line per row at a fixed pitch, so the gap between the winners and
+    losers dividers tells how many rows sit between them. Fewer lines there means the region
+    lost names. Without both dividers (or without enough lines to measure the pitch), nothing is checked.
+    """
+    winners_y = _divider_y(ocr_lines, DIVIDER_KEYWORDS[0])
+    losers_y = _divider_y(ocr_lines, DIVIDER_KEYWORDS[1])
+    if winners_y is None or losers_y is None or losers_y <= winners_y:
+        return True
+
+    centers = sorted(float(np.mean([p[1] for p in box])) for box, _, _ in ocr_lines)
+    line_height = float(np.median([max(p[1] for p in box) - min(p[1] for p in box) for box, _, _ in ocr_lines]))
+    rows = [centers[0]]
+    for y in centers[1:]: # Boxes on the same row (a name read in two pieces) count once
+        if y - rows[-1] > line_height / 2:
+            rows.append(y)
+    if len(rows) < 3:
+        return True
+
+    pitch = float(np.median(np.diff(rows)))
+    if pitch <= 0:
+        return True
+    expected = int((losers_y - winners_y) / pitch) - 1 # Floor: extra spacing around the dividers is not a row
+    found = sum(1 for y in rows if winners_y + line_height / 2 < y < losers_y - line_height / 2)
+    return found >= expected
+
+
+def layout_check(ocr_lines, regions, window_shape):
+    """Why the region OCR cannot be trusted, or None if it can."""
+    if not lines_look_valid(ocr_lines):
+        return "no divider"
+    if not lines_inside_regions(ocr_lines, regions, window_shape[1]):
+        return "a line reaches a region edge"
+    if not rows_look_complete(ocr_lines):
+        return "fewer names than the dividers imply"
+    return None
+
+
+def ocr_regions(ocr_engine, img: np.ndarray, regions, cls: bool = True) -> list:
+    """
+    Runs OCR on each region of img and returns the lines as [(box, text, confidence), ...],
+    with boxes in img coordinates (same as a full-image run).
+    """
+    h, w = img.shape[:2]
+    ocr_lines = []
+    for region in regions:
+        x0, y0, x1, y1 = region.to_pixels(w, h)
+        sub_img = np.ascontiguousarray(img[y0:y1, x0:x1])
+        if sub_img.size == 0:
+            continue
+        det_result = ocr_engine.ocr(sub_img, cls=cls)
+        for line_data in (det_result[0] if det_result and det_result[0] else []):
+            box = [[p[0] + x0, p[1] + y0] for p in line_data[0]]
+            ocr_lines.append((box, line_data[1][0], line_data[1][1]))
+    return ocr_lines
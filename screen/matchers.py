@@ -0,0 +1,143 @@
+# matchers.py
+# Template-to-scene feature matching strategies for autocrop, cheapest first:
+#   orb_lsh    - ORB binary descriptors, FLANN LSH index over the template's descriptors
+#   sift_flann - SIFT descriptors, FLANN KD-tree index over the template's descriptors
+#   sift_bf    - SIFT descriptors, brute force (the original matcher, last resort)
+# The indexes are built once per template (and per thread, FLANN matchers are not thread-safe);
+# matching then only queries the scene descriptors against them. Scene features are computed
+# at most once per detector, whatever the number of strategies tried.
+import logging
+import os
+import threading
+
+import cv2
+import numpy as np
+
+try:
+    from .template_registry import get_sift, get_orb
+except ImportError:
+    # Direct execution (python autocrop_sift.py)
+    from template_registry import get_sift, get_orb
+
+logger = logging.getLogger(__name__)
+
+# --- Parameters to Tune ---
+DEFAULT_MATCHER_STRATEGIES = "orb_lsh,sift_flann,sift_bf"
+ORB_SCENE_FEATURES = 10000 # ORB keypoints kept for a screenshot
+FLANN_INDEX_KDTREE = 1
+FLANN_INDEX_LSH = 6
+FLANN_KDTREE_PARAMS = dict(algorithm=FLANN_INDEX_KDTREE, trees=5)
+FLANN_LSH_PARAMS = dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1)
+FLANN_SEARCH_PARAMS = dict(checks=50)
+# --- End Parameters ---
+
+_thread_local = threading.local()
+
+
+class SceneFeatures:
+    """Grayscale scene with its SIFT / ORB features, computed on first use."""
+    def __init__(self, gray: np.ndarray):
+        self.gray = gray
+        self._sift = None
+        self._orb = None
+
+    @property
+    def sift(self):
+        if self._sift is None:
+            self._sift = get_sift().detectAndCompute(self.gray, None)
+        return self._sift
+
+    @property
+    def orb(self):
+        if self._orb is None:
+            self._orb = get_orb(ORB_SCENE_FEATURES).detectAndCompute(self.gray, None)
+        return self._orb
+
+
+def _trained_flann(strategy: str, template_features, descriptors: np.ndarray, index_params: dict):
+    """The calling thread's FLANN matcher with an index over the template's descriptors, built once."""
+    matchers = getattr(_thread_local, 'flann', None)
+    if matchers is None:
+        matchers = _thread_local.flann = {}
+    key = (strategy, template_features.sha256)
+    matcher = matchers.get(key)
+    if matcher is None:
+        matcher = cv2.FlannBasedMatcher(index_params, FLANN_SEARCH_PARAMS)
+        matcher.add([descriptors])
+        matcher.train()
+        matchers[key] = matcher
+    return matcher
+
+
+def _ratio_test_scene_to_template(knn_matches, ratio: float) -> list:
+    """Lowe's ratio test on scene->template matches, returned as template->scene DMatches."""
+    good_matches = []
+    for pair in knn_matches:
+        if len(pair) < 2: # LSH may find fewer than 2 neighbours
+            continue
+        m, n = pair
+        if n.distance > 1e-6 and m.distance < ratio * n.distance:
+            good_matches.append(cv2.DMatch(m.trainIdx, m.queryIdx, m.distance))
+    return good_matches
+
+
+def match_orb_lsh(template_features, scene: SceneFeatures, ratio: float):
+    kp_scene, des_scene = scene.orb
+    if template_features.orb_descriptors is None or len(template_features.orb_keypoints) < 2 or des_scene is None or len(kp_scene) < 2:
+        return template_features.orb_keypoints, kp_scene or [], []
+    matcher = _trained_flann('orb_lsh', template_features, template_features.orb_descriptors, FLANN_LSH_PARAMS)
+    knn_matches = matcher.knnMatch(des_scene, k=2)
+    return template_features.orb_keypoints, kp_scene, _ratio_test_scene_to_template(knn_matches, ratio)
+
+
+def match_sift_flann(template_features, scene: SceneFeatures, ratio: float):
+    kp_scene, des_scene = scene.sift
+    if des_scene is None or len(kp_scene) < 2:
+        return template_features.keypoints, kp_scene or [], []
+    matcher = _trained_flann('sift_flann', template_features, np.float32(template_features.descriptors), FLANN_KDTREE_PARAMS)
+    knn_matches = matcher.knnMatch(np.float32(des_scene), k=2)
+    return template_features.keypoints, kp_scene, _ratio_test_scene_to_template(knn_matches, ratio)
+
+
+def match_sift_bf(template_features, scene: SceneFeatures, ratio: float):
+    kp_scene, des_scene = scene.sift
+    if des_scene is None or len(kp_scene) == 0:
+        return template_features.keypoints, kp_scene or [], []
+    matches = cv2.BFMatcher().knnMatch(template_features.descriptors, des_scene, k=2) # k=2 for ratio test
+    good_matches = []
+    for pair in matches:
+        if len(pair) < 2:
+            continue
+        m, n = pair
+        if n.distance > 1e-6 and m.distance < ratio * n.distance: # Avoid division by zero or near-zero
+            good_matches.append(m)
+    return template_features.keypoints, kp_scene, good_matches
+
+
+MATCHER_STRATEGIES = {
+    "orb_lsh": match_orb_lsh,
+    "sift_flann": match_sift_flann,
+    "sift_bf": match_sift_bf,
+}
+
+# Geometric model fitted on each strategy's matches. The template is an unrotated, undistorted
+# part of a screenshot, so scale + translation ('similarity') is enough; a full homography over
+# the thin template strip lets ORB's less precise keypoints skew the corners by several percent.
+MATCHER_MODELS = {
+    "orb_lsh": "similarity",
+    "sift_flann": "homography",
+    "sift_bf": "homography",
+}
+
+
+def _load_strategies() -> list:
+    names = [n.strip() for n in os.getenv('AUTOCROP_MATCHERS', DEFAULT_MATCHER_STRATEGIES).split(',') if n.strip()]
+    unknown = [n for n in names if n not in MATCHER_STRATEGIES]
+    if unknown or not names:
+        logger.error(f"AUTOCROP_MATCHERS in .env file has unknown strategies {unknown}. Using '{DEFAULT_MATCHER_STRATEGIES}'.")
+        names = DEFAULT_MATCHER_STRATEGIES.split(',')
+    return names
+
+
+# Strategies tried in order until one passes the match-count and RANSAC-inlier checks
+STRATEGY_ORDER = _load_strategies()
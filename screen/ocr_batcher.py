@@ -0,0 +1,204 @@
+# ocr_batcher.py
+# Micro-batching of PaddleOCR's text recognition. Each worker thread runs text detection on
+# its own image with its own engine, then hands the cropped text lines to the batcher. Lines
+# from workers arriving at about the same time are grouped: the first one becomes the batch
+# leader, waits up to OCR_BATCH_WINDOW_MS for others, then runs a single recognition pass over
+# every line of every image. Each caller gets back the same structure `engine.ocr(img, cls=...)`
+# would have returned for its own image.
+import logging
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- Parameters to Tune ---
+try:
+    OCR_BATCH_WINDOW_MS = max(0.0, float(os.getenv('OCR_BATCH_WINDOW_MS', '25')))
+except ValueError:
+    logger.error("OCR_BATCH_WINDOW_MS in .env file is not a valid number. Using 25 ms.")
+    OCR_BATCH_WINDOW_MS = 25.0
+try:
+    OCR_BATCH_MAX_SIZE = max(1, int(os.getenv('OCR_BATCH_MAX_SIZE', '8')))
+except ValueError:
+    logger.error("OCR_BATCH_MAX_SIZE in .env file is not a valid integer. Using 8.")
+    OCR_BATCH_MAX_SIZE = 8
+DROP_SCORE = 0.5 # Same default as PaddleOCR's own det+rec pipeline
+# --- End Parameters ---
+
+
+class _BatchItem:
+    def __init__(self, crops, cls):
+        self.crops = crops
+        self.cls = cls
+        self.enqueued_at = time.monotonic()
+        self.lead = False
+        self.wake = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _sort_boxes(boxes):
+    """Top-to-bottom, then left-to-right, like PaddleOCR's sorted_boxes."""
+    boxes = sorted(boxes, key=lambda b: (b[0][1], b[0][0]))
+    for i in range(len(boxes) - 1):
+        for j in range(i, -1, -1):
+            if abs(boxes[j + 1][0][1] - boxes[j][0][1]) < 10 and boxes[j + 1][0][0] < boxes[j][0][0]:
+                boxes[j], boxes[j + 1] = boxes[j + 1], boxes[j]
+            else:
+                break
+    return boxes
+
+
+def _crop_box(img, box):
+    """Perspective-crops one detected text box, like PaddleOCR's get_rotate_crop_image."""
+    points = np.float32(box)
+    crop_w = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    crop_h = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    crop_w, crop_h = max(crop_w, 1), max(crop_h, 1)
+    dst = np.float32([[0, 0], [crop_w, 0], [crop_w, crop_h], [0, crop_h]])
+    M = cv2.getPerspectiveTransform(points, dst)
+    crop = cv2.warpPerspective(img, M, (crop_w, crop_h), borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    if crop.shape[0] / crop.shape[1] >= 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+def recognize(engine, crops: list, cls: bool) -> list:
+    """
+    (text, confidence) of each text line crop, in one recognition pass of engine.
+    PaddleOCR's ocr() treats a list given with det=False as the text lines of one image.
+    """
+    if not crops:
+        return []
+    rec_output = engine.ocr(crops, det=False, rec=True, cls=cls)
+    rec_results = rec_output[0] if rec_output else []
+    if len(rec_results) != len(crops):
+        raise ValueError(f"recognizer returned {len(rec_results)} results for {len(crops)} text lines")
+    return rec_results
+
+
+class OcrBatcher:
+    """Groups concurrent text recognition calls from several worker threads into batches."""
+    def __init__(self, window_ms: float = OCR_BATCH_WINDOW_MS, max_batch: int = OCR_BATCH_MAX_SIZE):
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._cond = threading.Condition()
+        self._pending: list[_BatchItem] = []
+        self._leader_active = False
+        self._batches = 0
+        self._images = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and self.max_batch > 1
+
+    def recognize(self, engine, crops: list, cls=True) -> list:
+        """Blocking. Same return value as recognize(engine, crops, cls), possibly computed in a batch led by another worker."""
+        if not self.enabled:
+            return recognize(engine, crops, cls)
+
+        item = _BatchItem(crops, cls)
+        with self._cond:
+            self._pending.append(item)
+            if not self._leader_active:
+                self._leader_active = True
+                item.lead = True
+            elif len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+
+        if not item.lead:
+            item.wake.wait() # Woken either with a result, or promoted to lead the next batch
+        if item.lead:
+            self._lead(engine, item)
+
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _lead(self, engine, item):
+        deadline = item.enqueued_at + self.window
+        with self._cond:
+            while len(self._pending) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+
+        try:
+            self._run_batch(engine, batch)
+        except Exception as e:
+            logger.warning(f"OcrBatcher: batched recognition failed ({e}). Falling back to one image at a time.")
+            for batch_item in batch:
+                try:
+                    batch_item.result = recognize(engine, batch_item.crops, batch_item.cls)
+                except Exception as item_error:
+                    batch_item.error = item_error
+
+        with self._cond:
+            self._batches += 1
+            self._images += len(batch)
+            next_leader = None
+            if self._pending:
+                next_leader = self._pending[0]
+                next_leader.lead = True
+            else:
+                self._leader_active = False
+
+        for batch_item in batch:
+            if batch_item is not item:
+                batch_item.wake.set()
+        if next_leader is not None:
+            next_leader.wake.set()
+
+    def _run_batch(self, engine, batch):
+        """One recognition pass per cls value over the text lines of every image, routed back to each item."""
+        lines = 0
+        for cls in (True, False):
+            items = [batch_item for batch_item in batch if bool(batch_item.cls) == cls]
+            crops = [crop for batch_item in items for crop in batch_item.crops]
+            rec_results = recognize(engine, crops, cls)
+            offset = 0
+            for batch_item in items:
+                batch_item.result = rec_results[offset:offset + len(batch_item.crops)]
+                offset += len(batch_item.crops)
+            lines += len(crops)
+        logger.info(f"OcrBatcher: recognized a batch of {len(batch)} images ({lines} text lines).")
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "batches": self._batches,
+                "images": self._images,
+                "mean_batch_size": round(self._images / self._batches, 2) if self._batches else 0.0,
+                "pending": len(self._pending),
+            }
+
+
+class BatchedOcrEngine:
+    """Wraps one worker's PaddleOCR engine so that its `ocr()` calls go through a shared OcrBatcher."""
+    def __init__(self, engine, batcher: OcrBatcher):
+        self.engine = engine
+        self.batcher = batcher
+
+    def ocr(self, img, det=True, rec=True, cls=True):
+        """Same return value as `engine.ocr(img, det=det, rec=rec, cls=cls)`."""
+        if not (det and rec) or not self.batcher.enabled: # Single-stage calls (e.g. recognition-only regions) are not batched
+            return self.engine.ocr(img, det=det, rec=rec, cls=cls)
+
+        # 1. Detection on this worker's own engine (PaddleOCR cannot batch images of different sizes)
+        det_result = self.engine.ocr(img, det=True, rec=False, cls=False)
+        boxes = _sort_boxes(det_result[0]) if det_result and det_result[0] else []
+        crops = [_crop_box(img, box) for box in boxes]
+
+        # 2. Recognition, batched with the other workers' text lines
+        rec_results = self.batcher.recognize(self.engine, crops, cls=cls)
+
+        # 3. engine.ocr's [[box, (text, confidence)], ...] format
+        lines = [[box, (text, confidence)] for box, (text, confidence) in zip(boxes, rec_results) if confidence >= DROP_SCORE]
+        return [lines] if lines else [None]
@@ -0,0 +1,186 @@
+# ocr_pool.py
+# Runs the blocking screen pipeline (download, autocrop, resize, PaddleOCR) off the
+# discord.py event loop, on a fixed pool of worker threads. Each worker thread lazily
+# builds and keeps its own PaddleOCR instances (one per OCR profile), so engines are never
+# shared between threads.
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from .ocr_batcher import OcrBatcher, BatchedOcrEngine
+from .ocr_profiles import OCR_PROFILES, OCR_TIERS, OcrProfile, tier_stats
+from .perf import record
+from .buffer_pool import buffer_stats
+from .screen_gate import gate_stats
+from .token_cache import token_cache
+
+logger = logging.getLogger(__name__)
+
+# --- Parameters to Tune ---
+# One worker per screenshot of a typical multi-image post (3-4), bounded by the CPU count
+DEFAULT_OCR_POOL_WORKERS = min(4, os.cpu_count() or 1)
+try:
+    OCR_POOL_WORKERS = max(1, int(os.getenv('OCR_POOL_WORKERS', str(DEFAULT_OCR_POOL_WORKERS))))
+except ValueError:
+    logger.error(f"OCR_POOL_WORKERS in .env file is not a valid integer. Using {DEFAULT_OCR_POOL_WORKERS} workers.")
+    OCR_POOL_WORKERS = DEFAULT_OCR_POOL_WORKERS
+OCR_LANG = 'fr'
+# --- End Parameters ---
+
+
+def create_ocr_engine(profile: OcrProfile = OCR_PROFILES["accurate"]):
+    """Builds a new PaddleOCR engine for an OCR profile. Slow (model load), call once per worker thread and profile."""
+    from paddleocr import PaddleOCR # Imported here so loading this module stays cheap
+    start_init = time.time()
+    engine = PaddleOCR(lang=OCR_LANG, use_angle_cls=profile.use_angle_cls, det_limit_side_len=profile.det_limit_side_len, show_log=False)
+    logger.info(f"PaddleOCR engine '{profile.name}' initialized in {time.time() - start_init:.2f}s (thread: {threading.current_thread().name}).")
+    return engine
+
+
+class WorkerEngines:
+    """One worker thread's engines, one per OCR profile, each created on first use."""
+    def __init__(self, engine_factory, batchers: dict):
+        self._engine_factory = engine_factory
+        self._batchers = batchers
+        self._engines = {}
+
+    def get(self, profile_name: str) -> BatchedOcrEngine:
+        engine = self._engines.get(profile_name)
+        if engine is None:
+            engine = BatchedOcrEngine(self._engine_factory(OCR_PROFILES[profile_name]), self._batchers[profile_name])
+            self._engines[profile_name] = engine
+        return engine
+
+
+def _warm_up_job(ocr_engine=None):
+    """One dummy inference per OCR tier, so model loading and first-call setup happen before real traffic."""
+    dummy = np.full((64, 320, 3), 255, dtype=np.uint8)
+    cv2.putText(dummy, "Gagnants", (10, 44), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+    for profile in OCR_TIERS:
+        # Bypass the batcher: warm-up must not wait for real jobs
+        ocr_engine.get(profile.name).engine.ocr(dummy, cls=profile.use_angle_cls)
+
+
+class OcrPool:
+    """
+    A pool of worker threads, each holding its own PaddleOCR engines.
+
+    Coroutines await `run(func, *args)`; `func` is called in a worker thread with the
+    worker's WorkerEngines passed as the `ocr_engine` keyword argument. Each profile's engine
+    goes through a batcher shared by all workers, so concurrent images are recognized together.
+    """
+    def __init__(self, workers: int = OCR_POOL_WORKERS, engine_factory=create_ocr_engine, batchers: dict = None):
+        self.workers = workers
+        self._engine_factory = engine_factory
+        # One batcher per profile: a batch runs on its leader's engine, so profiles must not mix
+        self.batchers = batchers if batchers is not None else {name: OcrBatcher() for name in OCR_PROFILES}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr-worker")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._submitted = 0 # Jobs handed to the pool and not finished yet
+        self._running = 0   # Jobs currently executing in a worker
+        self._completed = 0
+        self._failed = 0
+        # Readiness: 'cold' (nothing loaded yet), 'warming', 'ready' or 'failed'
+        self.state = 'cold'
+        self.warmup_error = None
+        logger.info(f"OcrPool created with {workers} worker(s).")
+
+    def _get_engine(self):
+        """Returns the calling worker thread's engines."""
+        engines = getattr(self._local, 'engines', None)
+        if engines is None:
+            engines = WorkerEngines(self._engine_factory, self.batchers)
+            self._local.engines = engines
+        return engines
+
+    def _call(self, func, args, kwargs, queued_at):
+        record("queue_wait", time.perf_counter() - queued_at)
+        with self._lock:
+            self._running += 1
+        try:
+            return func(*args, ocr_engine=self._get_engine(), **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    async def run(self, func, *args, **kwargs):
+        """Runs `func(*args, ocr_engine=<worker engines>, **kwargs)` in the pool and awaits its result."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._submitted += 1
+            depth = self._submitted - self._running
+        logger.info(f"OcrPool: job queued ({depth} waiting/starting, {self._running}/{self.workers} busy).")
+        try:
+            result = await loop.run_in_executor(self._executor, self._call, func, args, kwargs, time.perf_counter())
+            with self._lock:
+                self._completed += 1
+            return result
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._submitted -= 1
+
+    async def warm_up(self):
+        """Loads every worker's engines and runs a dummy inference on them. Meant to run as a background task."""
+        if self.state in ('warming', 'ready'):
+            return
+        self.state = 'warming'
+        start_time = time.time()
+        logger.info(f"OcrPool: warming up {self.workers} OCR engine(s) in the background...")
+        results = await asyncio.gather(*[self.run(_warm_up_job) for _ in range(self.workers)], return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if len(errors) == len(results):
+            self.state = 'failed'
+            self.warmup_error = errors[0]
+            logger.error(f"OcrPool: warm-up failed, OCR is unavailable: {errors[0]}", exc_info=errors[0])
+        else:
+            if errors:
+                logger.warning(f"OcrPool: {len(errors)} engine(s) failed to warm up ({errors[0]}). They will retry on first use.")
+            self.state = 'ready'
+            logger.info(f"OcrPool: ready after {time.time() - start_time:.2f}s.")
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == 'ready'
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of jobs waiting for a free worker."""
+        with self._lock:
+            return max(0, self._submitted - self._running)
+
+    @property
+    def busy_workers(self) -> int:
+        with self._lock:
+            return self._running
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "workers": self.workers,
+                "busy": self._running,
+                "queued": max(0, self._submitted - self._running),
+                "completed": self._completed,
+                "failed": self._failed,
+                "batching": {name: batcher.stats() for name, batcher in self.batchers.items()},
+                "tiers": tier_stats(),
+                "buffers": buffer_stats(),
+                "gate": gate_stats(),
+                "tokens": token_cache.stats(),
+            }
+
+    def shutdown(self):
+        """Stops accepting jobs. Running jobs finish in the background."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        logger.info("OcrPool shut down.")
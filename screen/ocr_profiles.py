@@ -0,0 +1,85 @@
+# ocr_profiles.py
+# Named OCR configurations, cheapest first. A screenshot is read with the first tier; if the
+# parsed result looks unreliable (see parse_confidence), it is read again with the next one.
+import logging
+import os
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class OcrProfile:
+    """
+    use_angle_cls: load and run PaddleOCR's text angle classifier.
+    det_limit_side_len: longest side the detector resizes its input to.
+    target_width: widest the cropped window is resized to before OCR.
+    text_height: text line height (px) the window is scaled to, within target_width (see screen.text_scale).
+    """
+    def __init__(self, name: str, use_angle_cls: bool, det_limit_side_len: int, target_width: int, text_height: int):
+        self.name = name
+        self.use_angle_cls = use_angle_cls
+        self.det_limit_side_len = det_limit_side_len
+        self.target_width = target_width
+        self.text_height = text_height
+
+    def params(self) -> dict:
+        return {"name": self.name, "use_angle_cls": self.use_angle_cls,
+                "det_limit_side_len": self.det_limit_side_len, "target_width": self.target_width, "text_height": self.text_height}
+
+    def __repr__(self):
+        return f"<OcrProfile {self.name}>"
+
+
+# --- Parameters to Tune ---
+OCR_PROFILES = {
+    "fast": OcrProfile("fast", use_angle_cls=False, det_limit_side_len=640, target_width=960, text_height=12),
+    "accurate": OcrProfile("accurate", use_angle_cls=True, det_limit_side_len=960, target_width=1200, text_height=16), # target_width: the fixed width used before tiers existed
+}
+DEFAULT_OCR_TIERS = "fast,accurate"
+# Parse confidence (0-1) below which the next tier is tried
+try:
+    OCR_ESCALATE_BELOW = float(os.getenv('OCR_ESCALATE_BELOW', '0.7'))
+except ValueError:
+    logger.error("OCR_ESCALATE_BELOW in .env file is not a valid number. Using 0.7.")
+    OCR_ESCALATE_BELOW = 0.7
+# Weights of the parse confidence terms, summing to 1
+DIVIDER_WEIGHT = 0.4    # 'perdants' was read, so winners and losers could be split
+WINNERS_WEIGHT = 0.2    # At least one winner
+KNOWN_NAME_WEIGHT = 0.4 # Share of the read names that matched a known name or alias
+# --- End Parameters ---
+
+
+def _load_tiers() -> list:
+    names = [n.strip() for n in os.getenv('OCR_TIERS', DEFAULT_OCR_TIERS).split(',') if n.strip()]
+    unknown = [n for n in names if n not in OCR_PROFILES]
+    if unknown or not names:
+        logger.error(f"OCR_TIERS in .env file has unknown profiles {unknown}. Using '{DEFAULT_OCR_TIERS}'.")
+        names = DEFAULT_OCR_TIERS.split(',')
+    return [OCR_PROFILES[n] for n in names]
+
+
+OCR_TIERS = _load_tiers()
+
+_tier_counts = Counter()
+_tier_lock = threading.Lock()
+
+
+def parse_confidence(endscreen) -> float:
+    """How much the parsed EndScreen can be trusted, from 0 (garbage) to 1."""
+    names = set(endscreen.winners) | set(endscreen.losers)
+    known_share = endscreen.known_names_found / len(names) if names else 0.0
+    return (DIVIDER_WEIGHT * bool(endscreen.divider_found)
+            + WINNERS_WEIGHT * bool(endscreen.winners)
+            + KNOWN_NAME_WEIGHT * min(1.0, known_share))
+
+
+def record_tier(profile_name: str):
+    """Counts the tier a screenshot ended on."""
+    with _tier_lock:
+        _tier_counts[profile_name] += 1
+
+
+def tier_stats() -> dict:
+    with _tier_lock:
+        return dict(_tier_counts)
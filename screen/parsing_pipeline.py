@@ -1,219 +1,114 @@
 # parsing_pipeline.py
 # Ensure screen_utils is correctly importable. If it's in the same directory:
 try:
-    from .screen_utils import word_to_known, preprocess, distance, isnumber, ymean, ystd
+    from .screen_utils import preprocess, isnumber, PREPROCESS_TABLE
+    from .token_cache import token_cache
+    from .token_table import CATEGORY_DROPPED, CATEGORY_NOISE, CATEGORY_NUMBER, CATEGORY_VOCABULARY, CATEGORY_KNOWN_NAME, CATEGORY_CANDIDATE_NAME, NAME_CATEGORIES
 except ImportError:
     # Fallback for direct execution or different project structure
-    from screen_utils import word_to_known, preprocess, distance, isnumber, ymean, ystd
+    from screen_utils import preprocess, isnumber, PREPROCESS_TABLE
+    from token_cache import token_cache
+    from token_table import CATEGORY_DROPPED, CATEGORY_NOISE, CATEGORY_NUMBER, CATEGORY_VOCABULARY, CATEGORY_KNOWN_NAME, CATEGORY_CANDIDATE_NAME, NAME_CATEGORIES
     print("Warning: Using fallback import for screen_utils in parsing_pipeline.py")
 
 
 import os
 import logging
 
-logger = logging.getLogger(__name__)
-
-def stage0(words, positions):
-    """
-    Stage 0: Preprocess words and filter empty results.
-    Returns new lists of words and corresponding positions.
-    """
-    logger.info("Stage 0: Preprocessing words and positions.")
-    if not words:
-        logger.warning("Stage 0 received empty words list.")
-        return [], []
-
-    new_words = []
-    new_positions = []
-
-    for i, word in enumerate(words):
-        processed_word = preprocess(word) # preprocess from screen_utils
-        if processed_word:
-            new_words.append(processed_word)
-            if i < len(positions) and positions[i] and isinstance(positions[i], (list, tuple)) and len(positions[i]) >= 2:
-                new_positions.append(positions[i])
-            else:
-                logger.warning(f"Stage 0: Missing or invalid position for word '{word}' (original) at index {i}. Processed: '{processed_word}'. Position: {positions[i] if i < len(positions) else 'N/A'}. Skipping word.")
-                if new_words and new_words[-1] == processed_word: # Ensure we pop the correct one
-                    new_words.pop()
+import numpy as np
 
+logger = logging.getLogger(__name__)
 
-    logger.info(f"Stage 0: Reduced words from {len(words)} to {len(new_words)} after preprocessing.")
-    return new_words, new_positions
+# Characters of preprocessed words that are punctuation (word_to_known returns all-punctuation words as is)
+PREPROCESSED_PUNCTUATION = "_-:()#"
 
-def stage1 (words_from_stage0, positions, raw_vocab_list, threshold=3): # raw_vocab_list is id_card.VOCABULARY
+def resolve_word (processed_word, index, threshold=3):
     """
-    Stage 1: Maps words (already preprocessed by stage0) to known vocabulary words.
-    Keeps original word from stage0 if no close match is found or if it's a number.
+    word_to_known on a word already preprocessed, against a VocabularyIndex, memoized in
+    token_cache. Returns (matched_word, distance).
     """
-    logger.info("Stage 1: Mapping words to vocabulary.")
-    if not words_from_stage0:
-        logger.warning("Stage 1 received empty words list.")
-        return [], []
-
-    mapped_words_output = []
-
-    # Preprocess the raw vocabulary list ONCE for this stage
-    preprocessed_vocab_set = set(preprocess(v) for v in raw_vocab_list if v)
-    if not preprocessed_vocab_set:
-        logger.warning("Stage 1: Vocabulary became empty after preprocessing. All words will be kept as original.")
-
-    for i, ocr_word_processed_in_stage0 in enumerate(words_from_stage0):
-        # Note: word_to_known expects the "original_word_from_ocr" as its second argument.
-        # However, stage0 already did preprocessing. If word_to_known *needs* the truly raw OCR word
-        # for its punctuation/isnumber checks, stage0 would need to pass that along.
-        # Assuming for now that the `isnumber` and punctuation checks in `word_to_known`
-        # are fine even if the input `ocr_word_processed_in_stage0` has undergone basic cleaning by `preprocess`.
-        # If `preprocess` strips away what `isnumber` relies on, this could be an issue.
-        # For simplicity, let's pass the output of stage0 as the "original" for word_to_known's perspective.
-
-        # The `ocr_word_processed_in_stage0` is ALREADY preprocessed by stage0.
-        # `word_to_known` will preprocess it AGAIN. This is slightly redundant but usually harmless.
-        # If performance is critical, you could have two versions of word_to_known,
-        # or modify it to optionally skip internal preprocessing.
-
-        # For the current word_to_known, we pass the output of stage0 as `original_word_from_ocr`
-        # and it will be preprocessed again internally by word_to_known.
-        matched_word, dist = word_to_known(distance, ocr_word_processed_in_stage0, preprocessed_vocab_set, threshold=threshold)
-
-        # `matched_word` will be:
-        # 1. A word from `preprocessed_vocab_set` if a good match.
-        # 2. The `ocr_word_processed_in_stage0` itself if it was a number.
-        # 3. The `ocr_word_processed_in_stage0` itself if no good vocab match.
-        mapped_words_output.append(matched_word)
-
-    logger.info("Stage 1: Finished mapping words.")
-    return mapped_words_output, positions
+    cache_key = ("resolve", processed_word, threshold, index.vocabulary_key)
+    resolved = token_cache.get(cache_key)
+    if resolved is None:
+        if not processed_word.strip(PREPROCESSED_PUNCTUATION):
+            resolved = processed_word, float('inf')
+        elif isnumber(processed_word):
+            resolved = processed_word, -1
+        elif index.vocabulary_tree is None:
+            resolved = processed_word, float('inf')
+        else:
+            match, match_distance = index.vocabulary_tree.closest(processed_word, threshold)
+            resolved = (match, match_distance) if match is not None else (processed_word, match_distance)
+        token_cache.put(cache_key, resolved)
+    return resolved
 
-def stage2 (words, positions, known_names_and_aliases, vocabulary, std_factor=4):
+def classify_tokens (table, index, threshold=3):
     """
-    Stage 2: Classify words into potential names (known primary names, known aliases, or unknown)
-             vs other vocabulary words/numbers.
-    'known_names_and_aliases' is the comprehensive list of preprocessed primary IdCard names and all their preprocessed aliases.
-    Returns a dictionary.
+    Stages 0, 1 and 2 on a TokenTable (screen.token_table): each distinct word is preprocessed
+    once (one str.translate), resolved (resolve_word) and classified (known name, vocabulary,
+    number, plausible unknown name or noise); the results are broadcast to the rows' word_ids
+    and category columns.
+    index is the VocabularyIndex (screen.vocabulary_index) of the names and vocabulary.
+    Returns the number of rows kept (not empty after preprocessing).
     """
-    logger.info(f"Stage 2: Classifying words. Using {len(known_names_and_aliases)} known names/aliases.")
-    if not words:
-        logger.warning("Stage 2 received empty words list.")
-        return {"names": [], "name_positions": [], "nonames": [], "noname_positions": []}
-
-    # Ensure known_names_and_aliases are preprocessed and in a set for efficient lookup.
-    # This list comes from DataManagementCog.get_all_recognizable_names(), which should return cleaned (preprocessed) names.
-    known_names_aliases_set = set(known_names_and_aliases)
-
-    # Ensure vocabulary words are preprocessed for comparison
-    # vocab is passed from EndScreen.parse -> id_card.VOCABULARY
-    vocabulary_set = set(preprocess(v) for v in vocabulary if v)
-
-    potential_names = []
-    potential_name_positions = []
-    non_name_words = []
-    non_name_positions = []
-
-    for i, word in enumerate(words): # 'word' is preprocessed from stage0, potentially mapped in stage1
-        pos = positions[i]
-        if not (isinstance(pos, (list, tuple)) and len(pos) >= 2):
-             logger.warning(f"Stage 2: Skipping word '{word}' due to invalid position format: {pos}")
-             continue
-
-        # Classification Logic:
-        if word in known_names_aliases_set:
-            # It's a known primary name or a known alias
-            potential_names.append(word)
-            potential_name_positions.append(pos)
-            # logger.debug(f"Stage 2: Classified '{word}' as Potential Name (Known Name/Alias)")
-        elif word in vocabulary_set or isnumber(word):
-            # It's a specific vocabulary word (like 'perdants', 'niveau') or a number
-            non_name_words.append(word)
-            non_name_positions.append(pos)
-            # logger.debug(f"Stage 2: Classified '{word}' as Non-Name Word (Vocab/Number)")
-        else:
-            # It's not a known name/alias, not specific vocab, not a number -> Assume it's a potential unknown name
-            # Add filters here if needed (e.g., length, character types)
-            # For now, keeping it inclusive:
-            if len(word) > 1 and any(char.isalpha() for char in word): # Basic filter: at least 2 chars and one letter
-                potential_names.append(word)
-                potential_name_positions.append(pos)
-                # logger.debug(f"Stage 2: Classified '{word}' as Potential Name (Unknown but plausible)")
-            else:
-                # Words that don't fit other categories and are too short or non-alpha might be noise
-                non_name_words.append(word) # Or discard, or put in a 'noise' category
-                non_name_positions.append(pos)
-                # logger.debug(f"Stage 2: Classified '{word}' as Non-Name Word (Likely Noise/Junk)")
-
-
-    logger.info(f"Stage 2: Classified into {len(potential_names)} potential names and {len(non_name_words)} non-name/noise words.")
-    return {"names": potential_names,
-            "name_positions": potential_name_positions,
-            "nonames": non_name_words,
-            "noname_positions": non_name_positions}
-
-
-def stage3 (word_dict):
+    word_index = {}
+    text_word_ids = np.full(len(table.texts), -1, dtype=np.int32)
+    text_categories = np.full(len(table.texts), CATEGORY_DROPPED, dtype=np.int8)
+    names_set, vocabulary_set = index.names_set, index.vocabulary_set
+
+    for text_id, text in enumerate(table.texts):
+        processed_word = text.translate(PREPROCESS_TABLE) # preprocess
+        if not processed_word:
+            continue
+        word = resolve_word(processed_word, index, threshold)[0]
+        if word in names_set:
+            category = CATEGORY_KNOWN_NAME
+        elif word in vocabulary_set:
+            category = CATEGORY_VOCABULARY
+        elif isnumber(word):
+            category = CATEGORY_NUMBER
+        elif len(word) > 1 and any(char.isalpha() for char in word): # Plausible unknown name
+            category = CATEGORY_CANDIDATE_NAME
+        else: # Likely noise
+            category = CATEGORY_NOISE
+        text_word_ids[text_id] = word_index.setdefault(word, len(word_index))
+        text_categories[text_id] = category
+
+    table.words = list(word_index)
+    table.word_ids = text_word_ids[table.text_ids]
+    table.category = text_categories[table.text_ids]
+    kept = int(np.count_nonzero(table.category != CATEGORY_DROPPED))
+    names = int(np.count_nonzero(np.isin(table.category, NAME_CATEGORIES)))
+    logger.info(f"Classify: {kept}/{len(table)} words kept, {names} potential names and {kept - names} non-name/noise words "
+                f"({len(table.texts)} distinct words).")
+    return kept
+
+def split_tokens (table):
     """
-    Stage 3: Separate potential names into winners and losers based on their Y-position
-             relative to the 'perdants' keyword found in 'nonames'.
-    Returns lists: winners, losers.
+    Stage 3 on a classified TokenTable: names above the first 'perdants' (lower Y) are winners,
+    the others losers. Returns (winners, losers, divider_found); winners and losers are
+    distinct and sorted, both empty without names or without 'perdants'.
     """
-    logger.info("Stage 3: Separating winners and losers based on 'perdants' keyword position.")
-    winners = []
-    losers = []
-
-    potential_names = word_dict.get("names", [])
-    potential_name_positions = word_dict.get("name_positions", [])
-    non_names = word_dict.get("nonames", []) # These are words classified as non-player-names by stage2
-    non_name_positions = word_dict.get("noname_positions", [])
-
-    if not potential_names:
-        logger.warning("Stage 3: No potential names found to classify into winners/losers.")
-        return [], []
-
-    frontier_y = -1
-    perdants_keyword_found = False
-
-    # Find 'perdants' keyword in the non_names list (words from stage1 mapped to vocab)
-    # Ensure 'perdants' is preprocessed if it was in original vocab. It should be "perdants".
-    target_keyword = preprocess("perdants") # Should just be "perdants"
-
-    for i, nn_word in enumerate(non_names):
-        if nn_word == target_keyword: # nn_word is already preprocessed from stage1 or kept as is
-            if i < len(non_name_positions):
-                perdants_pos = non_name_positions[i]
-                if isinstance(perdants_pos, (list, tuple)) and len(perdants_pos) >= 2:
-                    frontier_y = perdants_pos[1] # Y-coordinate of 'perdants'
-                    perdants_keyword_found = True
-                    logger.info(f"Stage 3: Found '{target_keyword}' keyword at Y-position: {frontier_y:.2f}")
-                    break # Use the first occurrence
-                else:
-                    logger.warning(f"Stage 3: Found '{target_keyword}' but its position '{perdants_pos}' is invalid.")
-            else:
-                logger.warning(f"Stage 3: Found '{target_keyword}' word but its position data is missing.")
-
-    if not perdants_keyword_found:
-        logger.warning(f"Stage 3: Keyword '{target_keyword}' not found or its position invalid. Cannot reliably determine winner/loser split based on Y-position.")
-        # Fallback: If 'victoire' or 'défaite' keywords are present, could try to use them.
-        # Or, if 'perdants' is missing, it might imply everyone listed is a winner (if it's a victory screen without clear team separation).
-        # This is a complex heuristic. For now, if no 'perdants', we can't split by Y.
-        # One option: return all potential_names as unclassified or in a single list.
-        # For now, returning empty as per original if 'perdants' not found for split.
-        return [], []
-
-
-    for i, name in enumerate(potential_names):
-        if i < len(potential_name_positions):
-             pos = potential_name_positions[i]
-             if isinstance(pos, (list, tuple)) and len(pos) >= 2:
-                 name_y = pos[1]
-                 # Winners are ABOVE 'perdants' (lower Y value)
-                 # Losers are BELOW 'perdants' (higher Y value)
-                 if name_y < frontier_y:
-                     winners.append(name)
-                 else: # name_y >= frontier_y
-                     losers.append(name)
-             else:
-                 logger.warning(f"Stage 3: Skipping name '{name}' due to invalid position: {pos}")
-        else:
-             logger.warning(f"Stage 3: Skipping name '{name}' due to missing position data for it.")
-
-    logger.info(f"Stage 3: Classified {len(winners)} winners and {len(losers)} losers.")
-    return winners, losers
\ No newline at end of file
+    is_name = np.isin(table.category, NAME_CATEGORIES)
+    target_keyword = preprocess("perdants")
+    divider_rows = np.empty(0, dtype=np.intp)
+    if target_keyword in table.words:
+        is_noname = ~is_name & (table.category != CATEGORY_DROPPED)
+        divider_rows = np.flatnonzero(is_noname & (table.word_ids == table.words.index(target_keyword)))
+    divider_found = len(divider_rows) > 0
+
+    if not is_name.any():
+        logger.warning("Split: No potential names found to classify into winners/losers.")
+        return [], [], divider_found
+    if not divider_found:
+        logger.warning(f"Split: Keyword '{target_keyword}' not found. Cannot reliably determine winner/loser split based on Y-position.")
+        return [], [], divider_found
+
+    frontier_y = table.y[divider_rows[0]] # Y-coordinate of the first 'perdants'
+    logger.info(f"Split: Found '{target_keyword}' keyword at Y-position: {frontier_y:.2f}")
+    # Winners are ABOVE 'perdants' (lower Y value), losers are BELOW (higher or equal Y value)
+    above = table.y < frontier_y
+    winners = table.words_of(is_name & above)
+    losers = table.words_of(is_name & ~above)
+    logger.info(f"Split: Classified {len(winners)} winners and {len(losers)} losers.")
+    return winners, losers, divider_found
@@ -0,0 +1,88 @@
+# perf.py
+# Per-stage latency of the screen pipeline. Every stage (download, decode, autocrop, resize,
+# color conversion, OCR per tier, parse, ...) records its duration into a rolling window;
+# percentiles are computed over that window. Read by the !perf command.
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- Parameters to Tune ---
+try:
+    PERF_WINDOW = max(1, int(os.getenv('PERF_WINDOW', '1000'))) # Samples kept per stage
+except ValueError:
+    logger.error("PERF_WINDOW in .env file is not a valid integer. Using 1000.")
+    PERF_WINDOW = 1000
+PERCENTILES = (50, 95, 99)
+# --- End Parameters ---
+
+
+class StageTimings:
+    """Rolling window of one stage's durations (seconds), plus lifetime count and total."""
+    def __init__(self, window: int = PERF_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def summary(self) -> dict:
+        """Durations in milliseconds. Percentiles, mean and max are over the rolling window."""
+        samples = np.fromiter(self.samples, dtype=np.float64, count=len(self.samples)) * 1000.0
+        summary = {"count": self.count, "window": len(samples), "total_s": round(self.total, 3)}
+        if len(samples):
+            for p, value in zip(PERCENTILES, np.percentile(samples, PERCENTILES)):
+                summary[f"p{p}_ms"] = round(float(value), 1)
+            summary["mean_ms"] = round(float(samples.mean()), 1)
+            summary["max_ms"] = round(float(samples.max()), 1)
+        return summary
+
+
+class PerfRecorder:
+    """Thread-safe collection of StageTimings, one per stage name."""
+    def __init__(self, window: int = PERF_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._stages: dict[str, StageTimings] = {}
+        self.started_at = time.time()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            timings = self._stages.get(stage)
+            if timings is None:
+                timings = self._stages[stage] = StageTimings(self.window)
+            timings.add(seconds)
+
+    @contextmanager
+    def timed(self, stage: str):
+        """`with timed("decode"): ...` records the block's duration, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        """{stage: summary} for every stage seen so far, sorted by stage name."""
+        with self._lock:
+            return {stage: self._stages[stage].summary() for stage in sorted(self._stages)}
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self.started_at = time.time()
+
+
+# Shared by the whole pipeline, like the module loggers
+perf = PerfRecorder()
+timed = perf.timed
+record = perf.record
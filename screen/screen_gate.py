@@ -0,0 +1,148 @@
+# screen_gate.py
+# Cheap "is this a Dofus end-of-fight screenshot?" check, run right after decoding so unrelated
+# attachments (inventory captures, memes, another game) are refused before autocrop and OCR.
+# Works on a thumbnail, in a few milliseconds, from three signals:
+#   - aspect ratio of the image (a window, a monitor or a phone photo of one)
+#   - correlation of the window's title bar template, at a few widths
+#   - share of the thumbnail in the window's colour palette (hue/saturation histogram back-projection)
+# Only images failing both the template and the palette checks are refused: the gate must not
+# cost a real fight, a false accept only costs the OCR it would have cost anyway.
+import logging
+import os
+import threading
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from .buffer_pool import get_buffer_pool
+
+logger = logging.getLogger(__name__)
+
+# --- Parameters to Tune ---
+SCREEN_GATE = os.getenv('SCREEN_GATE', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+GATE_TEMPLATE_PATH = 'template_sift_top.png'
+GATE_THUMB_WIDTH = 256           # Width of the thumbnail every signal is computed on
+GATE_TEMPLATE_WIDTHS = (0.3, 0.4, 0.5, 0.65, 0.8, 1.0) # Title bar widths tried, as a fraction of the thumbnail width
+GATE_TEMPLATE_ACCEPT = 0.7       # Title bar correlation enough on its own (flat-band images reach ~0.6)
+GATE_PALETTE_ACCEPT = 0.1        # Share of the thumbnail in the window's palette enough on its own
+GATE_BACKPROJECT_MIN = 16        # Back-projection value (0-255) for a pixel to count as in the palette
+GATE_HIST_BINS = (30, 32)        # Hue, saturation bins of the palette histogram
+GATE_ASPECT_RANGE = (0.4, 4.0)   # Width / height outside this cannot hold a readable window
+# --- End Parameters ---
+
+# Rejection reason -> message shown to the member
+REJECTION_MESSAGES = {
+    "aspect": "format d'image inhabituel",
+    "no_window": "pas de barre de titre ni de couleurs de la fenêtre de fin de combat",
+}
+
+_template_lock = threading.Lock()
+_template_signature = None # (grayscale template, palette histogram), built on first use
+
+_gate_counts = Counter()
+_gate_lock = threading.Lock()
+
+
+class NotEndScreenError(ValueError):
+    """Raised when a screenshot does not look like an end-of-fight window (see check_screenshot)."""
+    def __init__(self, result: 'GateResult'):
+        super().__init__(f"Cette image ne ressemble pas à un écran de fin de combat ({REJECTION_MESSAGES[result.reason]}).")
+        self.result = result
+
+
+class GateResult:
+    """Signals of one screenshot and the decision. reason (a REJECTION_MESSAGES key) is None when accepted."""
+    def __init__(self, aspect: float, template_score: float, palette_share: float, reason: str = None):
+        self.aspect = aspect
+        self.template_score = template_score
+        self.palette_share = palette_share
+        self.reason = reason
+
+    @property
+    def accepted(self) -> bool:
+        return self.reason is None
+
+    def __repr__(self):
+        return (f"<GateResult {'accepted' if self.accepted else 'rejected: ' + self.reason} aspect={self.aspect:.2f} "
+                f"template={self.template_score:.2f} palette={self.palette_share:.2f}>")
+
+
+def _get_template_signature(template_path: str = GATE_TEMPLATE_PATH):
+    """(grayscale title bar, normalized hue/saturation histogram) of the template, or None if it cannot be read."""
+    global _template_signature
+    with _template_lock:
+        if _template_signature is None:
+            template = cv2.imread(template_path, cv2.IMREAD_COLOR)
+            if template is None:
+                logger.error(f"Screen gate: template image not found at {template_path}. Gate disabled.")
+                return None
+            hsv = cv2.cvtColor(template, cv2.COLOR_BGR2HSV)
+            hist = cv2.calcHist([hsv], [0, 1], None, list(GATE_HIST_BINS), [0, 180, 0, 256])
+            cv2.normalize(hist, hist, 0, 255, cv2.NORM_MINMAX)
+            _template_signature = (cv2.cvtColor(template, cv2.COLOR_BGR2GRAY), hist)
+        return _template_signature
+
+
+def _template_score(thumb_gray: np.ndarray, template: np.ndarray) -> float:
+    """Best TM_CCOEFF_NORMED of the title bar over GATE_TEMPLATE_WIDTHS."""
+    thumb_h, thumb_w = thumb_gray.shape[:2]
+    template_h, template_w = template.shape[:2]
+    best = -1.0
+    for fraction in GATE_TEMPLATE_WIDTHS:
+        width = int(round(thumb_w * fraction))
+        height = int(round(template_h * width / template_w))
+        if height < 4 or height > thumb_h:
+            continue
+        scaled_template = cv2.resize(template, (width, height), interpolation=cv2.INTER_AREA)
+        best = max(best, float(cv2.matchTemplate(thumb_gray, scaled_template, cv2.TM_CCOEFF_NORMED).max()))
+    return best
+
+
+def classify_screenshot(img: np.ndarray) -> GateResult:
+    """Computes the gate signals of a BGR screenshot and decides. Accepts everything if the template is missing."""
+    h, w = img.shape[:2]
+    aspect = w / h if h else 0.0
+    if not GATE_ASPECT_RANGE[0] <= aspect <= GATE_ASPECT_RANGE[1]:
+        return GateResult(aspect, -1.0, 0.0, reason="aspect")
+    signature = _get_template_signature()
+    if signature is None:
+        return GateResult(aspect, -1.0, 0.0)
+    template, hist = signature
+
+    thumb_w = min(w, GATE_THUMB_WIDTH)
+    thumb_h = max(1, int(round(h * thumb_w / w)))
+    buffers = get_buffer_pool()
+    thumb = cv2.resize(img, (thumb_w, thumb_h), dst=buffers.get('gate_thumb', (thumb_h, thumb_w, 3)), interpolation=cv2.INTER_AREA)
+    thumb_gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY, dst=buffers.get('gate_gray', (thumb_h, thumb_w)))
+    template_score = _template_score(thumb_gray, template)
+    if template_score >= GATE_TEMPLATE_ACCEPT:
+        return GateResult(aspect, template_score, -1.0)
+
+    hsv = cv2.cvtColor(thumb, cv2.COLOR_BGR2HSV, dst=buffers.get('gate_hsv', (thumb_h, thumb_w, 3)))
+    backprojection = cv2.calcBackProject([hsv], [0, 1], hist, [0, 180, 0, 256], 1)
+    palette_share = float(np.count_nonzero(backprojection >= GATE_BACKPROJECT_MIN)) / backprojection.size
+    if palette_share >= GATE_PALETTE_ACCEPT:
+        return GateResult(aspect, template_score, palette_share)
+    return GateResult(aspect, template_score, palette_share, reason="no_window")
+
+
+def check_screenshot(img: np.ndarray) -> GateResult:
+    """Classifies img, counts the decision and raises NotEndScreenError if it is refused. No-op when SCREEN_GATE is off."""
+    if not SCREEN_GATE:
+        return None
+    result = classify_screenshot(img)
+    with _gate_lock:
+        _gate_counts["accepted" if result.accepted else "rejected"] += 1
+        if not result.accepted:
+            _gate_counts[f"rejected.{result.reason}"] += 1
+    if not result.accepted:
+        logger.info(f"Screen gate refused the image: {result}")
+        raise NotEndScreenError(result)
+    logger.info(f"Screen gate: {result}")
+    return result
+
+
+def gate_stats() -> dict:
+    with _gate_lock:
+        return dict(_gate_counts)
@@ -3,10 +3,19 @@ import jellyfish
 import string
 import logging
 import math # For isnan
+from functools import lru_cache
+
+try:
+    from .bktree import BKTree
+except ImportError:
+    # Direct execution
+    from bktree import BKTree
 
 logger = logging.getLogger(__name__)
 
-def word_to_known (distance_func, original_word_from_ocr, preprocessed_vocab_set, threshold=3):
+VOCAB_INDEX_CACHE_SIZE = 8 # Distinct vocabularies whose BK-tree is kept
+
+def word_to_known (distance_func, original_word_from_ocr, preprocessed_vocab_set, threshold=3, index=None):
     """
     Finds the closest word in preprocessed_vocab_set to the preprocessed version
     of original_word_from_ocr using distance_func, if the distance is below the threshold.
@@ -17,6 +26,9 @@ def word_to_known (distance_func, original_word_from_ocr, preprocessed_vocab_set
         original_word_from_ocr: The raw word string as obtained from OCR.
         preprocessed_vocab_set: A set of already preprocessed vocabulary strings.
         threshold: Maximum distance to consider a match.
+        index: Optional BKTree over preprocessed_vocab_set built with distance_func (see vocab_index).
+               Same matches and tie-breaks as the linear scan, without computing every distance;
+               only entries within threshold are searched, so no match reports float('inf').
 
     Returns:
         tuple: (matched_word, distance)
@@ -47,6 +59,12 @@ def word_to_known (distance_func, original_word_from_ocr, preprocessed_vocab_set
         return original_word_from_ocr, float('inf')
 
     # 5. Find the best match in the preprocessed vocabulary
+    if index is not None:
+        best_vocab_match, min_distance = index.closest(processed_ocr_word, threshold)
+        if best_vocab_match is not None:
+            return best_vocab_match, min_distance
+        return original_word_from_ocr, min_distance
+
     best_vocab_match = "" # This will be a word from preprocessed_vocab_set
     min_distance = float("inf")
 
@@ -68,6 +86,15 @@ def word_to_known (distance_func, original_word_from_ocr, preprocessed_vocab_set
         # logger.debug(f"No close vocab match for OCR word '{original_word_from_ocr}' (processed: '{processed_ocr_word}'). Min dist: {min_distance} > threshold: {threshold}. Returning original.")
         return original_word_from_ocr, min_distance # Return actual min_distance for potential logging/use, even if > threshold
 
+@lru_cache(maxsize=VOCAB_INDEX_CACHE_SIZE)
+def vocab_index(raw_vocab: tuple) -> BKTree:
+    """
+    BK-tree over the preprocessed raw_vocab for word_to_known, built once per vocabulary.
+    Entries are ranked in the iteration order of set(preprocess(v) for v in raw_vocab if v),
+    the set the linear scan iterates, so ties resolve the same way.
+    """
+    return BKTree(distance, set(preprocess(v) for v in raw_vocab if v))
+
 def _no_accent(word) :
     # Simplified accent removal
     no_accent_map = str.maketrans("éèêàâîïôùûç", "eeeaaioouuc")
@@ -78,18 +105,35 @@ def _strip_whitelist(letter) :
     whitelist = "0123456789abcdefghijklmnopqrstuvwxyz_-:()#"
     return letter if letter in whitelist else ""
 
+def _preprocess_char(c) :
+    """preprocess of a single character: lowercase, no accent, whitelisted (possibly several characters, or empty)."""
+    return "".join(_strip_whitelist(l) for l in _no_accent(c.lower()))
+
+class _PreprocessTable(dict) :
+    """
+    str.translate table doing preprocess in one pass: code point -> its _preprocess_char, None to delete it.
+    Precomputed for Latin-1, other code points are added on first use.
+    """
+    def __missing__(self, code_point) :
+        mapped = _preprocess_char(chr(code_point)) or None
+        self[code_point] = mapped
+        return mapped
+
+PREPROCESS_TABLE = _PreprocessTable()
+for _code_point in range(256) :
+    PREPROCESS_TABLE[_code_point]
+
 def preprocess (word)  :
-    word = word.lower()
-    word = _no_accent(word)
-    # Apply whitelist character by character
-    word = "".join(_strip_whitelist(c) for c in word)
+    # Lowercase, accent removal and whitelist are all character by character, so one
+    # translate does them together (only the position-dependent lowercase of a final
+    # sigma differs, and the whitelist drops both forms)
 
     # Remove single characters unless they are numbers? Dofus names are usually longer.
     # if len(word) == 1 and not word.isdigit():
     #     word = ""
     # Keep single chars for now, filter later if needed based on context
 
-    return word
+    return word.translate(PREPROCESS_TABLE)
 
 def isnumber (word) :
     """Checks if a string represents a number, allowing for common formats."""
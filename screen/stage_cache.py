@@ -0,0 +1,133 @@
+# stage_cache.py
+# On-disk, content-addressed cache for the expensive stages of the screen pipeline.
+# Keyed by SHA-256 of the raw attachment bytes plus the pipeline parameters, an entry holds
+# the autocrop geometry, the raw OCR lines (box, text, confidence) and the OCR tier that
+# produced them. A hit skips decode, autocrop and OCR: only EndScreen.parse runs again.
+# Least recently used entries are evicted once the directory grows past its size cap.
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# --- Parameters to Tune ---
+SCREEN_CACHE_DIR = os.getenv('SCREEN_CACHE_DIR', os.path.join('.cache', 'screen'))
+try:
+    SCREEN_CACHE_MAX_MB = max(0.0, float(os.getenv('SCREEN_CACHE_MAX_MB', '64')))
+except ValueError:
+    logger.error("SCREEN_CACHE_MAX_MB in .env file is not a valid number. Using 64 MB.")
+    SCREEN_CACHE_MAX_MB = 64.0
+# --- End Parameters ---
+
+
+def make_cache_key(img_data: bytes, params: dict) -> str:
+    """SHA-256 over the raw image bytes and the (sorted) pipeline parameters."""
+    digest = hashlib.sha256(img_data)
+    digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class StageCache:
+    """Thread-safe LRU cache of {crop_rect, ocr_lines, ocr_tier} entries, one JSON file per key."""
+    def __init__(self, directory: str = SCREEN_CACHE_DIR, max_bytes: int = int(SCREEN_CACHE_MAX_MB * 1024 * 1024)):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: dict[str, tuple[int, float]] = {} # key -> (size in bytes, last access time)
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        try:
+            os.makedirs(directory, exist_ok=True)
+            for filename in os.listdir(directory):
+                if filename.endswith('.json'):
+                    stat = os.stat(os.path.join(directory, filename))
+                    self._entries[filename[:-5]] = (stat.st_size, stat.st_mtime)
+                    self._total_bytes += stat.st_size
+            logger.info(f"StageCache: {len(self._entries)} entries ({self._total_bytes / 1024:.0f} KB) in '{directory}'.")
+        except OSError as e:
+            logger.error(f"StageCache: could not open cache directory '{directory}': {e}. Cache disabled.")
+            self.max_bytes = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> dict | None:
+        """Returns the cached entry for key, or None."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), 'r') as f:
+                    entry = json.load(f)
+                now = time.time()
+                os.utime(self._path(key), (now, now)) # mtime doubles as LRU timestamp across restarts
+                self._entries[key] = (self._entries[key][0], now)
+                self.hits += 1
+                return entry
+            except (OSError, ValueError) as e:
+                logger.warning(f"StageCache: dropping unreadable entry {key[:12]}: {e}")
+                self._remove(key)
+                self.misses += 1
+                return None
+
+    def put(self, key: str, crop_rect, ocr_lines, ocr_tier=None, ocr_scale=None):
+        """Stores the autocrop rectangle (or None), the raw OCR lines [(box, text, confidence), ...], the OCR tier they came from and the window's resize factor."""
+        if self.max_bytes <= 0:
+            return
+        entry = {
+            "crop_rect": [int(v) for v in crop_rect] if crop_rect is not None else None,
+            "ocr_lines": [[[[float(x), float(y)] for x, y in box], text, float(confidence)] for box, text, confidence in ocr_lines],
+            "ocr_tier": ocr_tier,
+            "ocr_scale": ocr_scale,
+        }
+        payload = json.dumps(entry).encode('utf-8')
+        with self._lock:
+            try:
+                tmp_path = self._path(key) + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(payload)
+                os.replace(tmp_path, self._path(key))
+            except OSError as e:
+                logger.warning(f"StageCache: could not write entry {key[:12]}: {e}")
+                return
+            if key in self._entries:
+                self._total_bytes -= self._entries[key][0]
+            self._entries[key] = (len(payload), time.time())
+            self._total_bytes += len(payload)
+            self._evict()
+
+    def _remove(self, key: str):
+        size, _ = self._entries.pop(key, (0, 0))
+        self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        for key, _ in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._remove(key)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,167 @@
+# template_registry.py
+# SIFT and ORB features of the autocrop templates, computed once. Keypoints and descriptors are
+# kept in memory and persisted next to the template as '<name>.features.npz', so a restart does
+# not recompute them either. An entry is rebuilt when the template file changes (content hash),
+# when the cache format version changes or when OpenCV is upgraded.
+import hashlib
+import logging
+import os
+import threading
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- Parameters to Tune ---
+DESCRIPTOR_CACHE_VERSION = 2 # Bump when the .npz layout or the feature parameters change
+ORB_TEMPLATE_FEATURES = 2000 # ORB keypoints kept for a template
+# --- End Parameters ---
+
+_thread_local = threading.local()
+
+
+def get_sift():
+    """The calling thread's SIFT detector (created once per thread, detectors are not shared)."""
+    sift = getattr(_thread_local, 'sift', None)
+    if sift is None:
+        sift = cv2.SIFT_create()
+        _thread_local.sift = sift
+    return sift
+
+
+def get_orb(nfeatures: int):
+    """The calling thread's ORB detector for nfeatures keypoints."""
+    detectors = getattr(_thread_local, 'orb', None)
+    if detectors is None:
+        detectors = _thread_local.orb = {}
+    orb = detectors.get(nfeatures)
+    if orb is None:
+        orb = detectors[nfeatures] = cv2.ORB_create(nfeatures=nfeatures)
+    return orb
+
+
+def _keypoints_to_array(keypoints) -> np.ndarray:
+    return np.array([(kp.pt[0], kp.pt[1], kp.size, kp.angle, kp.response, kp.octave, kp.class_id) for kp in keypoints],
+                    dtype=np.float32).reshape(-1, 7)
+
+
+def _array_to_keypoints(arr: np.ndarray) -> list:
+    return [cv2.KeyPoint(float(x), float(y), float(size), float(angle), float(response), int(octave), int(class_id))
+            for x, y, size, angle, response, octave, class_id in arr]
+
+
+class TemplateFeatures:
+    """SIFT keypoints/descriptors, ORB keypoints/descriptors (possibly empty) and (h, w) shape of one grayscale template."""
+    def __init__(self, path: str, keypoints, descriptors: np.ndarray, shape, sha256: str, orb_keypoints=(), orb_descriptors=None):
+        self.path = path
+        self.keypoints = keypoints
+        self.descriptors = descriptors
+        self.orb_keypoints = orb_keypoints
+        self.orb_descriptors = orb_descriptors
+        self.shape = shape
+        self.sha256 = sha256
+        self._image = None
+
+    def load_image(self):
+        """The grayscale template itself (read on first use), for correlation checks and debug drawings."""
+        if self._image is None:
+            self._image = cv2.imread(self.path, cv2.IMREAD_GRAYSCALE)
+        return self._image
+
+
+class TemplateRegistry:
+    """Thread-safe, in-memory registry of TemplateFeatures backed by .npz files next to the templates."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._features: dict[str, tuple[tuple, TemplateFeatures]] = {} # path -> ((mtime_ns, size), features)
+        self.computed = 0
+        self.loaded = 0
+
+    @staticmethod
+    def cache_path(template_path: str) -> str:
+        return os.path.splitext(template_path)[0] + '.features.npz'
+
+    def get(self, template_path: str) -> TemplateFeatures | None:
+        """Features of the template, or None if it cannot be read or has no keypoints."""
+        try:
+            stat = os.stat(template_path)
+        except OSError:
+            logger.error(f"Template image not found at {template_path}")
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._features.get(template_path)
+            if entry is not None and entry[0] == signature:
+                return entry[1]
+            features = self._load_or_compute(template_path)
+            if features is not None:
+                self._features[template_path] = (signature, features)
+            return features
+
+    def _load_or_compute(self, template_path: str) -> TemplateFeatures | None:
+        try:
+            with open(template_path, 'rb') as f:
+                template_bytes = f.read()
+        except OSError as e:
+            logger.error(f"Could not read template image {template_path}: {e}")
+            return None
+        sha256 = hashlib.sha256(template_bytes).hexdigest()
+
+        features = self._load(template_path, sha256)
+        if features is not None:
+            self.loaded += 1
+            return features
+
+        template = cv2.imdecode(np.frombuffer(template_bytes, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if template is None:
+            logger.error(f"Could not decode template image {template_path}")
+            return None
+        keypoints, descriptors = get_sift().detectAndCompute(template, None)
+        if descriptors is None or len(keypoints) == 0:
+            logger.error(f"No SIFT keypoints found in template {template_path}")
+            return None
+        orb_keypoints, orb_descriptors = get_orb(ORB_TEMPLATE_FEATURES).detectAndCompute(template, None)
+        if orb_descriptors is None:
+            orb_keypoints, orb_descriptors = (), np.zeros((0, 32), dtype=np.uint8)
+        features = TemplateFeatures(template_path, keypoints, descriptors, template.shape[:2], sha256, orb_keypoints, orb_descriptors)
+        self.computed += 1
+        logger.info(f"Computed {len(keypoints)} SIFT and {len(orb_keypoints)} ORB keypoints for template {template_path}.")
+        self._save(features)
+        return features
+
+    def _load(self, template_path: str, sha256: str) -> TemplateFeatures | None:
+        cache_path = self.cache_path(template_path)
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            with np.load(cache_path, allow_pickle=False) as data:
+                if (int(data['version']) != DESCRIPTOR_CACHE_VERSION or str(data['sha256']) != sha256
+                        or str(data['opencv_version']) != cv2.__version__):
+                    logger.info(f"Template descriptor cache {cache_path} is stale. Recomputing.")
+                    return None
+                keypoints = _array_to_keypoints(data['keypoints'])
+                descriptors = data['descriptors']
+                orb_keypoints = _array_to_keypoints(data['orb_keypoints'])
+                orb_descriptors = data['orb_descriptors']
+                shape = tuple(int(v) for v in data['shape'])
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Could not read template descriptor cache {cache_path}: {e}. Recomputing.")
+            return None
+        return TemplateFeatures(template_path, keypoints, descriptors, shape, sha256, orb_keypoints, orb_descriptors)
+
+    def _save(self, features: TemplateFeatures):
+        cache_path = self.cache_path(features.path)
+        tmp_path = cache_path + '.tmp.npz' # np.savez appends .npz to names without it
+        try:
+            np.savez(tmp_path, version=DESCRIPTOR_CACHE_VERSION, sha256=features.sha256, opencv_version=cv2.__version__,
+                     keypoints=_keypoints_to_array(features.keypoints), descriptors=features.descriptors,
+                     orb_keypoints=_keypoints_to_array(features.orb_keypoints), orb_descriptors=features.orb_descriptors,
+                     shape=np.array(features.shape, dtype=np.int32))
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write template descriptor cache {cache_path}: {e}")
+
+
+# Shared by every autocrop call
+template_registry = TemplateRegistry()
@@ -0,0 +1,68 @@
+# text_scale.py
+# Picks the OCR resize from the text itself instead of a fixed width. The text line height of
+# the cropped window is estimated from a horizontal projection of its vertical strokes (rows
+# crossing text have many strong horizontal gradients, rows between lines have almost none),
+# then the window is scaled so that height lands on the OCR profile's text_height.
+import logging
+import os
+
+import cv2
+import numpy as np
+
+from .buffer_pool import get_buffer_pool
+
+logger = logging.getLogger(__name__)
+
+# --- Parameters to Tune ---
+ADAPTIVE_RESIZE = os.getenv('OCR_ADAPTIVE_RESIZE', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+PROJECTION_MAX_WIDTH = 800   # The projection is computed on a copy at most this wide
+EDGE_THRESHOLD = 40          # |d/dx| of a stroke edge (0-255 gray levels)
+ROW_DENSITY_RATIO = 0.2      # A row is text if its edge density is at least this share of the busiest rows'
+MIN_TEXT_LINE_PX = 3         # Shorter runs (projection copy pixels) are noise, e.g. table borders
+MIN_TEXT_LINES = 3           # Fewer runs and the estimate is not trusted
+MIN_OCR_WIDTH = 480          # The window is never resized narrower than this
+# --- End Parameters ---
+
+
+def estimate_text_height(img: np.ndarray):
+    """
+    Median text line height of img in pixels, or None if fewer than MIN_TEXT_LINES lines are found.
+    """
+    if img is None or img.size == 0:
+        return None
+    h, w = img.shape[:2]
+    buffers = get_buffer_pool()
+    gray = img
+    if img.ndim == 3:
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY if img.shape[2] == 3 else cv2.COLOR_BGRA2GRAY,
+                            dst=buffers.get('text_gray', (h, w)))
+    scale = min(1.0, PROJECTION_MAX_WIDTH / w)
+    if scale < 1.0:
+        size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+        gray = cv2.resize(gray, size, dst=buffers.get('text_small', (size[1], size[0])), interpolation=cv2.INTER_AREA)
+
+    gradient = cv2.Sobel(gray, cv2.CV_16S, 1, 0, ksize=3, dst=buffers.get('text_sobel', gray.shape, np.int16))
+    edges = np.abs(gradient) > EDGE_THRESHOLD
+    density = edges.mean(axis=1)
+    busiest = np.percentile(density, 95)
+    if busiest <= 0:
+        return None
+    text_rows = np.concatenate(([False], density >= ROW_DENSITY_RATIO * busiest, [False]))
+    changes = np.flatnonzero(text_rows[1:] != text_rows[:-1])
+    run_lengths = changes[1::2] - changes[::2]
+    run_lengths = run_lengths[run_lengths >= MIN_TEXT_LINE_PX]
+    if len(run_lengths) < MIN_TEXT_LINES:
+        return None
+    return float(np.median(run_lengths)) / scale
+
+
+def ocr_width(img: np.ndarray, text_height, profile) -> int:
+    """
+    Width to resize the window to for OCR with profile: text_height scaled to profile.text_height,
+    within [MIN_OCR_WIDTH, profile.target_width]. profile.target_width when the height is unknown.
+    """
+    w = img.shape[1]
+    if not ADAPTIVE_RESIZE or not text_height:
+        return profile.target_width
+    target = int(round(w * profile.text_height / text_height))
+    return max(min(MIN_OCR_WIDTH, profile.target_width), min(target, profile.target_width))
@@ -0,0 +1,72 @@
+# token_cache.py
+# Memo of the parser's per-token work across screenshots. End screens repeat the same tokens
+# ('gagnants', 'perdants', 'niveau', XP numbers, the guild members' names), so their vocabulary
+# resolution (parsing_pipeline.resolve_word) is kept in a bounded LRU instead of being recomputed for
+# every screenshot. Resolutions only depend on the vocabulary, so they are keyed by the
+# VocabularyIndex's vocabulary fingerprint: they survive names changes, and a vocabulary
+# change makes them unreachable until they age out of the LRU.
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# --- Parameters to Tune ---
+try:
+    TOKEN_CACHE_SIZE = max(0, int(os.getenv('TOKEN_CACHE_SIZE', '8192'))) # Entries kept (least recently used evicted)
+except ValueError:
+    logger.error("TOKEN_CACHE_SIZE in .env file is not a valid integer. Using 8192.")
+    TOKEN_CACHE_SIZE = 8192
+# --- End Parameters ---
+
+
+class TokenCache:
+    """Thread-safe in-memory LRU of token key -> result. Keys are tuples starting with the kind of result."""
+    def __init__(self, max_entries: int = TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, object] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple):
+        """The cached result for key, or None."""
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return result
+
+    def put(self, key: tuple, result):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+token_cache = TokenCache()
@@ -0,0 +1,90 @@
+# token_table.py
+# The OCR words of one screenshot as NumPy columns instead of parallel lists of strings and
+# position tuples. Each distinct word is stored once (text_id into texts), so the parser
+# preprocesses, resolves and classifies distinct words only and broadcasts the result to the
+# rows; the winner/loser split and the duplicate removal are then array operations.
+import logging
+import numbers
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Row categories (set by parsing_pipeline.classify_tokens)
+CATEGORY_DROPPED = -1       # Empty after preprocessing
+CATEGORY_NOISE = 0          # Too short or no letter
+CATEGORY_NUMBER = 1
+CATEGORY_VOCABULARY = 2     # Resolved to a vocabulary word ('gagnants', 'perdants', ...)
+CATEGORY_KNOWN_NAME = 3     # Known name or alias
+CATEGORY_CANDIDATE_NAME = 4 # Plausible unknown name
+NAME_CATEGORIES = (CATEGORY_KNOWN_NAME, CATEGORY_CANDIDATE_NAME)
+
+
+def _valid_position(pos) -> bool:
+    """A position has at least (x, y); words without one are skipped."""
+    return bool(pos) and isinstance(pos, (list, tuple)) and len(pos) >= 2
+
+
+def _numeric_position(pos) -> bool:
+    return isinstance(pos[0], numbers.Real) and isinstance(pos[1], numbers.Real)
+
+
+class TokenTable:
+    """
+    One row per OCR word:
+      text_id: index of the raw word in texts
+      x, y: center of the word's OCR line
+      confidence: OCR confidence of the line
+      word_id: index in words of the word it resolved to (-1 until classified)
+      category: CATEGORY_* (CATEGORY_DROPPED until classified)
+    texts and words are shared with the tables select() returns.
+    """
+    def __init__(self, texts: list, text_ids, x, y, confidence):
+        self.texts = texts
+        self.text_ids = np.asarray(text_ids, dtype=np.int32)
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.confidence = np.asarray(confidence, dtype=np.float32)
+        self.words: list = []
+        self.word_ids = np.full(len(self.text_ids), -1, dtype=np.int32)
+        self.category = np.full(len(self.text_ids), CATEGORY_DROPPED, dtype=np.int8)
+
+    def __len__(self):
+        return len(self.text_ids)
+
+    @classmethod
+    def from_words(cls, words, positions, confidences=None) -> 'TokenTable':
+        """Table of words with their (x, y) positions. Words without a valid, numeric position are skipped."""
+        n_positions = len(positions)
+        rows = []
+        for i in range(len(words)):
+            pos = positions[i] if i < n_positions else None
+            if _valid_position(pos):
+                rows.append(i)
+            else:
+                logger.warning(f"Token table: Missing or invalid position for word '{words[i]}' at index {i}. Position: {pos if i < n_positions else 'N/A'}. Skipping word.")
+        try:
+            coordinates = np.array([positions[i][:2] for i in rows], dtype=np.float64).reshape(-1, 2)
+        except (TypeError, ValueError): # Some coordinates are not numbers: drop those rows
+            for i in rows:
+                if not _numeric_position(positions[i]):
+                    logger.warning(f"Token table: Non-numeric position for word '{words[i]}' at index {i}: {positions[i]}. Skipping word.")
+            rows = [i for i in rows if _numeric_position(positions[i])]
+            coordinates = np.array([positions[i][:2] for i in rows], dtype=np.float64).reshape(-1, 2)
+
+        text_index = {}
+        text_ids = [text_index.setdefault(words[i], len(text_index)) for i in rows]
+        confidence = [confidences[i] for i in rows] if confidences is not None else np.ones(len(rows))
+        return cls(list(text_index), text_ids, coordinates[:, 0], coordinates[:, 1], confidence)
+
+    def select(self, mask) -> 'TokenTable':
+        """The rows where mask is true (in order), sharing texts and words."""
+        table = TokenTable(self.texts, self.text_ids[mask], self.x[mask], self.y[mask], self.confidence[mask])
+        table.words = self.words
+        table.word_ids = self.word_ids[mask]
+        table.category = self.category[mask]
+        return table
+
+    def words_of(self, mask) -> list:
+        """Distinct resolved words of the rows where mask is true, sorted."""
+        return sorted(self.words[i] for i in np.unique(self.word_ids[mask]))
@@ -3,6 +3,8 @@ import discord
 import numpy as np
 import cv2
 import logging
+import os
+import threading
 import time
 
 logger = logging.getLogger(__name__)
@@ -16,57 +18,111 @@ except ImportError:
     VOCABULARY = []
 
 
-from .autocrop_sift import autocrop # Assuming autocrop works or handles errors
+from .autocrop_sift import find_window, verify_window, TARGET_ASPECT_RATIO, DETECTION_MAX_SIDE, CASCADE_ORDER # Assuming autocrop works or handles errors
+from .matchers import STRATEGY_ORDER
 from .EndScreen import EndScreen
 from .screen_utils import distance # word_to_known is used within EndScreen.parse
+from .stage_cache import make_cache_key
+from .layout import LAYOUT_PROFILE, get_layout, layout_applies, layout_check, ocr_regions
+from .ocr_profiles import OCR_PROFILES, OCR_TIERS, OCR_ESCALATE_BELOW, parse_confidence, record_tier
+from .ocr_pool import WorkerEngines, create_ocr_engine
+from .perf import timed, record
+from .image_header import read_image_size
+from .buffer_pool import get_buffer_pool
+from .text_scale import ADAPTIVE_RESIZE, estimate_text_height, ocr_width
+from .screen_gate import check_screenshot
+from .vocabulary_index import VocabularyIndex
+from .token_table import TokenTable
 
-# Import PaddleOCR correctly
+logger = logging.getLogger(__name__)
+
+# --- Parameters to Tune ---
+TARGET_WIDTH = 1200          # Width the cropped window is resized to before OCR (default; OCR profiles set their own)
+CONFIDENCE_THRESHOLD = 0.6   # OCR lines below this confidence are ignored by the parser
+PIPELINE_VERSION = 9         # Bump when a stage changes its output, so cached results are not reused
 try:
-    from paddleocr import PaddleOCR
-    # Initialize PaddleOCR engine - Outside the function for efficiency if called multiple times
-    # Consider making language ('fr') configurable
-    ocr_engine = PaddleOCR(lang='fr', use_angle_cls=True, show_log=False)
-    logger.info("PaddleOCR engine initialized.")
-except ImportError:
-    logger.error("PaddleOCR library not found. Please install paddleocr and paddlepaddle.")
-    ocr_engine = None
-except Exception as e:
-    logger.exception(f"Failed to initialize PaddleOCR: {e}")
-    ocr_engine = None
+    MAX_IMAGE_BYTES = int(float(os.getenv('MAX_IMAGE_MB', '15')) * 1024 * 1024) # Larger attachments are refused before download
+except ValueError:
+    logger.error("MAX_IMAGE_MB in .env file is not a valid number. Using 15 MB.")
+    MAX_IMAGE_BYTES = 15 * 1024 * 1024
+try:
+    MAX_IMAGE_PIXELS = int(float(os.getenv('MAX_IMAGE_MPX', '40')) * 1_000_000) # Pixel budget: larger images are refused (before decoding when the header is readable)
+except ValueError:
+    logger.error("MAX_IMAGE_MPX in .env file is not a valid number. Using 40 Mpx.")
+    MAX_IMAGE_PIXELS = 40_000_000
+# --- End Parameters ---
 
+# Shared by every download so connections to the CDN are reused
+http = urllib3.PoolManager()
 
-logger = logging.getLogger(__name__)
+# Engine for callers that do not pass one (scripts, tests), built on first use
+_default_engine = None
+_default_engine_lock = threading.Lock()
 
 
-def from_link_to_result (url: str, KNOWN_NAMES: list, nocrop: bool = False) -> EndScreen:
+def pipeline_params(nocrop: bool, gate: bool = True) -> dict:
     """
-    Downloads an image from URL, preprocesses it, performs OCR,
-    and parses the result into an EndScreen object.
+    Everything besides the image bytes that changes the cached crop/OCR output.
+    gate is part of it: a result cached by '!screen force' (gate off) must not be served to a gated request.
     """
-    if ocr_engine is None:
-         raise RuntimeError("PaddleOCR engine is not available or failed to initialize.")
+    return {"version": PIPELINE_VERSION, "nocrop": nocrop, "gate": gate, "layout": LAYOUT_PROFILE, "cascade": CASCADE_ORDER, "matchers": STRATEGY_ORDER, "autocrop_max_side": DETECTION_MAX_SIDE,
+            "tiers": [profile.params() for profile in OCR_TIERS], "escalate_below": OCR_ESCALATE_BELOW, "adaptive_resize": ADAPTIVE_RESIZE}
 
-    if not isinstance(KNOWN_NAMES, list):
-        logger.warning("KNOWN_NAMES passed to from_link_to_result is not a list. Using empty list.")
-        KNOWN_NAMES = []
 
-    # --- Download Image ---
-    start_time = time.time()
-    http = urllib3.PoolManager()
+def default_ocr_engine():
+    """
+    The module's own 'accurate' PaddleOCR engine, created on first use and then reused.
+    The bot does not use it (OcrPool gives each worker its own engines); a PaddleOCR engine
+    is not thread-safe, so concurrent callers should go through OcrPool as well.
+    """
+    global _default_engine
+    with _default_engine_lock:
+        if _default_engine is None:
+            try:
+                _default_engine = create_ocr_engine()
+            except Exception as e:
+                logger.exception(f"Failed to initialize the default PaddleOCR engine: {e}")
+                raise RuntimeError("PaddleOCR engine is not available or failed to initialize.") from e
+        return _default_engine
+
+
+def check_image_size(size: int):
+    """Refuses images over MAX_IMAGE_BYTES."""
+    if size > MAX_IMAGE_BYTES:
+        logger.warning(f"Image refused: {size} bytes > {MAX_IMAGE_BYTES} bytes.")
+        raise ValueError(f"Image trop volumineuse ({size / 1024 / 1024:.1f} Mo, max {MAX_IMAGE_BYTES / 1024 / 1024:.0f} Mo).")
+
+
+def check_image_pixels(width: int, height: int):
+    """Refuses images over MAX_IMAGE_PIXELS (decompression bombs: a few MB of PNG can declare gigapixels)."""
+    if width * height > MAX_IMAGE_PIXELS:
+        logger.warning(f"Image refused: {width}x{height} pixels > {MAX_IMAGE_PIXELS} pixels.")
+        raise ValueError(f"Image trop grande ({width}x{height}, {width * height / 1_000_000:.0f} Mpx, max {MAX_IMAGE_PIXELS / 1_000_000:.0f} Mpx).")
+
+
+def download_image(url: str) -> bytes:
+    """Downloads the raw image bytes (blocking; the bot reads attachments with discord.Attachment.read instead)."""
     try:
         logger.info(f"Downloading image from: {url}")
-        r = http.request('GET', url, timeout=10.0) # Added timeout
+        r = http.request('GET', url, timeout=10.0, preload_content=False) # Added timeout
         if r.status != 200:
              logger.error(f"Failed to download image. Status code: {r.status}, URL: {url}")
              raise ValueError(f"Échec du téléchargement de l'image (Code: {r.status}).")
-        logger.info(f"Image downloaded successfully ({len(r.data)} bytes).")
-        img_data = r.data
+        content_length = r.headers.get('Content-Length')
+        if content_length and content_length.isdigit():
+            check_image_size(int(content_length))
+        img_data = r.read(MAX_IMAGE_BYTES + 1)
+        check_image_size(len(img_data))
+        logger.info(f"Image downloaded successfully ({len(img_data)} bytes).")
+        return img_data
     except urllib3.exceptions.MaxRetryError as e:
          logger.error(f"Network error downloading image: {e}, URL: {url}")
          raise ValueError(f"Erreur réseau lors du téléchargement: {e}")
     except urllib3.exceptions.TimeoutError:
          logger.error(f"Timeout error downloading image: {url}")
          raise ValueError("Le téléchargement de l'image a expiré.")
+    except ValueError:
+         raise
     except Exception as e:
          logger.exception(f"Unexpected error downloading image: {e}, URL: {url}")
          raise ValueError(f"Erreur inconnue lors du téléchargement: {e}")
@@ -76,9 +132,23 @@ def from_link_to_result (url: str, KNOWN_NAMES: list, nocrop: bool = False) -> E
             r.release_conn()
 
 
-    # --- Decode Image ---
+def decode_image(img_data: bytes) -> np.ndarray:
+    """
+    Decodes raw image bytes into a BGR image, within the MAX_IMAGE_PIXELS budget.
+    The dimensions are read from the PNG/JPEG header first, so oversized images are refused before
+    any pixel is allocated. Unknown headers are decoded and their size is checked afterwards.
+    The image is always decoded at full size: the game window is often a small part of the
+    screenshot, and its text needs every pixel.
+    """
+    header = read_image_size(img_data)
+    if header is not None:
+        image_format, width, height = header
+        check_image_pixels(width, height)
+        logger.info(f"Image header: {image_format} {width}x{height}.")
+    else:
+        logger.info("Image header not recognized. Checking the pixel budget after decoding.")
     try:
-        arr = np.asarray(bytearray(img_data), dtype=np.uint8)
+        arr = np.frombuffer(img_data, dtype=np.uint8) # Read-only view on the bytes, no copy
         # Decode as color image
         img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
         if img is None:
@@ -88,83 +158,120 @@ def from_link_to_result (url: str, KNOWN_NAMES: list, nocrop: bool = False) -> E
     except Exception as e:
         logger.exception(f"Error decoding image: {e}")
         raise ValueError(f"Erreur lors du décodage de l'image: {e}")
+    # Formats without a readable header (WebP, BMP, ...) are only checked here, once decoded
+    check_image_pixels(img.shape[1], img.shape[0])
+    return img
+
+
+def crop_window(img: np.ndarray, nocrop: bool = False, geometry_cache=None, uploader_id=None):
+    """
+    Crops the end-of-fight window out of the screenshot.
+    Returns (image, crop_rect). crop_rect is (x1, y1, x2, y2), or None when the whole image is kept.
+    With a GeometryCache and an uploader id, the uploader's last rectangle for this resolution is
+    tried first and only confirmed by a template correlation check, skipping the feature matching.
+    """
+    if nocrop:
+        return img, None
+
+    geometry_key = None
+    if geometry_cache is not None and uploader_id is not None:
+        geometry_key = (uploader_id, img.shape[1], img.shape[0])
+        start_verify = time.perf_counter()
+        crop_rect = geometry_cache.get_verified(geometry_key, lambda rect: verify_window(img, rect))
+        record("autocrop.geometry_cache", time.perf_counter() - start_verify)
+        if crop_rect is not None:
+            x1, y1, x2, y2 = crop_rect
+            logger.info(f"Autocrop: reusing verified geometry {crop_rect} for uploader {uploader_id}.")
+            return img[y1:y2, x1:x2], crop_rect
+
+    logger.info("Applying autocrop...")
+    try:
+        start_match = time.perf_counter()
+        crop_rect, stage = find_window(img)
+        record(f"autocrop.{stage or 'failed'}", time.perf_counter() - start_match) # Per cascade stage / matcher strategy
+        if crop_rect is not None:
+            x1, y1, x2, y2 = crop_rect
+            # Basic check: ensure cropped area isn't ridiculously small
+            if (y2 - y1) > 10 and (x2 - x1) > 10:
+                cropped_img = img[y1:y2, x1:x2]
+                logger.info(f"Autocrop successful with '{stage}', new shape: {cropped_img.shape}")
+                if geometry_key is not None and stage != "heuristic": # No template to verify it with next time
+                    geometry_cache.put(geometry_key, crop_rect)
+                return cropped_img, crop_rect
+            logger.warning(f"Autocrop resulted in very small image ({y2 - y1}x{x2 - x1}). Using image before crop.")
+        else:
+            logger.warning("Autocrop did not return a valid/non-empty image. Using image before crop.")
+    except Exception as e:
+         logger.exception(f"Error during autocrop: {e}. Using image before crop.")
+         # Continue with the uncropped image
+    return img, None
 
-    # --- Image Preprocessing ---
-    preprocessed_img = img
-    # 1. Cropping (Optional)
-    if not nocrop:
-        logger.info("Applying autocrop...")
-        try:
-            autocroped_result = autocrop(preprocessed_img) # Assuming autocrop takes and returns numpy array
-            if isinstance(autocroped_result, np.ndarray) and autocroped_result.size > 0:
-                # Basic check: ensure cropped area isn't ridiculously small
-                if autocroped_result.shape[0] > 10 and autocroped_result.shape[1] > 10:
-                    preprocessed_img = autocroped_result
-                    logger.info(f"Autocrop successful, new shape: {preprocessed_img.shape}")
-                else:
-                    logger.warning(f"Autocrop resulted in very small image ({autocroped_result.shape}). Using image before crop.")
-            else:
-                logger.warning("Autocrop did not return a valid/non-empty image. Using image before crop.")
-        except Exception as e:
-             logger.exception(f"Error during autocrop: {e}. Using image before crop.")
-             # Continue with the uncropped image
 
-    if preprocessed_img is None or preprocessed_img.size == 0:
+def prepare_for_ocr(img: np.ndarray, target_width: int = TARGET_WIDTH) -> np.ndarray:
+    """
+    Resizes the (cropped) window to target_width (INTER_AREA when shrinking, INTER_CUBIC when
+    enlarging) and converts it to RGB for PaddleOCR.
+    Both steps write into the worker's pooled buffers (see buffer_pool): the result is only valid
+    until the next prepare_for_ocr call on the same thread.
+    """
+    if img is None or img.size == 0:
          logger.error("Image is empty after potential crop stage.")
          raise ValueError("L'image est vide après le recadrage.")
+    buffers = get_buffer_pool()
 
-    # 2. Resizing (Consider if necessary - OCR might work better on original/larger size)
+    # 1. Resizing (Consider if necessary - OCR might work better on original/larger size)
     # Resizing can sometimes hurt OCR accuracy, especially if text becomes too small.
-    # Let's make resizing optional or conditional. Maybe resize only if image is huge?
     # Target width for consistency might still be good.
-    resized_img = preprocessed_img
+    resized_img = img
     try:
-        target_width = 1200 # Increased target width, might help OCR
         h, w = resized_img.shape[:2]
         if w > 0 and h > 0:
-            # Only resize if width is significantly different from target?
-            # Or always resize for consistency? Let's resize for consistency for now.
             target_height = int(h * target_width / w)
-            resized_img = cv2.resize(resized_img, (target_width, target_height), interpolation=cv2.INTER_CUBIC)
+            interpolation = cv2.INTER_AREA if target_width < w else cv2.INTER_CUBIC
+            with timed("resize"):
+                resized_img = cv2.resize(resized_img, (target_width, target_height), dst=buffers.get('ocr_resized', (target_height, target_width) + img.shape[2:]),
+                                         interpolation=interpolation)
             logger.info(f"Image resized to: {resized_img.shape}")
         else:
             logger.warning("Invalid dimensions for resizing. Using image as is.")
     except Exception as e:
         logger.exception(f"Error during resize: {e}. Using image before resize.")
-        resized_img = preprocessed_img # Fallback to pre-resize state
-
+        resized_img = img # Fallback to pre-resize state
 
     if resized_img is None or resized_img.size == 0:
          logger.error("Image is empty after potential resize stage.")
          raise ValueError("L'image est vide après le redimensionnement.")
 
-    # 3. Ensure RGB format (PaddleOCR often expects RGB, OpenCV uses BGR)
-    try:
-        # Check if image is grayscale first
-        if len(resized_img.shape) == 2 or resized_img.shape[2] == 1:
-            img_for_ocr = cv2.cvtColor(resized_img, cv2.COLOR_GRAY2BGR) # Convert grayscale to BGR
-            img_for_ocr = cv2.cvtColor(img_for_ocr, cv2.COLOR_BGR2RGB) # Then BGR to RGB
-            logger.info("Converted grayscale image to RGB for PaddleOCR.")
-        elif resized_img.shape[2] == 3: # BGR
-             img_for_ocr = cv2.cvtColor(resized_img, cv2.COLOR_BGR2RGB)
-             logger.info("Converted BGR image to RGB for PaddleOCR.")
-        elif resized_img.shape[2] == 4: # BGRA
-            img_for_ocr = cv2.cvtColor(resized_img, cv2.COLOR_BGRA2RGB)
-            logger.info("Converted BGRA image to RGB for PaddleOCR.")
-        else:
-            logger.warning(f"Unexpected image channels ({resized_img.shape[2]}). Using as is for OCR.")
-            img_for_ocr = resized_img
+    # 2. Ensure RGB format (PaddleOCR often expects RGB, OpenCV uses BGR)
+    with timed("color_convert"):
+        rgb_buffer = buffers.get('ocr_rgb', resized_img.shape[:2] + (3,))
+        try:
+            # Check if image is grayscale first
+            if len(resized_img.shape) == 2 or resized_img.shape[2] == 1:
+                img_for_ocr = cv2.cvtColor(resized_img, cv2.COLOR_GRAY2RGB, dst=rgb_buffer) # Gray replicated into the 3 channels
+                logger.info("Converted grayscale image to RGB for PaddleOCR.")
+            elif resized_img.shape[2] == 3: # BGR
+                 img_for_ocr = cv2.cvtColor(resized_img, cv2.COLOR_BGR2RGB, dst=rgb_buffer)
+                 logger.info("Converted BGR image to RGB for PaddleOCR.")
+            elif resized_img.shape[2] == 4: # BGRA
+                img_for_ocr = cv2.cvtColor(resized_img, cv2.COLOR_BGRA2RGB, dst=rgb_buffer)
+                logger.info("Converted BGRA image to RGB for PaddleOCR.")
+            else:
+                logger.warning(f"Unexpected image channels ({resized_img.shape[2]}). Using as is for OCR.")
+                img_for_ocr = resized_img
 
-    except cv2.error as e:
-        logger.exception(f"OpenCV error during color conversion: {e}. Using image as is.")
-        img_for_ocr = resized_img # Fallback
+        except cv2.error as e:
+            logger.exception(f"OpenCV error during color conversion: {e}. Using image as is.")
+            img_for_ocr = resized_img # Fallback
+    return img_for_ocr
 
-    # --- PaddleOCR Call ---
+
+def run_ocr(ocr_engine, img_for_ocr: np.ndarray, cls: bool = True) -> list:
+    """Runs PaddleOCR. Returns the raw lines as [(box, text, confidence), ...]."""
     logger.info("Running PaddleOCR...")
     start_ocr = time.time()
-    ocr_result = None
     try:
-        ocr_result = ocr_engine.ocr(img_for_ocr, cls=True)
+        ocr_result = ocr_engine.ocr(img_for_ocr, cls=cls)
     except Exception as e:
         logger.exception(f"PaddleOCR execution failed: {e}")
         raise ValueError(f"Erreur lors de l'exécution de PaddleOCR: {e}") from e
@@ -172,54 +279,96 @@ def from_link_to_result (url: str, KNOWN_NAMES: list, nocrop: bool = False) -> E
     ocr_duration = time.time() - start_ocr
     logger.info(f"PaddleOCR finished in {ocr_duration:.2f}s")
 
-    # --- Process PaddleOCR Output ---
+    ocr_lines = []
+    if not ocr_result or not ocr_result[0]:
+         logger.warning("PaddleOCR returned no results.")
+         return ocr_lines
+
+    logger.info(f"PaddleOCR detected {len(ocr_result[0])} lines.")
+    for line_count, line_data in enumerate(ocr_result[0], start=1):
+        try:
+            ocr_lines.append((line_data[0], line_data[1][0], line_data[1][1]))
+        except (IndexError, TypeError) as e:
+            logger.warning(f"Error processing line {line_count} from PaddleOCR results: {e}. Line data: {line_data}", exc_info=True)
+    return ocr_lines
+
+
+def run_layout_ocr(ocr_engine, img_for_ocr: np.ndarray, crop_rect, window_shape, cls: bool = True) -> list:
+    """
+    OCR restricted to the regions of the layout profile (see screen.layout), when autocrop found the window.
+    Falls back to run_ocr on the whole window if the layout does not apply or its lines fail layout_check.
+    """
+    regions = get_layout()
+    if not regions or not layout_applies(window_shape, crop_rect, TARGET_ASPECT_RATIO):
+        return run_ocr(ocr_engine, img_for_ocr, cls)
+
+    logger.info(f"Running PaddleOCR on {len(regions)} layout regions...")
+    start_ocr = time.time()
+    try:
+        ocr_lines = ocr_regions(ocr_engine, img_for_ocr, regions, cls)
+    except Exception as e:
+        logger.warning(f"Layout OCR failed ({e}). Falling back to full detection.", exc_info=True)
+        return run_ocr(ocr_engine, img_for_ocr, cls)
+
+    failure = layout_check(ocr_lines, regions, img_for_ocr.shape)
+    if failure:
+        logger.warning(f"Layout check failed ({len(ocr_lines)} lines, {failure}). Falling back to full detection.")
+        return run_ocr(ocr_engine, img_for_ocr, cls)
+
+    logger.info(f"Layout OCR read {len(ocr_lines)} lines in {time.time() - start_ocr:.2f}s")
+    return ocr_lines
+
+
+def words_from_ocr_lines(ocr_lines: list):
+    """
+    Splits OCR lines into words, keeping the line's (center_x, center_y) and confidence for each word.
+    Returns (table, raw_ocr_lines): a TokenTable of the words of lines of at least CONFIDENCE_THRESHOLD,
+    and the raw lines, kept unfiltered for the prism check.
+    """
     all_words = []
     all_word_positions = [] # Store approximated (center_x, center_y) for each word
+    all_word_confidences = []
     raw_ocr_lines = []      # <-- STORE RAW LINES FOR PRISM CHECK
 
-    if not ocr_result or not ocr_result[0]:
-         logger.warning("PaddleOCR returned no results.")
-    else:
-        logger.info(f"PaddleOCR detected {len(ocr_result[0])} lines.")
-        line_count = 0
-        word_count = 0
-        for line_data in ocr_result[0]:
-            line_count += 1
-            try:
-                box = line_data[0]
-                text = line_data[1][0]
-                confidence = line_data[1][1]
-
-                raw_ocr_lines.append(text) # <-- STORE RAW LINE
+    line_count = 0
+    word_count = 0
+    for box, text, confidence in ocr_lines:
+        line_count += 1
+        try:
+            raw_ocr_lines.append(text) # <-- STORE RAW LINE
 
-                confidence_threshold = 0.6
-                if confidence < confidence_threshold:
-                    continue
+            center_x = sum(p[0] for p in box) / 4
+            center_y = sum(p[1] for p in box) / 4
 
-                center_x = sum(p[0] for p in box) / 4
-                center_y = sum(p[1] for p in box) / 4
+            words_in_line = text.split()
+            if not words_in_line: continue
 
-                words_in_line = text.split()
-                if not words_in_line: continue
+            for word in words_in_line:
+                word_count += 1
+                all_words.append(word)
+                all_word_positions.append((center_x, center_y))
+                all_word_confidences.append(confidence)
 
-                for word in words_in_line:
-                    word_count += 1
-                    all_words.append(word)
-                    all_word_positions.append((center_x, center_y))
+        except (IndexError, TypeError, Exception) as e:
+            logger.warning(f"Error processing line {line_count} from PaddleOCR results: {e}. Line data: {(box, text, confidence)}", exc_info=True)
+            continue
 
-            except (IndexError, TypeError, Exception) as e:
-                logger.warning(f"Error processing line {line_count} from PaddleOCR results: {e}. Line data: {line_data}", exc_info=True)
-                continue
+    table = TokenTable.from_words(all_words, all_word_positions, all_word_confidences)
+    table = table.select(table.confidence >= CONFIDENCE_THRESHOLD)
+    logger.info(f"Extracted {len(table)} words ({word_count} before confidence filtering) from {line_count} lines.")
+    return table, raw_ocr_lines
 
-        logger.info(f"Extracted {word_count} words from {line_count} lines after confidence filtering.")
 
+def parse_ocr_lines(ocr_lines: list, index: VocabularyIndex) -> EndScreen:
+    """Parses raw OCR lines into an EndScreen object, matching words against index."""
+    table, raw_ocr_lines = words_from_ocr_lines(ocr_lines)
 
-    # --- Parse using the EndScreen class ---
     endscreen = EndScreen()
     logger.info("Passing extracted words, positions, and raw lines to EndScreen parser.")
     try:
         # Pass the raw OCR lines as well
-        endscreen.parse(all_words, all_word_positions, raw_ocr_lines, KNOWN_NAMES, VOCABULARY)
+        with timed("parse"):
+            endscreen.parse_tokens(table, raw_ocr_lines, index)
         logger.info("EndScreen parsing completed.")
     except ValueError as e:
          logger.error(f"Known error during EndScreen parsing: {e}", exc_info=True)
@@ -227,7 +376,107 @@ def from_link_to_result (url: str, KNOWN_NAMES: list, nocrop: bool = False) -> E
     except Exception as e:
          logger.exception(f"Unexpected error during EndScreen parsing: {e}")
          raise ValueError(f"Erreur inattendue lors de l'analyse des résultats OCR: {e}") from e
+    return endscreen
+
+
+def ocr_and_parse(ocr_engine, window_img: np.ndarray, crop_rect, index: VocabularyIndex):
+    """
+    Runs the OCR tiers on the window, cheapest first, until the parsed result is confident enough.
+    Returns (endscreen, ocr_lines) for the last tier run; endscreen.ocr_tiers holds its name and
+    endscreen.ocr_scales the resize factor it used (see screen.text_scale).
+    A bare engine (not OcrPool's WorkerEngines) has a single configuration and runs as the 'accurate' tier.
+    """
+    tiers = OCR_TIERS if isinstance(ocr_engine, WorkerEngines) else [OCR_PROFILES["accurate"]]
+    text_height = None
+    if ADAPTIVE_RESIZE:
+        with timed("text_height"):
+            text_height = estimate_text_height(window_img)
+        logger.info(f"Estimated text line height: {f'{text_height:.1f} px' if text_height else 'unknown'}.")
+    for tier_index, profile in enumerate(tiers):
+        engine = ocr_engine.get(profile.name) if isinstance(ocr_engine, WorkerEngines) else ocr_engine
+        target_width = ocr_width(window_img, text_height, profile)
+        ocr_scale = target_width / window_img.shape[1]
+        logger.info(f"OCR tier '{profile.name}': resizing {window_img.shape[1]} px -> {target_width} px (scale {ocr_scale:.2f}).")
+        img_for_ocr = prepare_for_ocr(window_img, target_width)
+        with timed(f"ocr.{profile.name}"):
+            ocr_lines = run_layout_ocr(engine, img_for_ocr, crop_rect, window_img.shape, cls=profile.use_angle_cls)
+        endscreen = parse_ocr_lines(ocr_lines, index)
+        confidence = parse_confidence(endscreen)
+        if confidence >= OCR_ESCALATE_BELOW or tier_index == len(tiers) - 1:
+            logger.info(f"OCR tier '{profile.name}' accepted (parse confidence {confidence:.2f}).")
+            break
+        logger.info(f"OCR tier '{profile.name}': parse confidence {confidence:.2f} < {OCR_ESCALATE_BELOW}. Escalating.")
+    endscreen.ocr_tiers = [profile.name]
+    endscreen.ocr_scales = [round(ocr_scale, 3)]
+    return endscreen, ocr_lines
+
+
+def from_link_to_result (url: str, KNOWN_NAMES, nocrop: bool = False, ocr_engine=None, cache=None, geometry_cache=None, uploader_id=None,
+                         gate: bool = True) -> EndScreen:
+    """
+    Downloads an image from URL and runs it through from_bytes_to_result.
+    """
+    with timed("download"):
+        img_data = download_image(url)
+    return from_bytes_to_result(img_data, KNOWN_NAMES, nocrop=nocrop, ocr_engine=ocr_engine, cache=cache,
+                                geometry_cache=geometry_cache, uploader_id=uploader_id, gate=gate, source=url)
+
+
+def from_bytes_to_result (img_data: bytes, KNOWN_NAMES, nocrop: bool = False, ocr_engine=None, cache=None,
+                          geometry_cache=None, uploader_id=None, gate: bool = True, source: str = "") -> EndScreen:
+    """
+    Decodes raw image bytes, preprocesses the image, performs OCR,
+    and parses the result into an EndScreen object.
+    KNOWN_NAMES is a VocabularyIndex (DataManagementCog.get_vocabulary_index), or a list of
+    names and aliases indexed here with VOCABULARY for this call only.
+    Blocking: run it through screen.ocr_pool.OcrPool, which supplies the worker's ocr_engine.
+    Without ocr_engine, the module's default engine is used (see default_ocr_engine).
+    With a StageCache, an image already seen with the same pipeline parameters skips
+    decode, autocrop and OCR, and is only parsed again.
+    With gate, images that do not look like an end-of-fight screenshot raise NotEndScreenError
+    right after decoding (see screen.screen_gate).
+    With a GeometryCache, the uploader's previous crop rectangle is reused when it verifies (see crop_window).
+    OCR runs the cheap tier first and only escalates when the parse looks unreliable (see ocr_and_parse).
+    """
+    if isinstance(KNOWN_NAMES, VocabularyIndex):
+        index = KNOWN_NAMES
+    else:
+        if not isinstance(KNOWN_NAMES, list):
+            logger.warning("KNOWN_NAMES passed to from_bytes_to_result is not a list. Using empty list.")
+            KNOWN_NAMES = []
+        index = VocabularyIndex(KNOWN_NAMES, VOCABULARY)
+
+    start_time = time.time()
+    check_image_size(len(img_data))
+
+    cache_key = None
+    cached_entry = None
+    if cache is not None:
+        with timed("cache_lookup"):
+            cache_key = make_cache_key(img_data, pipeline_params(nocrop, gate))
+            cached_entry = cache.get(cache_key)
+
+    if cached_entry is not None:
+        logger.info(f"Stage cache hit ({cache_key[:12]}): skipping decode, autocrop and OCR.")
+        endscreen = parse_ocr_lines(cached_entry["ocr_lines"], index)
+        endscreen.ocr_tiers = [cached_entry["ocr_tier"]] if cached_entry.get("ocr_tier") else []
+        endscreen.ocr_scales = [cached_entry["ocr_scale"]] if cached_entry.get("ocr_scale") else []
+    else:
+        with timed("decode"):
+            img = decode_image(img_data)
+        if gate:
+            with timed("gate"):
+                check_screenshot(img)
+        with timed("autocrop"):
+            window_img, crop_rect = crop_window(img, nocrop, geometry_cache, uploader_id)
+        if ocr_engine is None:
+            ocr_engine = default_ocr_engine()
+        endscreen, ocr_lines = ocr_and_parse(ocr_engine, window_img, crop_rect, index)
+        record_tier(endscreen.ocr_tiers[0])
+        if cache is not None:
+            cache.put(cache_key, crop_rect, ocr_lines, ocr_tier=endscreen.ocr_tiers[0], ocr_scale=endscreen.ocr_scales[0])
 
     total_duration = time.time() - start_time
-    logger.info(f"Total processing time for {url}: {total_duration:.2f}s")
-    return endscreen
\ No newline at end of file
+    record("total", total_duration)
+    logger.info(f"Total processing time for {source or 'image'}: {total_duration:.2f}s")
+    return endscreen
@@ -3,7 +3,6 @@ import numpy as np
 import os
 import jellyfish
 from screen.autocrop_sift import autocrop
-from paddleocr import PaddleOCR 
 
 from scipy.cluster.vq import kmeans, vq
 import urllib3
@@ -12,17 +11,23 @@ import time
 import discord
 
 # --- Initialize PaddleOCR ---
-# Done globally once to load models into memory. Adjust path if needed.
+# Built on first use (not at import) so importing this module stays cheap.
 # use_angle_cls=False might speed things up slightly if text is always horizontal
-print("Initializing PaddleOCR Engine...")
-start_init = time.time()
-try:
-    ocr_engine = PaddleOCR(use_angle_cls=True, lang='fr', use_gpu=False, show_log=False)
-    print(f"PaddleOCR Engine initialized in {time.time() - start_init:.2f}s")
-except Exception as e:
-    print(f"FATAL: Failed to initialize PaddleOCR. Installation correct? Error: {e}")
-    # Handle exit or raise exception depending on desired bot behavior
-    exit()
+ocr_engine = None
+
+def get_ocr_engine():
+    global ocr_engine
+    if ocr_engine is None:
+        from paddleocr import PaddleOCR
+        print("Initializing PaddleOCR Engine...")
+        start_init = time.time()
+        try:
+            ocr_engine = PaddleOCR(use_angle_cls=True, lang='fr', use_gpu=False, show_log=False)
+            print(f"PaddleOCR Engine initialized in {time.time() - start_init:.2f}s")
+        except Exception as e:
+            print(f"ERROR: Failed to initialize PaddleOCR. Installation correct? Error: {e}")
+            raise
+    return ocr_engine
 # ---------------------------
 
 # Assuming id_card.py contains your VOCABULARY list
@@ -628,7 +633,7 @@ def from_link_to_result (url,KNOWN_NAMES,nocrop=False) :
     try:
         # Pass the numpy array directly
         # cls=True enables angle classification (might help if text is slightly rotated)
-        ocr_result = ocr_engine.ocr(img_for_ocr, cls=True)
+        ocr_result = get_ocr_engine().ocr(img_for_ocr, cls=True)
     except Exception as e:
         print(f"ERROR: PaddleOCR execution failed: {e}")
         # Depending on the error, you might want to retry or raise
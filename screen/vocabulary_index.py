@@ -0,0 +1,32 @@
+# vocabulary_index.py
+# Everything the parser matches OCR words against, prepared once: the preprocessed vocabulary
+# (with its BK-tree, see screen_utils.vocab_index) and the known names and aliases. An index
+# is immutable and carries the version of the names it was built from; DataManagementCog
+# bumps that version when cards or aliases change and builds a new index on next use, so
+# parses running in the OCR pool keep a consistent snapshot.
+import hashlib
+
+try:
+    from .screen_utils import vocab_index, preprocess
+except ImportError:
+    # Direct execution
+    from screen_utils import vocab_index, preprocess
+
+
+class VocabularyIndex:
+    """Known names/aliases (already cleaned) and preprocessed vocabulary of one names version."""
+    def __init__(self, names, vocabulary, version: int = 0):
+        self.version = version
+        self.names = tuple(sorted(set(name for name in names if name)))
+        self.names_set = frozenset(self.names)
+        self.vocabulary = tuple(vocabulary)
+        # Identifies the vocabulary in token_cache keys: word resolutions do not depend on the names
+        self.vocabulary_key = hashlib.sha256("\n".join(self.vocabulary).encode('utf-8')).hexdigest()
+        self.vocabulary_set = frozenset(preprocess(v) for v in self.vocabulary if v)
+        self.vocabulary_tree = vocab_index(self.vocabulary) if self.vocabulary_set else None
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return f"<VocabularyIndex v{self.version}: {len(self.names)} names, {len(self.vocabulary_set)} vocabulary words>"
@@ -0,0 +1,33 @@
+# test_autocrop_batch.py
+# Resuming a batch must not reuse results from other stages, and crops of images differing
+# only by extension must not overwrite each other.
+import pytest
+
+from screen.autocrop_batch import is_done, output_name, save_manifest, load_manifest
+
+
+def entry(**overrides):
+    result = {"file": "a.jpg", "status": "cropped", "x1": 1, "y1": 2, "x2": 30, "y2": 40, "stage": "sift",
+              "size": 100, "mtime_ns": 5, "template_sha256": "abc", "stages": "sift,heuristic", "output": "a.jpg.png"}
+    result.update(overrides)
+    return result
+
+
+def test_is_done_compares_stages():
+    assert is_done(entry(), 100, 5, "abc", ["sift", "heuristic"])
+    assert not is_done(entry(), 100, 5, "abc", ["heuristic"])
+    assert not is_done(entry(stages=None), 100, 5, "abc", ["sift", "heuristic"]) # Manifests written before stages were recorded
+    assert not is_done(entry(status="error"), 100, 5, "abc", ["sift", "heuristic"])
+
+
+def test_output_names_keep_the_source_extension():
+    assert output_name("a.png") != output_name("a.jpg")
+    assert output_name("sub/a.jpg") == "sub/a.jpg.png"
+
+
+@pytest.mark.parametrize("manifest_name", ["manifest.json", "manifest.csv"])
+def test_manifest_round_trip_keeps_stages(tmp_path, manifest_name):
+    path = str(tmp_path / manifest_name)
+    save_manifest(path, {"a.jpg": entry()})
+    loaded = load_manifest(path)["a.jpg"]
+    assert is_done(loaded, 100, 5, "abc", ["sift", "heuristic"])
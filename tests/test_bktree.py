@@ -0,0 +1,63 @@
+# test_bktree.py
+# The BK-tree lookup must answer exactly like word_to_known's linear scan over the same set:
+# same word on distance ties, same cut at the threshold, and nothing on an empty vocabulary.
+import random
+
+import pytest
+
+from screen.bktree import BKTree
+from screen.screen_utils import word_to_known, vocab_index, distance, preprocess
+from screen.vocabulary_index import VocabularyIndex
+
+VOCABULARY = ("gagnants", "gagnant", "perdants", "perdant", "niveau", "prisme", "percepteur", "xp", "kamas",
+              "gagnans", "perdans", "abc", "abd", "abe")
+
+
+def scan(word, vocab_set, threshold):
+    return word_to_known(distance, word, vocab_set, threshold=threshold)
+
+
+def tree(word, vocab_set, threshold, index):
+    return word_to_known(distance, word, vocab_set, threshold=threshold, index=index)
+
+
+def same_answer(word, vocab_set, threshold, index):
+    scanned, tree_result = scan(word, vocab_set, threshold), tree(word, vocab_set, threshold, index)
+    assert tree_result[0] == scanned[0], word
+    if scanned[1] <= threshold:
+        assert tree_result[1] == scanned[1], word
+    else: # No match: the scan reports its best distance, the tree did not look that far
+        assert tree_result[1] > threshold
+
+
+def test_ties_resolve_like_the_scan():
+    index = VocabularyIndex([], VOCABULARY)
+    for word in ("abf", "ab", "gagnanx", "perdantz", "xq", "abcd"):
+        for threshold in range(0, 4):
+            same_answer(word, index.vocabulary_set, threshold, index.vocabulary_tree)
+
+
+def test_distance_limit():
+    index = VocabularyIndex([], ("percepteur",))
+    assert tree("perceptuer", index.vocabulary_set, 2, index.vocabulary_tree) == ("percepteur", 2)
+    assert tree("perceptuer", index.vocabulary_set, 1, index.vocabulary_tree)[0] == "perceptuer"
+    for threshold in range(0, 5):
+        same_answer("perceptuer", index.vocabulary_set, threshold, index.vocabulary_tree)
+
+
+def test_empty_vocabulary():
+    assert BKTree(distance).closest("abc", 3) == (None, float('inf'))
+    assert VocabularyIndex([], ()).vocabulary_tree is None
+    empty_tree = vocab_index(())
+    assert tree("abc", set(), 3, empty_tree) == scan("abc", set(), 3) == ("abc", float('inf'))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_words_match_the_scan(seed):
+    rng = random.Random(seed)
+    words = lambda n: ["".join(rng.choice("abcde") for _ in range(rng.randint(1, 6))) for _ in range(n)]
+    raw_vocab = tuple(words(60))
+    vocab_set = set(preprocess(v) for v in raw_vocab if v)
+    index = vocab_index(raw_vocab)
+    for word in words(200):
+        same_answer(word, vocab_set, rng.randint(0, 3), index)
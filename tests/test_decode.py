@@ -0,0 +1,36 @@
+# test_decode.py
+# decode_image enforces the pixel budget: from the header before decoding when it is readable,
+# after decoding otherwise. Accepted images are decoded at full size.
+import cv2
+import numpy as np
+import pytest
+
+import screen.traitement as traitement
+
+
+def encode(extension: str, width: int, height: int) -> bytes:
+    ok, encoded = cv2.imencode(extension, np.zeros((height, width, 3), dtype=np.uint8))
+    assert ok
+    return encoded.tobytes()
+
+
+def test_large_screenshot_is_decoded_at_full_size():
+    assert traitement.decode_image(encode(".jpg", 3840, 2160)).shape[:2] == (2160, 3840)
+
+
+def test_pixel_budget_is_checked_from_the_header(monkeypatch):
+    monkeypatch.setattr(traitement, "MAX_IMAGE_PIXELS", 10_000)
+    def fail(*args):
+        raise AssertionError("decoded despite the header")
+    monkeypatch.setattr(traitement.cv2, "imdecode", fail)
+    with pytest.raises(ValueError):
+        traitement.decode_image(encode(".png", 200, 100))
+
+
+def test_pixel_budget_applies_to_unknown_headers(monkeypatch):
+    data = encode(".bmp", 200, 100)
+    monkeypatch.setattr(traitement, "MAX_IMAGE_PIXELS", 10_000)
+    with pytest.raises(ValueError):
+        traitement.decode_image(data)
+    monkeypatch.setattr(traitement, "MAX_IMAGE_PIXELS", 20_000)
+    assert traitement.decode_image(data).shape[:2] == (100, 200)
@@ -0,0 +1,24 @@
+# test_default_engine.py
+# Callers without an OCR pool get one engine, built on first use and then reused.
+import pytest
+
+import screen.traitement as traitement
+
+
+def test_default_engine_is_built_once(monkeypatch):
+    built = []
+    monkeypatch.setattr(traitement, "_default_engine", None)
+    monkeypatch.setattr(traitement, "create_ocr_engine", lambda: built.append(object()) or built[-1])
+    engine = traitement.default_ocr_engine()
+    assert traitement.default_ocr_engine() is engine
+    assert len(built) == 1
+
+
+def test_default_engine_failure_is_a_runtime_error(monkeypatch):
+    def fail():
+        raise ImportError("No module named 'paddle'")
+    monkeypatch.setattr(traitement, "_default_engine", None)
+    monkeypatch.setattr(traitement, "create_ocr_engine", fail)
+    with pytest.raises(RuntimeError):
+        traitement.default_ocr_engine()
+    assert traitement._default_engine is None
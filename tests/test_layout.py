@@ -0,0 +1,55 @@
+# test_layout.py
+# The names region is only trusted when what it read fits the end-screen layout: a divider,
+# no line cut by the region's edge, and one name per row between the dividers.
+from screen.layout import Region, layout_check, rows_look_complete, lines_inside_regions
+
+WIDTH, HEIGHT = 1000, 600
+REGIONS = [Region("names", 0.00, 0.07, 0.45, 1.00)]
+PITCH = 30
+
+
+def line(text, row, x0=20, x1=200):
+    y0 = 60 + row * PITCH
+    return ([[x0, y0], [x1, y0], [x1, y0 + 20], [x0, y0 + 20]], text, 0.95)
+
+
+def column(winners, losers):
+    lines = [line("Gagnants", 0)]
+    lines += [line(name, 1 + i) for i, name in enumerate(winners)]
+    lines.append(line("Perdants", 1 + len(winners)))
+    lines += [line(name, 2 + len(winners) + i) for i, name in enumerate(losers)]
+    return lines
+
+
+def test_complete_column_is_trusted():
+    assert layout_check(column(["lovova", "mojito", "pastis"], ["ennemi", "autre"]), REGIONS, (HEIGHT, WIDTH)) is None
+
+
+def test_missing_divider():
+    lines = [line("lovova", 0), line("mojito", 1)]
+    assert layout_check(lines, REGIONS, (HEIGHT, WIDTH)) == "no divider"
+
+
+def test_missing_winner_row():
+    lines = column(["lovova", "mojito", "pastis"], ["ennemi", "autre"])
+    del lines[2] # "mojito" not read: its row is empty between the dividers
+    assert not rows_look_complete(lines)
+    assert layout_check(lines, REGIONS, (HEIGHT, WIDTH)) == "fewer names than the dividers imply"
+
+
+def test_name_read_in_two_pieces_counts_once():
+    lines = column(["lovova", "mojito"], ["ennemi"])
+    lines.append(line("-le-grand", 1, x0=210, x1=300))
+    assert rows_look_complete(lines)
+
+
+def test_line_cut_by_region_edge():
+    lines = column(["lovova", "mojito"], ["ennemi"])
+    lines.append(line("un-nom-tres-long", 3, x0=300, x1=449))
+    assert not lines_inside_regions(lines, REGIONS, WIDTH)
+    assert layout_check(lines, REGIONS, (HEIGHT, WIDTH)) == "a line reaches a region edge"
+
+
+def test_region_reaching_window_edge_is_not_checked():
+    lines = column(["lovova"], ["ennemi"]) + [line("x", 1, x0=900, x1=1000)]
+    assert lines_inside_regions(lines, [Region("all", 0.0, 0.0, 1.0, 1.0)], WIDTH)
@@ -0,0 +1,73 @@
+# test_names_changed.py
+# DataManagementCog.names_changed() must rebuild the VocabularyIndex, so new names and aliases
+# are recognized, while memoized token resolutions (which only depend on the vocabulary) stay
+# valid. A vocabulary change, on the other hand, must not reuse them.
+import os
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault("DISCORD_TOKEN", "test") # utils.helpers exits at import without a token
+
+import id_card
+import screen.parsing_pipeline as parsing_pipeline
+from cogs.data_management import DataManagementCog
+from screen.token_cache import TokenCache
+from screen.traitement import parse_ocr_lines
+from screen.vocabulary_index import VocabularyIndex
+
+OCR_LINES = [
+    ([[20, 60], [140, 60], [140, 80], [20, 80]], "Gagnants", 0.99),
+    ([[20, 90], [140, 90], [140, 110], [20, 110]], "Pastis", 0.95),
+    ([[20, 130], [140, 130], [140, 150], [20, 150]], "Perdants", 0.99),
+    ([[20, 160], [140, 160], [140, 180], [20, 180]], "Zorglub", 0.95),
+]
+
+
+@pytest.fixture
+def cog():
+    bot = SimpleNamespace(ids_data=[id_card.IdCard("lovova")], known_names=[], send_long_message=None)
+    return DataManagementCog(bot)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = TokenCache()
+    monkeypatch.setattr(parsing_pipeline, "token_cache", cache)
+    return cache
+
+
+def test_index_is_reused_until_names_change(cog):
+    index = cog.get_vocabulary_index()
+    assert cog.get_vocabulary_index() is index
+    cog.names_changed()
+    assert cog.get_vocabulary_index() is not index
+    assert cog.get_vocabulary_index().version == index.version + 1
+
+
+def test_new_name_is_recognized_after_names_changed(cog, cache):
+    before = parse_ocr_lines(OCR_LINES, cog.get_vocabulary_index())
+    assert before.winners == ["pastis"] and before.wewon is None
+    misses = cache.misses
+    parse_ocr_lines(OCR_LINES, cog.get_vocabulary_index())
+    assert cache.misses == misses # Every token resolution is served from the cache
+
+    card = id_card.IdCard("zorg")
+    card.ingame_aliases = ["pastis"]
+    cog.bot.ids_data.append(card)
+    cog.names_changed()
+    after = parse_ocr_lines(OCR_LINES, cog.get_vocabulary_index())
+    assert cache.misses == misses # Same vocabulary: the names change keeps the cached resolutions
+    assert after.winners == ["pastis"] and after.wewon is True and after.known_names_found == 1
+
+
+def test_vocabulary_change_drops_cached_resolutions(cache):
+    names = ["lovova"]
+    parse_ocr_lines(OCR_LINES, VocabularyIndex(names, id_card.VOCABULARY))
+    hits, misses = cache.hits, cache.misses
+    parse_ocr_lines(OCR_LINES, VocabularyIndex(names, id_card.VOCABULARY, version=3))
+    assert (cache.hits > hits, cache.misses) == (True, misses)
+
+    hits = cache.hits
+    parse_ocr_lines(OCR_LINES, VocabularyIndex(names, list(id_card.VOCABULARY) + ["zorglub"]))
+    assert cache.hits == hits and cache.misses > misses
@@ -0,0 +1,146 @@
+# test_ocr_batcher.py
+# Batched recognition must return what each worker's engine.ocr(img) returns on its own, with
+# the argument shapes PaddleOCR 2.10's ocr() accepts, and detection on each worker's engine.
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from screen.ocr_batcher import OcrBatcher, BatchedOcrEngine, recognize, _sort_boxes, _crop_box, DROP_SCORE
+
+
+class FakeTextSystem:
+    """
+    PaddleOCR's TextSystem predictors on synthetic images: every filled rectangle is a text line,
+    its gray level is the text. text_recognizer, like the real one, needs a list of image arrays.
+    """
+    use_angle_cls = False
+    page_num = 0
+
+    def __init__(self):
+        self.calls = {"det": 0, "rec": 0, "full": 0}
+
+    def text_detector(self, img):
+        self.calls["det"] += 1
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        contours, _ = cv2.findContours((gray > 0).astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            boxes.append([[x, y], [x + w - 1, y], [x + w - 1, y + h - 1], [x, y + h - 1]])
+        return np.array(boxes, dtype=np.float32).reshape(-1, 4, 2), 0.0
+
+    def text_recognizer(self, img_list):
+        self.calls["rec"] += 1
+        results = []
+        for crop in img_list:
+            level = int(np.median(crop.reshape(-1, crop.shape[-1]) if crop.ndim == 3 else crop))
+            results.append((f"mot{level}", 0.3 if level == 40 else 0.95))
+        return results, 0.0
+
+    def __call__(self, img, cls=True, slice={}):
+        self.calls["full"] += 1
+        dt_boxes, _ = self.text_detector(img)
+        boxes = _sort_boxes([box.tolist() for box in dt_boxes])
+        rec_res, _ = self.text_recognizer([_crop_box(img, box) for box in boxes])
+        kept = [(np.array(box), res) for box, res in zip(boxes, rec_res) if res[1] >= DROP_SCORE]
+        return [box for box, _ in kept], [res for _, res in kept], {}
+
+
+class MimicPaddleOCR(FakeTextSystem):
+    """PaddleOCR 2.10's ocr() argument handling (paddleocr.py, without the pdf/gif branches)."""
+    def ocr(self, img, det=True, rec=True, cls=True, bin=False, inv=False, alpha_color=(255, 255, 255), slice={}):
+        assert isinstance(img, (np.ndarray, list, str, bytes))
+        if isinstance(img, list) and det == True:
+            exit(0)
+        imgs = [img] # check_img leaves lists and arrays unchanged
+        if det and rec:
+            ocr_res = []
+            for img in imgs:
+                dt_boxes, rec_res, _ = self.__call__(img, cls, slice)
+                if not dt_boxes and not rec_res:
+                    ocr_res.append(None)
+                    continue
+                ocr_res.append([[box.tolist(), res] for box, res in zip(dt_boxes, rec_res)])
+            return ocr_res
+        elif det and not rec:
+            ocr_res = []
+            for img in imgs:
+                dt_boxes, elapse = self.text_detector(img)
+                if dt_boxes.size == 0:
+                    ocr_res.append(None)
+                    continue
+                ocr_res.append([box.tolist() for box in dt_boxes])
+            return ocr_res
+        else:
+            ocr_res = []
+            for img in imgs:
+                if not isinstance(img, list):
+                    img = [img]
+                rec_res, elapse = self.text_recognizer(img)
+                ocr_res.append(rec_res)
+            return ocr_res
+
+
+def _real_paddleocr_engine():
+    paddleocr = pytest.importorskip("paddleocr")
+
+    class RealArgumentsPaddleOCR(FakeTextSystem):
+        ocr = paddleocr.PaddleOCR.ocr # The real method, on fake predictors
+    return RealArgumentsPaddleOCR()
+
+
+ENGINES = [pytest.param(MimicPaddleOCR, id="mimic"), pytest.param(_real_paddleocr_engine, id="paddleocr")]
+
+
+def _screen(levels):
+    """A fake screenshot: one filled rectangle (text line) per gray level, top to bottom."""
+    img = np.zeros((40 + 30 * len(levels), 200, 3), dtype=np.uint8)
+    for i, level in enumerate(levels):
+        img[20 + 30 * i:36 + 30 * i, 20:20 + 40 + 10 * i] = level
+    return img
+
+
+@pytest.mark.parametrize("make_engine", ENGINES)
+def test_recognize_takes_crops_of_several_images(make_engine):
+    engine = make_engine()
+    crops = [np.full((16, 40, 3), level, dtype=np.uint8) for level in (90, 120, 150)]
+    assert recognize(engine, crops, cls=False) == [("mot90", 0.95), ("mot120", 0.95), ("mot150", 0.95)]
+    assert engine.calls["rec"] == 1
+    assert recognize(engine, [], cls=False) == []
+
+
+@pytest.mark.parametrize("make_engine", ENGINES)
+def test_concurrent_workers_match_unbatched_ocr(make_engine):
+    images = [_screen([60 + 10 * i, 100, 40, 200 - 5 * i]) for i in range(4)] + [np.zeros((50, 50, 3), np.uint8)]
+    expected = [make_engine().ocr(img, cls=False) for img in images]
+
+    batcher = OcrBatcher(window_ms=300, max_batch=len(images))
+    engines = [make_engine() for _ in images]
+    results = [None] * len(images)
+    start = threading.Barrier(len(images))
+
+    def worker(i):
+        start.wait()
+        results[i] = BatchedOcrEngine(engines[i], batcher).ocr(images[i], cls=False)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(images))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == expected
+    assert expected[-1] == [None]
+    # Detection on each worker's own engine, no fallback to full per-image OCR, and one recognition pass
+    assert all(engine.calls["det"] == 1 and engine.calls["full"] == 0 for engine in engines)
+    assert sum(engine.calls["rec"] for engine in engines) == 1
+    assert batcher.stats()["batches"] == 1
+
+
+def test_disabled_batcher_calls_engine_directly():
+    engine = MimicPaddleOCR()
+    img = _screen([90, 120])
+    assert BatchedOcrEngine(engine, OcrBatcher(window_ms=0)).ocr(img, cls=False) == MimicPaddleOCR().ocr(img, cls=False)
+    assert engine.calls["full"] == 1
@@ -0,0 +1,167 @@
+# test_parse_equivalence.py
+# EndScreen parsing on a TokenTable must give the results of the original word-list pipeline
+# (stage0 to stage3, linear vocabulary scan) on the same OCR lines. That pipeline is gone from
+# screen.parsing_pipeline; a frozen copy of it is kept here as the reference.
+import random
+
+import pytest
+
+import id_card
+from screen.EndScreen import EndScreen
+from screen.screen_utils import word_to_known, preprocess, distance, isnumber
+from screen.traitement import parse_ocr_lines, CONFIDENCE_THRESHOLD
+from screen.vocabulary_index import VocabularyIndex
+
+KNOWN_NAMES = ["lovova", "mojito", "ka-li", "pastis"]
+
+
+def line(text, x, y, confidence=0.95, width=120, height=20):
+    return ([[x, y], [x + width, y], [x + width, y + height], [x, y + height]], text, confidence)
+
+
+TITLE = [line("Combat terminé", 300, 5, width=300)]
+WINNERS = [line("Gagnants", 20, 60), line("Lovova", 20, 90), line("200", 300, 90), line("1 250 000", 500, 90),
+           line("Mojito", 20, 120), line("Niveau 199", 300, 120), line("Ka-li", 20, 150)]
+DIVIDER = [line("Perdants", 20, 190)]
+LOSERS = [line("Zorglub", 20, 220), line("187", 300, 220), line("Kikou-lol", 20, 250), line("Pastis", 20, 280, confidence=0.4)]
+
+FIXTURES = {
+    "split": TITLE + WINNERS + DIVIDER + LOSERS,
+    "we_lost": TITLE + [line("Gagnants", 20, 60), line("Zorglub", 20, 90), line("Perdants", 20, 130),
+                        line("Mojito", 20, 160), line("Lovova 200", 20, 190)],
+    "divider_missing": TITLE + WINNERS + LOSERS,
+    "unknown_names": TITLE + [line("Gagnants", 20, 60), line("Zorglub", 20, 90), line("Kikou-lol", 20, 120),
+                              line("Perdants", 20, 160), line("Xx-Dark-xX", 20, 190), line("Bob", 20, 220)],
+    "ocr_noise": [line("Gagnants", 20, 60), line("Lovovaa", 20, 90), line("Moj1to", 20, 120), line(":: -", 300, 120),
+                  line("Perdans", 20, 160), line("Zorglub", 20, 190), line("Prisme", 300, 250)],
+    "prism": WINNERS + DIVIDER + LOSERS + [line("Prisme d'alignement", 300, 320, width=250)],
+    "empty": [],
+}
+
+
+# --- Frozen copy of the original parsing_pipeline stages (condensed, logging removed) ---
+def stage0(words, positions):
+    new_words, new_positions = [], []
+    for i, word in enumerate(words):
+        processed_word = preprocess(word)
+        if processed_word:
+            new_words.append(processed_word)
+            if i < len(positions) and positions[i] and isinstance(positions[i], (list, tuple)) and len(positions[i]) >= 2:
+                new_positions.append(positions[i])
+            else:
+                new_words.pop()
+    return new_words, new_positions
+
+
+def stage1(words, positions, raw_vocab_list, threshold=3):
+    preprocessed_vocab_set = set(preprocess(v) for v in raw_vocab_list if v)
+    return [word_to_known(distance, word, preprocessed_vocab_set, threshold=threshold)[0] for word in words], positions
+
+
+def stage2(words, positions, known_names_and_aliases, vocabulary):
+    known_names_aliases_set = set(known_names_and_aliases)
+    vocabulary_set = set(preprocess(v) for v in vocabulary if v)
+    result = {"names": [], "name_positions": [], "nonames": [], "noname_positions": []}
+    for word, pos in zip(words, positions):
+        if word in known_names_aliases_set:
+            kind = "name"
+        elif word in vocabulary_set or isnumber(word):
+            kind = "noname"
+        elif len(word) > 1 and any(char.isalpha() for char in word):
+            kind = "name"
+        else:
+            kind = "noname"
+        result[kind + "s"].append(word)
+        result[kind + "_positions"].append(pos)
+    return result
+
+
+def stage3(word_dict):
+    if not word_dict["names"]:
+        return [], []
+    target_keyword = preprocess("perdants")
+    frontier_y = next((pos[1] for word, pos in zip(word_dict["nonames"], word_dict["noname_positions"]) if word == target_keyword), None)
+    if frontier_y is None:
+        return [], []
+    winners = [name for name, pos in zip(word_dict["names"], word_dict["name_positions"]) if pos[1] < frontier_y]
+    losers = [name for name, pos in zip(word_dict["names"], word_dict["name_positions"]) if pos[1] >= frontier_y]
+    return winners, losers
+# --- End frozen copy ---
+
+
+def baseline_parse(ocr_lines, known_names, vocabulary):
+    """The original pipeline: confident lines split into words, then stage0 to stage3 and the wewon rule."""
+    words, positions, raw_ocr_lines = [], [], []
+    for box, text, confidence in ocr_lines:
+        raw_ocr_lines.append(text)
+        if confidence < CONFIDENCE_THRESHOLD:
+            continue
+        center = (sum(p[0] for p in box) / 4, sum(p[1] for p in box) / 4)
+        for word in text.split():
+            words.append(word)
+            positions.append(center)
+    return baseline_parse_words(words, positions, raw_ocr_lines, known_names, vocabulary)
+
+
+def baseline_parse_words(words, positions, raw_ocr_lines, known_names, vocabulary):
+    prism = any("prisme" in text.lower() or "prism" in text.lower() for text in raw_ocr_lines)
+    processed_words, processed_positions = stage0(words, positions)
+    if not processed_words:
+        return [], [], None, prism
+    mapped_words, final_positions = stage1(processed_words, processed_positions, vocabulary, threshold=3)
+    winners, losers = stage3(stage2(mapped_words, final_positions, known_names, vocabulary))
+    known = set(known_names)
+    we_are_winners, we_are_losers = bool(set(winners) & known), bool(set(losers) & known)
+    wewon = True if we_are_winners and not we_are_losers else False if we_are_losers and not we_are_winners else None
+    return sorted(set(winners)), sorted(set(losers)), wewon, prism
+
+
+@pytest.mark.parametrize("fixture", sorted(FIXTURES))
+def test_parse_matches_the_stage_pipeline(fixture):
+    ocr_lines = FIXTURES[fixture]
+    endscreen = parse_ocr_lines(ocr_lines, VocabularyIndex(KNOWN_NAMES, id_card.VOCABULARY))
+    assert (endscreen.winners, endscreen.losers, endscreen.wewon, endscreen.prism) == baseline_parse(ocr_lines, KNOWN_NAMES, id_card.VOCABULARY)
+
+
+def test_fixtures_cover_the_split_cases():
+    index = VocabularyIndex(KNOWN_NAMES, id_card.VOCABULARY)
+    split = parse_ocr_lines(FIXTURES["split"], index)
+    assert {"lovova", "mojito"} <= set(split.winners) and "zorglub" in split.losers and split.wewon is True
+    assert "pastis" not in split.losers # Below the confidence threshold
+    assert parse_ocr_lines(FIXTURES["we_lost"], index).wewon is False
+    missing = parse_ocr_lines(FIXTURES["divider_missing"], index)
+    assert (missing.winners, missing.losers, missing.divider_found) == ([], [], False)
+    unknown = parse_ocr_lines(FIXTURES["unknown_names"], index)
+    assert unknown.winners and unknown.losers and unknown.wewon is None
+
+
+def test_word_list_parse_matches_the_stage_pipeline():
+    endscreen = EndScreen()
+    words = ["Gagnants", "Lovova", "200", "Perdants", "Zorglub"]
+    positions = [(20, 60), (20, 90), (300, 90), (20, 130), (20, 160)]
+    endscreen.parse(words, positions, [], KNOWN_NAMES, id_card.VOCABULARY)
+    assert (endscreen.winners, endscreen.losers, endscreen.wewon) == (["lovova"], ["zorglub"], True)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_random_word_lists_match_the_stage_pipeline(seed):
+    rng = random.Random(seed)
+    pool = list(id_card.VOCABULARY) + KNOWN_NAMES * 3 + ["Gagnants", "PERDANTS", "Niveau:", "12.5%", "-", "::", "É", "1,000", "Zorglub", "Kikou"]
+    def noisy(word):
+        chars = list(word)
+        for _ in range(rng.choice([0, 0, 1, 2])):
+            k = rng.randrange(len(chars) + 1)
+            if chars and rng.random() < 0.5:
+                chars[min(k, len(chars) - 1)] = rng.choice("abcdÉ.-:1 ")
+            else:
+                chars.insert(k, rng.choice("aeiouxÉ.-:1"))
+        return "".join(chars)
+    index = VocabularyIndex(KNOWN_NAMES, id_card.VOCABULARY)
+    for _ in range(200):
+        n = rng.randint(0, 40)
+        words = [noisy(rng.choice(pool)) for _ in range(n)]
+        positions = [(float(rng.randint(0, 9)), float(rng.randint(0, 40))) for _ in range(n)]
+        endscreen = EndScreen()
+        endscreen.parse(words, positions, [], KNOWN_NAMES, id_card.VOCABULARY, index=index)
+        expected = baseline_parse_words(words, positions, [], KNOWN_NAMES, id_card.VOCABULARY)
+        assert (endscreen.winners, endscreen.losers, endscreen.wewon, endscreen.prism) == expected, words
@@ -0,0 +1,32 @@
+# test_stage_cache_gate.py
+# A result cached with the screen gate off ('!screen force') is not served to a gated request.
+import cv2
+import numpy as np
+import pytest
+
+import screen.traitement as traitement
+from screen.stage_cache import StageCache
+
+
+class FakeEngine:
+    def ocr(self, img, cls=True, **kwargs):
+        return [[[[[10, 10], [100, 10], [100, 30], [10, 30]], ("Gagnants", 0.99)],
+                 [[[10, 40], [100, 40], [100, 60], [10, 60]], ("Lovova 200", 0.95)],
+                 [[[10, 70], [100, 70], [100, 90], [10, 90]], ("Perdants", 0.99)],
+                 [[[10, 100], [100, 100], [100, 120], [10, 120]], ("Mojito 199", 0.95)]]]
+
+
+def test_forced_result_is_not_served_to_gated_request(tmp_path, monkeypatch):
+    def refuse(img):
+        raise ValueError("not an end screen")
+    monkeypatch.setattr(traitement, "check_screenshot", refuse)
+    ok, encoded = cv2.imencode(".png", np.full((600, 900, 3), 40, dtype=np.uint8))
+    assert ok
+    cache = StageCache(str(tmp_path))
+
+    forced = traitement.from_bytes_to_result(encoded.tobytes(), ["lovova"], nocrop=True, ocr_engine=FakeEngine(), cache=cache, gate=False)
+    assert forced.winners == ["lovova"]
+    with pytest.raises(ValueError, match="not an end screen"):
+        traitement.from_bytes_to_result(encoded.tobytes(), ["lovova"], nocrop=True, ocr_engine=FakeEngine(), cache=cache, gate=True)
+    # The forced request still hits its own entry
+    assert traitement.from_bytes_to_result(encoded.tobytes(), ["lovova"], nocrop=True, cache=cache, gate=False).winners == ["lovova"]